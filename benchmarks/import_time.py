@@ -0,0 +1,84 @@
+"""
+Import-time budget for the data modules
+
+Imports each module in a fresh interpreter and fails if the median import time
+exceeds the budget or if a heavy dependency was imported eagerly.
+
+Run from the project root:
+
+    python -m benchmarks.import_time --budget-ms 200
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    "src.data.utils_data",
+    "src.data.google_trends",
+    "src.data.google_results",
+    "src.data.yahoofinance",
+    "src.data.metrics",
+    "src.data.cache",
+]
+
+HEAVY_DEPENDENCIES = [
+    "streamlit",
+    "pandas",
+    "numpy",
+    "pytrends",
+    "yahooquery",
+    "pytickersymbols",
+    "bs4",
+    "requests",
+    "plotly",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module, repeat=5):
+    """Median import time of module in fresh interpreters and the heavy modules it pulled in"""
+    timings, eager = [], set()
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        eager.update(
+            dep
+            for dep in HEAVY_DEPENDENCIES
+            if dep in result["modules"] and not module.startswith(dep)
+        )
+    return statistics.median(timings), sorted(eager)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--budget-ms", type=float, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        seconds, eager = measure(module, args.repeat)
+        ok = seconds * 1000 <= args.budget_ms and not eager
+        failed |= not ok
+        print(
+            f"{'ok  ' if ok else 'FAIL'} {module:<28} {seconds * 1000:7.1f} ms"
+            + (f"  eager imports: {', '.join(eager)}" if eager else "")
+        )
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,137 @@
+"""
+Throughput benchmark of the ingestion functions against the offline fake Google server
+
+Runs get_interest_over_time(), get_related_queries_pipeline() and
+get_results_count_pipeline() against src/data/fake_google.py and reports
+requests, rows and wall time per function. Same seed, same numbers.
+
+Run from the project root:
+
+    python -m benchmarks.ingestion_throughput --keywords 50 --rate-429 0.05 --median-ms 50
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from src.data import google_results as gr
+from src.data import google_trends as gt
+from src.data.fake_google import FakeGoogleConfig, FakeGoogleServer
+
+
+def benchmark_keywords(n):
+    """Firm x controversy style keywords"""
+    firms = ["adidas", "Allianz", "BASF", "Bayer", "BMW", "Siemens", "SAP", "VW"]
+    terms = ["pollution", "scandal", "lawsuit", "strike", "fraud", "layoff"]
+    keywords = [f"{firm} {term}" for firm in firms for term in terms]
+    return (keywords * (n // len(keywords) + 1))[:n]
+
+
+def timed(name, func, results):
+    """Run func returning (rows, failed batches) and append timings to results"""
+    start = time.perf_counter()
+    rows, failed = func()
+    results.append(
+        {
+            "step": name,
+            "seconds": time.perf_counter() - start,
+            "rows": rows,
+            "failed_batches": failed,
+        }
+    )
+
+
+def per_batch(func, keywords):
+    """Call func per 5-keyword batch, count rows and batches that raised"""
+    rows, failed = 0, 0
+    for batch in gt.list_batch(keywords, n=5):
+        try:
+            rows += len(func(batch))
+        except Exception as e:
+            logging.info(f"Batch {batch} failed: {type(e).__name__}: {e}")
+            failed += 1
+    return rows, failed
+
+
+def run_benchmark(config, n_keywords=40, max_retries=3):
+    """Returns one row per ingestion function with wall time, rows and server-side request counts"""
+    keywords = benchmark_keywords(n_keywords)
+    results = []
+
+    with FakeGoogleServer(config) as server, tempfile.TemporaryDirectory() as tmp:
+        filepath = Path(tmp) / "interest.csv"
+
+        def interest_over_time():
+            gt.get_interest_over_time(
+                keyword_list=keywords,
+                filepath=filepath,
+                filepath_failed=Path(tmp) / "failed.csv",
+                max_retries=max_retries,
+                timeout=0,
+                base_url=server.base_url,
+            )
+            rows = len(pd.read_csv(filepath)) if filepath.is_file() else 0
+            failed_path = Path(tmp) / "failed.csv"
+            failed = len(pd.read_csv(failed_path)) if failed_path.is_file() else 0
+            return rows, failed // 5
+
+        def related_queries():
+            session = gt.create_pytrends_session(base_url=server.base_url)
+            return per_batch(
+                lambda batch: gt.get_related_queries_pipeline(
+                    session, keyword_list=batch
+                ),
+                keywords,
+            )
+
+        def results_count():
+            return per_batch(
+                lambda batch: gr.get_results_count_pipeline(
+                    batch, user_agent={"User-Agent": "benchmark"}, url=server.search_url
+                ),
+                keywords,
+            )
+
+        timed("get_interest_over_time", interest_over_time, results)
+        timed("get_related_queries_pipeline", related_queries, results)
+        timed("get_results_count_pipeline", results_count, results)
+        stats = server.stats()
+
+    df = pd.DataFrame(results)
+    df["rows_per_s"] = df.rows / df.seconds
+    return df, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--keywords", type=int, default=40)
+    parser.add_argument("--median-ms", type=float, default=50)
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--empty-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    config = FakeGoogleConfig(
+        latency={
+            "default": {
+                "dist": "lognormal",
+                "median_ms": args.median_ms,
+                "sigma": args.sigma,
+            }
+        },
+        rate_429=args.rate_429,
+        empty_rate=args.empty_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+        today="2021-12-31",
+    )
+    df, stats = run_benchmark(config, n_keywords=args.keywords)
+    print(df.to_string(index=False))
+    print(stats)
@@ -0,0 +1 @@
+# makes the repository root importable, so tests import the src package
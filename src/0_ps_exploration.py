@@ -8,6 +8,7 @@ import chart_studio.plotly as cs
 from glob import glob
 import pandas as pd
 import tsf_plots
+from visuals.downsample import downsample_long, points_for_width
 
 from pytickersymbols import PyTickerSymbols
 import data.yahoofinance_extract as yq
@@ -58,7 +59,7 @@ if st.sidebar.checkbox(f"Run query for {selected_keywords}"):
         keyword_list=selected_keywords,
         timeframe=timeframe,
         filepath=f"../data/raw/{selected_keywords[0]}_trends_{timestamp_now()}.csv",
-        filepath_failed=f"../data/raw/{selected_keywords[0]}_trends_{timestamp_now()}.csv",
+        filepath_failed=f"../data/raw/failed_{selected_keywords[0]}_trends_{timestamp_now()}.csv",
     )
 
 
@@ -67,8 +68,10 @@ if st.sidebar.checkbox(f"Run query for {selected_keywords}"):
 # ---------------------------------------------------
 
 
-def plot_interest_over_time(df, title):
+def plot_interest_over_time(df, title, width_px=700):
     """line chart: weekly change of Google trends"""
+    # cap points per trace, LTTB keeps spikes
+    df = downsample_long(df, n_out=points_for_width(width_px))
     fig = px.line(
         df,
         x="date",
@@ -0,0 +1,154 @@
+"""
+Injectable cache backends
+
+MemoryCache: thread-safe LRU cache in process memory (default)
+DiskCache: pickled values in a directory, shared across processes and runs
+NullCache: never caches
+set_cache_backend: inject a backend, globally or for one named cache
+cached: decorator to cache function results in the current backend
+
+Cache lookups are counted in metrics.py as esg_cache_requests_total{cache=name}.
+
+Example usage:
+
+    set_cache_backend(DiskCache("data/interim/cache"), name="trends_windows")
+
+    @cached("trends_windows")
+    def query_window(keywords, timeframe): ...
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class MemoryCache:
+    """Least recently used cache in process memory"""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskCache:
+    """Pickled values in directory, one file per key"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.pkl")
+
+    def get(self, key, default=MISSING):
+        try:
+            with open(self._path(key), "rb") as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return default
+        except Exception as e:
+            logger.warning(f"Unreadable cache entry for {key}: {e}")
+            return default
+
+    def set(self, key, value):
+        # write to temp file first so that concurrent readers never see partial pickles
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+
+    def clear(self):
+        for fname in os.listdir(self.directory):
+            if fname.endswith(".pkl"):
+                os.remove(os.path.join(self.directory, fname))
+
+
+class NullCache:
+    """Backend that never caches"""
+
+    def get(self, key, default=MISSING):
+        return default
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+_default_backend = MemoryCache()
+_named_backends = {}
+
+
+def set_cache_backend(backend, name=None):
+    """Use backend for the cache called name, or as default for all caches if name is None"""
+    global _default_backend
+    if name is None:
+        _default_backend = backend
+    else:
+        _named_backends[name] = backend
+
+
+def get_cache_backend(name=None):
+    return _named_backends.get(name, _default_backend)
+
+
+def cached(name, key=None):
+    """Cache results of the decorated function in the backend for name
+
+    Args:
+        name (str): cache name, used to pick the backend and as metrics label
+        key (callable): builds a hashable cache key from the call arguments,
+            defaults to the arguments themselves
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def with_cache(*args, **kwargs):
+            cache_key = (
+                key(*args, **kwargs)
+                if key is not None
+                else (func.__qualname__, args, tuple(sorted(kwargs.items())))
+            )
+            backend = get_cache_backend(name)
+            value = backend.get(cache_key)
+            metrics.record_cache(name, hit=value is not MISSING)
+            if value is MISSING:
+                value = func(*args, **kwargs)
+                backend.set(cache_key, value)
+            return value
+
+        return with_cache
+
+    return decorator
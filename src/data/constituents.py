@@ -0,0 +1,237 @@
+"""
+Versioned on-disk snapshots of index constituents
+
+Constituents change quarterly, but get_index_stock_details() rebuilds them from
+pytickersymbols on every run. load_index_details() keeps one pickled dataframe per
+index and version instead and only rebuilds when the pytickersymbols version changes,
+the snapshot is older than max_age_days or refresh=True. A rebuild whose content
+differs from the latest snapshot is stored as a new version with a diff report.
+
+    data/interim/constituents/dax/manifest.json          versions with fingerprint
+    data/interim/constituents/dax/20230115_3f2a9c1d.pkl  snapshot
+    data/interim/constituents/dax/20230115_3f2a9c1d_diff.csv  changes to the previous one
+
+Main functions
+    index_details_from_stocks: dataframe of pytickersymbols stocks, vectorized yahoo tickers
+    load_index_details: latest snapshot, rebuilt when stale
+    diff_constituents: added, removed and renamed constituents of two snapshots
+
+Example usage:
+
+    index_details = load_index_details("DAX")
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime
+
+from . import manifest
+from .lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+pytickersymbols_module = lazy_import("pytickersymbols")
+
+SNAPSHOT_DIR = "data/interim/constituents"
+
+
+def index_slug(index_name):
+    """File name safe version of an index name, e.g. 'EURO STOXX 50' -> 'euro_stoxx_50'"""
+    return re.sub(r"[^0-9a-zA-Z]+", "_", str(index_name)).strip("_").lower()
+
+
+def stocks_fingerprint(stocks):
+    """Hex digest of pytickersymbols stocks, changes with any constituent detail"""
+    payload = json.dumps(list(stocks), sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def index_details_from_stocks(stocks, index_name=""):
+    """Dataframe of pytickersymbols stocks with fixed names and yahoo_ticker index
+
+    Args:
+        stocks (list): PyTickerSymbols().get_stocks_by_index(index_name)
+        index_name (str): only used for logging
+
+    Returns:
+        Dataframe: stock details, yahoo_ticker as index and column
+    """
+    index_details = pd.DataFrame(list(stocks))
+
+    # string encoding
+    try:
+        index_details.name = index_details.name.str.encode("latin-1").str.decode(
+            "utf-8"
+        )
+    except Exception:
+        logging.warning(f"Encoding error for {index_name}")
+        index_details.name = index_details.name.str.encode("utf-8").str.decode("utf-8")
+
+    # retrieve yahoo ticker symbol: first listing if a stock has more than one
+    symbols = index_details.symbols
+    yahoo_ticker = symbols.str[0].str.get("yahoo").where(symbols.str.len() > 1)
+    index_details["yahoo_ticker"] = yahoo_ticker.fillna(index_details.symbol)
+
+    # set ticker as index
+    index_details.set_index("yahoo_ticker", inplace=True, drop=False)
+
+    return index_details
+
+
+# ----------------------------------------
+# -- Snapshots
+# ----------------------------------------
+
+
+def load_manifest(index_dir):
+    return manifest.load_manifest(index_dir, default={"versions": []})
+
+
+def list_versions(index_name, snapshot_dir=SNAPSHOT_DIR):
+    """Snapshot versions of an index, oldest first
+
+    Returns:
+        Dataframe: version, created_at, checked_at, fingerprint, package_version, rows
+    """
+    snapshots = load_manifest(os.path.join(snapshot_dir, index_slug(index_name)))
+    return pd.DataFrame(snapshots["versions"])
+
+
+def load_snapshot(index_name, version=None, snapshot_dir=SNAPSHOT_DIR):
+    """Snapshot of an index, the latest one if version is None"""
+    index_dir = os.path.join(snapshot_dir, index_slug(index_name))
+    versions = load_manifest(index_dir)["versions"]
+    if not versions:
+        raise FileNotFoundError(f"No snapshot of {index_name} in {snapshot_dir}")
+    entry = versions[-1] if version is None else _find_version(versions, version)
+    return pd.read_pickle(os.path.join(index_dir, entry["file"]))
+
+
+def _find_version(versions, version):
+    for entry in versions:
+        if entry["version"] == version:
+            return entry
+    raise KeyError(f"Unknown snapshot version {version}")
+
+
+def _is_fresh(entry, package_version, max_age_days):
+    if entry.get("package_version") != package_version:
+        return False
+    checked_at = datetime.fromisoformat(entry["checked_at"])
+    return (datetime.utcnow() - checked_at).days < max_age_days
+
+
+def diff_constituents(old, new):
+    """Constituent changes between two snapshots
+
+    Returns:
+        Dataframe: yahoo_ticker, change (added, removed, renamed), old_name, new_name
+    """
+    old_names = old.set_index("yahoo_ticker")["name"]
+    new_names = new.set_index("yahoo_ticker")["name"]
+    joined = pd.concat(
+        [old_names.rename("old_name"), new_names.rename("new_name")], axis=1
+    )
+    in_old = joined.index.isin(old_names.index)
+    in_new = joined.index.isin(new_names.index)
+
+    joined["change"] = None
+    joined.loc[in_new & ~in_old, "change"] = "added"
+    joined.loc[in_old & ~in_new, "change"] = "removed"
+    joined.loc[
+        in_old & in_new & (joined.old_name != joined.new_name), "change"
+    ] = "renamed"
+    diff = joined.dropna(subset=["change"]).rename_axis("yahoo_ticker").reset_index()
+    return diff[["yahoo_ticker", "change", "old_name", "new_name"]]
+
+
+def save_snapshot(index_name, stocks, package_version=None, snapshot_dir=SNAPSHOT_DIR):
+    """Store stocks as a new version unless they equal the latest snapshot
+
+    Returns:
+        tuple: index details, diff to the previous version (None for the first version)
+    """
+    index_dir = os.path.join(snapshot_dir, index_slug(index_name))
+    os.makedirs(index_dir, exist_ok=True)
+    snapshots = load_manifest(index_dir)
+    versions = snapshots["versions"]
+    fingerprint = stocks_fingerprint(stocks)
+    now = datetime.utcnow().isoformat(timespec="seconds")
+
+    if versions and versions[-1]["fingerprint"] == fingerprint:
+        versions[-1].update(checked_at=now, package_version=package_version)
+        manifest.write_manifest(snapshots, index_dir)
+        return load_snapshot(index_name, snapshot_dir=snapshot_dir), None
+
+    index_details = index_details_from_stocks(stocks, index_name)
+    version = f"{datetime.utcnow():%Y%m%d}_{fingerprint[:8]}"
+    file = f"{version}.pkl"
+    fd, tmp_path = tempfile.mkstemp(dir=index_dir, suffix=".tmp")
+    os.close(fd)
+    index_details.to_pickle(tmp_path)
+    os.replace(tmp_path, os.path.join(index_dir, file))
+
+    diff = None
+    if versions:
+        previous = pd.read_pickle(os.path.join(index_dir, versions[-1]["file"]))
+        diff = diff_constituents(previous, index_details)
+        diff.to_csv(os.path.join(index_dir, f"{version}_diff.csv"), index=False)
+        counts = diff.change.value_counts().to_dict()
+        logging.info(
+            f"{index_name} constituents changed since {versions[-1]['version']}: {counts}"
+        )
+
+    versions.append(
+        {
+            "version": version,
+            "file": file,
+            "fingerprint": fingerprint,
+            "package_version": package_version,
+            "rows": len(index_details),
+            "created_at": now,
+            "checked_at": now,
+        }
+    )
+    manifest.write_manifest(snapshots, index_dir)
+    return index_details, diff
+
+
+def load_index_details(
+    index_name,
+    pytickersymbols=None,
+    snapshot_dir=SNAPSHOT_DIR,
+    max_age_days=30,
+    refresh=False,
+):
+    """Index details from the latest snapshot, rebuilt from pytickersymbols when stale
+
+    Args:
+        index_name (str): Index name from PyTickerSymbols().get_all_indices()
+        pytickersymbols (object): Init object from PyTickerSymbols(), created if needed
+        snapshot_dir (str): directory with one subdirectory per index
+        max_age_days (int): re-check pytickersymbols after this many days
+        refresh (bool): re-check pytickersymbols now
+
+    Returns:
+        Dataframe: same as get_index_stock_details()
+    """
+    index_dir = os.path.join(snapshot_dir, index_slug(index_name))
+    versions = load_manifest(index_dir)["versions"]
+    package_version = getattr(pytickersymbols_module, "__version__", None)
+
+    if (
+        versions
+        and not refresh
+        and _is_fresh(versions[-1], package_version, max_age_days)
+    ):
+        return load_snapshot(index_name, snapshot_dir=snapshot_dir)
+
+    pytickersymbols = pytickersymbols or pytickersymbols_module.PyTickerSymbols()
+    stocks = list(pytickersymbols.get_stocks_by_index(index_name))
+    index_details, _ = save_snapshot(
+        index_name, stocks, package_version=package_version, snapshot_dir=snapshot_dir
+    )
+    return index_details
@@ -0,0 +1,189 @@
+"""
+Controversy scores from search interest in firm name + controversy term keywords
+
+Combines the query keywords of esg_firm_query_keywords_pipeline() with the search
+interest of get_interest_over_time(). All firms and dates are scored at once on a
+(firm, term, date) array, without per-firm groupby/apply:
+
+    attention: weighted mean search interest across controversy terms
+    baseline, baseline_std: trailing mean and std of attention over `window` dates
+    zscore: (attention - baseline) / baseline_std
+
+interest_array: long search interest -> (firm, term, date) float array
+weighted_attention: weighted mean over the term axis, ignoring missing terms
+rolling_baseline: trailing mean/std via cumulative sums along the date axis
+controversy_scores: tidy frame with one row per firm and date
+merge_esg: add ESG scores to controversy scores on firm_name
+
+Example usage:
+
+    scores = controversy_scores(search_interest_df, labels, window=52)
+    scores = merge_esg(scores, esg_df)
+"""
+
+import logging
+
+from .lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+ESG_COLUMNS = [
+    "firm_name",
+    "yahoo_ticker",
+    "totalEsg",
+    "environmentScore",
+    "socialScore",
+    "governanceScore",
+    "highestControversy",
+    "peerGroup",
+]
+
+
+def interest_array(df, labels, dates=None):
+    """Dense (firm, term, date) array from long search interest
+
+    Args:
+        df (pd.DataFrame): date, keyword, search_interest
+        labels (pd.DataFrame): query_keyword, firm_name, term from label_query_keywords()
+        dates (pd.DatetimeIndex): date axis, defaults to all dates in df
+
+    Returns:
+        tuple: float64 array with NaN for missing cells, firms, terms, dates
+    """
+    labels = labels.drop_duplicates("query_keyword").set_index("query_keyword")
+    df = df.loc[df.keyword.isin(labels.index)]
+    if len(df) == 0:
+        logging.warning("No search interest for labelled keywords")
+
+    firms = pd.Index(sorted(labels.firm_name.unique()), name="firm_name")
+    terms = pd.Index(sorted(labels.term.unique()), name="term")
+    df_dates = pd.to_datetime(df["date"])
+    dates = (
+        pd.DatetimeIndex(np.sort(df_dates.unique()), name="date")
+        if dates is None
+        else pd.DatetimeIndex(dates, name="date")
+    )
+
+    # map keywords to positions once per label, not once per row
+    keyword_idx = labels.index.get_indexer(df.keyword)
+    firm_idx = firms.get_indexer(labels.firm_name)[keyword_idx]
+    term_idx = terms.get_indexer(labels.term)[keyword_idx]
+    date_idx = dates.get_indexer(df_dates)
+    on_axis = date_idx >= 0
+
+    values = np.full((len(firms), len(terms), len(dates)), np.nan)
+    values[firm_idx[on_axis], term_idx[on_axis], date_idx[on_axis]] = df[
+        "search_interest"
+    ].to_numpy(dtype=float)[on_axis]
+
+    return values, firms, terms, dates
+
+
+def weighted_attention(values, terms, weights=None):
+    """Weighted mean over the term axis, missing terms do not count
+
+    Args:
+        values (np.ndarray): (firm, term, date)
+        terms (pd.Index): term labels of axis 1
+        weights (dict): term -> weight, terms not in weights get 1
+
+    Returns:
+        tuple: attention (firm, date) with NaN where no term has data, number of terms with data
+    """
+    w = np.array([(weights or {}).get(t, 1.0) for t in terms], dtype=float)
+    present = ~np.isnan(values)
+    w_present = present * w[None, :, None]
+
+    weight_sum = w_present.sum(axis=1)
+    weighted = np.einsum("ftd,t->fd", np.where(present, values, 0.0), w)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        attention = np.where(weight_sum > 0, weighted / weight_sum, np.nan)
+
+    return attention, present.sum(axis=1)
+
+
+def rolling_baseline(x, window=52, min_periods=None):
+    """Trailing mean and std over the previous `window` values along the last axis
+
+    The current value is excluded, so a spike does not inflate its own baseline.
+    Missing values are skipped, computed with cumulative sums in O(n).
+
+    Returns:
+        tuple: baseline mean and std, same shape as x, NaN with fewer than min_periods values
+    """
+    min_periods = min_periods or max(window // 2, 2)
+    valid = ~np.isnan(x)
+    x0 = np.where(valid, x, 0.0)
+
+    def trailing_sum(a):
+        # sum over a[..., t - window : t] for every t
+        cum = np.cumsum(a, axis=-1)
+        cum = np.concatenate([np.zeros(a.shape[:-1] + (1,)), cum], axis=-1)
+        upper = cum[..., :-1]
+        lower = np.concatenate(
+            [np.zeros(a.shape[:-1] + (min(window, a.shape[-1]),)), cum[..., :-1]],
+            axis=-1,
+        )[..., : a.shape[-1]]
+        return upper - lower
+
+    n = trailing_sum(valid.astype(float))
+    s = trailing_sum(x0)
+    s2 = trailing_sum(x0**2)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s / n
+        var = (s2 - n * mean**2) / (n - 1)
+    std = np.sqrt(np.clip(var, 0, None))
+
+    enough = n >= min_periods
+    return np.where(enough, mean, np.nan), np.where(enough, std, np.nan)
+
+
+def controversy_scores(df, labels, weights=None, window=52, min_periods=None):
+    """Controversy attention, baseline and z-score per firm and date
+
+    Args:
+        df (pd.DataFrame): date, keyword, search_interest from get_interest_over_time()
+        labels (pd.DataFrame): query_keyword, firm_name, term from label_query_keywords()
+        weights (dict): term -> weight for the attention average
+        window (int): dates in the trailing baseline, 52 is one year of weekly data
+        min_periods (int): dates with data needed for a baseline, defaults to window // 2
+
+    Returns:
+        Dataframe: firm_name, date, attention, n_terms, baseline, baseline_std, zscore
+    """
+    values, firms, terms, dates = interest_array(df, labels)
+    attention, n_terms = weighted_attention(values, terms, weights=weights)
+    baseline, baseline_std = rolling_baseline(
+        attention, window=window, min_periods=min_periods
+    )
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        zscore = (attention - baseline) / baseline_std
+    zscore[~np.isfinite(zscore)] = np.nan
+
+    n_firms, n_dates = attention.shape
+    return pd.DataFrame(
+        {
+            "firm_name": np.repeat(firms.values, n_dates),
+            "date": np.tile(dates.values, n_firms),
+            "attention": attention.ravel(),
+            "n_terms": n_terms.ravel(),
+            "baseline": baseline.ravel(),
+            "baseline_std": baseline_std.ravel(),
+            "zscore": zscore.ravel(),
+        }
+    )
+
+
+def merge_esg(scores, esg_df, columns=ESG_COLUMNS):
+    """Join firm-level ESG data to controversy scores on firm_name
+
+    Args:
+        scores (pd.DataFrame): output of controversy_scores()
+        esg_df (pd.DataFrame): output of esg_firm_query_keywords_pipeline(), one row per query keyword
+    """
+    columns = [c for c in columns if c in esg_df.columns]
+    firms = esg_df[columns].drop_duplicates("firm_name")
+    return scores.merge(firms, on="firm_name", how="left")
@@ -0,0 +1,284 @@
+"""
+Firm x controversy term x date cube of search interest backed by a memory-mapped file
+
+Search interest from get_interest_over_time() is long (date, keyword, search_interest).
+The cube stores it densely as uint8 with axes (firm, term, date), so that
+    * cube.firm("adidas") and cube.term("pollution") are O(1) views without copies
+    * several processes open the same file and share pages through the OS
+    * new batches are written in place, the date axis grows in chunks
+
+Values 0-100 are search interest, MISSING (255) marks cells without data.
+Labels live in a JSON sidecar next to the .npy file.
+
+Example usage:
+
+    labels = label_query_keywords(esg_df.query_keyword, controversy_keywords)
+    cube = SearchInterestCube.create("data/processed/dax_cube", labels)
+    cube.update(pd.read_csv("data/raw/dax_search_interest.csv", parse_dates=["date"]))
+    cube.firm("adidas")  # terms x dates
+"""
+
+import json
+import logging
+import os
+
+from .lazy_imports import lazy_import
+from .manifest import atomic_write_json
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+MISSING = 255
+DATE_CHUNK = 256
+
+
+class SearchInterestCube:
+    """Dense uint8 cube (firm, term, date) in a memory-mapped .npy file"""
+
+    def __init__(self, path, mode="r+"):
+        """Open an existing cube at path (without extension)
+
+        Args:
+            path (str): cube path, files are path.npy and path.json
+            mode (str): 'r' for read-only processes, 'r+' to update
+        """
+        self.path = path
+        self.mode = mode
+        with open(f"{path}.json", encoding="utf8") as file:
+            meta = json.load(file)
+
+        self.firms = pd.Index(meta["firms"], name="firm_name")
+        self.terms = pd.Index(meta["terms"], name="term")
+        self.n_dates = meta["n_dates"]
+        self._all_dates = pd.DatetimeIndex(meta["dates"], name="date")
+        self.keywords = pd.DataFrame(
+            meta["keywords"], columns=["query_keyword", "firm_name", "term"]
+        )
+        self._keyword_pos = {
+            kw: (self.firms.get_loc(firm), self.terms.get_loc(term))
+            for kw, firm, term in meta["keywords"]
+        }
+        self._data = np.load(f"{path}.npy", mmap_mode=mode)
+
+    # ----------------------------------------
+    # -- Construction
+    # ----------------------------------------
+
+    @classmethod
+    def create(cls, path, labels, dates=None, date_capacity=DATE_CHUNK):
+        """Create an empty cube with firm and term axes from keyword labels
+
+        Args:
+            path (str): cube path without extension
+            labels (pd.DataFrame): query_keyword, firm_name, term,
+                e.g. yahoofinance.label_query_keywords() on esg_firm_query_keywords_pipeline() output
+            dates (list): initial date axis, can be empty and grow with update()
+            date_capacity (int): preallocated dates
+        """
+        labels = labels.drop_duplicates("query_keyword")
+        firms = sorted(labels.firm_name.unique())
+        terms = sorted(labels.term.unique())
+        dates = (
+            pd.DatetimeIndex(sorted(set(pd.to_datetime(dates))))
+            if dates is not None
+            else pd.DatetimeIndex([])
+        )
+        capacity = max(date_capacity, len(dates))
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        data = np.lib.format.open_memmap(
+            f"{path}.npy",
+            mode="w+",
+            dtype=np.uint8,
+            shape=(len(firms), len(terms), capacity),
+        )
+        data[:] = MISSING
+        data.flush()
+        del data
+
+        cls._write_meta(
+            path,
+            firms,
+            terms,
+            [str(d.date()) for d in dates],
+            labels[["query_keyword", "firm_name", "term"]].values.tolist(),
+        )
+        return cls(path)
+
+    @classmethod
+    def from_esg(cls, path, esg_df, controversy_keywords, **kwargs):
+        """Create a cube with axes from esg_firm_query_keywords_pipeline() output"""
+        from .yahoofinance import label_query_keywords
+
+        labels = label_query_keywords(esg_df.query_keyword, controversy_keywords)
+        return cls.create(path, labels, **kwargs)
+
+    @classmethod
+    def from_long(cls, path, df, labels):
+        """Create a cube and fill it with long data (date, keyword, search_interest)"""
+        dates = pd.to_datetime(df["date"]).unique()
+        cube = cls.create(
+            path, labels, dates=dates, date_capacity=len(dates) + DATE_CHUNK
+        )
+        cube.update(df)
+        return cube
+
+    @staticmethod
+    def _write_meta(path, firms, terms, dates, keywords):
+        atomic_write_json(
+            {
+                "firms": list(firms),
+                "terms": list(terms),
+                "dates": list(dates),
+                "n_dates": len(dates),
+                "keywords": keywords,
+            },
+            f"{path}.json",
+        )
+
+    # ----------------------------------------
+    # -- Access
+    # ----------------------------------------
+
+    @property
+    def dates(self):
+        return self._all_dates[: self.n_dates]
+
+    @property
+    def values(self):
+        """(firm, term, date) view without copy"""
+        return self._data[:, :, : self.n_dates]
+
+    @property
+    def shape(self):
+        return (len(self.firms), len(self.terms), self.n_dates)
+
+    def firm(self, firm_name):
+        """(term, date) view of one firm"""
+        return self._data[self.firms.get_loc(firm_name), :, : self.n_dates]
+
+    def term(self, term):
+        """(firm, date) view of one controversy term"""
+        return self._data[:, self.terms.get_loc(term), : self.n_dates]
+
+    def keyword(self, query_keyword):
+        """(date,) view of one query keyword"""
+        f, t = self._keyword_pos[query_keyword]
+        return self._data[f, t, : self.n_dates]
+
+    def as_float(self):
+        """(firm, term, date) float32 copy with NaN for missing cells"""
+        values = self.values.astype(np.float32)
+        values[self.values == MISSING] = np.nan
+        return values
+
+    def to_long(self):
+        """Long data (date, keyword, search_interest) of all non-missing cells"""
+        f, t, d = np.nonzero(self.values != MISSING)
+        keyword_of = {pos: kw for kw, pos in self._keyword_pos.items()}
+        return pd.DataFrame(
+            {
+                "date": self.dates[d],
+                "keyword": [keyword_of.get(pos) for pos in zip(f, t)],
+                "search_interest": self.values[f, t, d].astype(int),
+            }
+        )
+
+    # ----------------------------------------
+    # -- Incremental updates
+    # ----------------------------------------
+
+    def _grow_dates(self, new_dates):
+        """Add sorted new dates to the date axis
+
+        Dates after the last date are appended in place, reallocating the file in chunks
+        if capacity runs out. Earlier dates are inserted in sorted position, which
+        rewrites the file.
+        """
+        appended = not len(self.dates) or new_dates.min() > self.dates.max()
+        all_dates = self.dates.append(new_dates)
+        if not appended:
+            all_dates = all_dates.sort_values()
+        capacity = self._data.shape[2]
+
+        if len(all_dates) > capacity or not appended:
+            if self.mode == "r":
+                raise PermissionError("Cube opened read-only, cannot grow date axis")
+            new_capacity = max(capacity, len(all_dates) + DATE_CHUNK)
+            tmp_path = f"{self.path}.grow.npy"
+            grown = np.lib.format.open_memmap(
+                tmp_path,
+                mode="w+",
+                dtype=np.uint8,
+                shape=self.shape[:2] + (new_capacity,),
+            )
+            grown[:] = MISSING
+            grown[:, :, all_dates.get_indexer(self.dates)] = self.values
+            grown.flush()
+            del grown
+            self._data = None
+            os.replace(tmp_path, f"{self.path}.npy")
+            self._data = np.load(f"{self.path}.npy", mmap_mode=self.mode)
+            logger.info(
+                f"Cube file rewritten with {len(all_dates)} dates, capacity {new_capacity}"
+            )
+
+        self._all_dates = all_dates
+        self.n_dates = len(all_dates)
+
+    def update(self, df):
+        """Write a batch of long data (date, keyword, search_interest) into the cube
+
+        Unknown keywords are skipped with a warning, new dates extend the date axis and
+        keep it sorted. Missing search interest is stored as MISSING.
+
+        Returns:
+            int: number of cells written
+        """
+        if self.mode == "r":
+            raise PermissionError("Cube opened read-only")
+
+        known = df.keyword.isin(self._keyword_pos)
+        if not known.all():
+            n_unknown = df.keyword[~known].nunique()
+            logger.warning(f"Cube skips {n_unknown} keywords without labels")
+        df = df.loc[known]
+        if df.empty:
+            return 0
+
+        dates = pd.to_datetime(df["date"]).values.astype("datetime64[D]")
+        new_dates = pd.DatetimeIndex(
+            np.setdiff1d(dates, self.dates.values.astype("datetime64[D]")).astype(
+                "datetime64[ns]"
+            )
+        )
+        if len(new_dates):
+            self._grow_dates(new_dates.sort_values())
+
+        date_pos = pd.Index(self.dates.values.astype("datetime64[D]")).get_indexer(
+            dates
+        )
+        positions = np.array([self._keyword_pos[kw] for kw in df.keyword])
+        search_interest = df.search_interest.to_numpy(dtype=float)
+        missing = np.isnan(search_interest)
+        values = np.clip(np.rint(np.where(missing, 0, search_interest)), 0, 100).astype(
+            np.uint8
+        )
+        values[missing] = MISSING
+
+        self._data[positions[:, 0], positions[:, 1], date_pos] = values
+        self._data.flush()
+        self._write_meta(
+            self.path,
+            self.firms,
+            self.terms,
+            [str(d.date()) for d in self.dates],
+            self.keywords.values.tolist(),
+        )
+        return len(values)
+
+    def refresh(self):
+        """Re-read labels and date axis written by another process"""
+        self.__init__(self.path, self.mode)
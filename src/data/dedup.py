@@ -0,0 +1,240 @@
+"""
+Incremental deduplication on the write path with persistent 64-bit row hashes
+
+drop_missings_duplicates() deduplicates the whole dataset in memory on every run. A
+HashIndex instead keeps the hashes of all rows written to a dataset, so an append
+only hashes the new rows and drops those already written, independent of history size.
+
+    * rows hash on (keyword, date, geo, cat, search_interest), geo and cat default to
+      'global' and 0 for single-region files
+    * the index is a sorted uint64 .npy file, memory-mapped and probed with binary search,
+      plus an append-only log of hashes written since the last compaction
+    * the log is merged into the sorted file once it exceeds compact_ratio of it, so the
+      rewrite cost is amortized over at least that many new rows
+
+HashIndex: contains, filter_new, add
+open_index: shared index next to a CSV, built from the CSV's rows on first use
+
+Example usage:
+
+    index = open_index("data/raw/search_interest.csv")
+    df_new, stats = index.filter_new(df)
+    df_to_csv(df_new, "data/raw/search_interest.csv")
+    index.add(df_new)
+"""
+
+import logging
+import os
+import tempfile
+import threading
+
+from . import metrics
+from .lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+KEY_COLUMNS = ["keyword", "date", "geo", "cat", "search_interest"]
+KEY_DEFAULTS = {"geo": "global", "cat": 0}
+
+HASH_DTYPE = "<u8"
+
+
+def row_keys(df, columns=KEY_COLUMNS):
+    """Normalized key columns of df, missing geo and cat columns filled with defaults"""
+    keys = pd.DataFrame(index=df.index)
+    for column in columns:
+        if column in df.columns:
+            keys[column] = df[column]
+        elif column in KEY_DEFAULTS:
+            keys[column] = KEY_DEFAULTS[column]
+        else:
+            raise KeyError(f"Key column {column} missing")
+
+    # CSV round trips turn dates into strings and ints into floats
+    if "date" in keys:
+        keys["date"] = pd.to_datetime(keys["date"]).dt.normalize()
+    if "keyword" in keys:
+        keys["keyword"] = keys["keyword"].astype(str)
+    if "geo" in keys:
+        keys["geo"] = keys["geo"].fillna(KEY_DEFAULTS["geo"]).astype(str)
+    if "cat" in keys:
+        keys["cat"] = keys["cat"].fillna(KEY_DEFAULTS["cat"]).astype(int)
+    if "search_interest" in keys:
+        keys["search_interest"] = keys["search_interest"].astype(float)
+    return keys
+
+
+def row_hashes(df, columns=KEY_COLUMNS):
+    """uint64 hash per row of the normalized key columns"""
+    hashes = pd.util.hash_pandas_object(row_keys(df, columns), index=False)
+    return hashes.to_numpy(dtype=HASH_DTYPE)
+
+
+def _isin_sorted(hashes, sorted_hashes):
+    if not len(sorted_hashes) or not len(hashes):
+        return np.zeros(len(hashes), dtype=bool)
+    pos = np.searchsorted(sorted_hashes, hashes)
+    pos[pos == len(sorted_hashes)] = 0
+    return np.asarray(sorted_hashes[pos]) == hashes
+
+
+class HashIndex:
+    """Persistent set of row hashes of one dataset
+
+    Not safe across processes, run one writer per dataset.
+
+    Args:
+        path (str): sorted hashes .npy file, the log is written to path + '.log'
+        columns (list): key columns that identify a row
+        compact_ratio (float): merge the log into the sorted file once it holds more
+            than compact_ratio times the sorted hashes
+        min_compact (int): never compact logs with fewer hashes
+    """
+
+    def __init__(
+        self, path, columns=KEY_COLUMNS, compact_ratio=0.1, min_compact=50_000
+    ):
+        self.path = path
+        self.log_path = path + ".log"
+        self.columns = list(columns)
+        self.compact_ratio = compact_ratio
+        self.min_compact = min_compact
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if os.path.isfile(self.path):
+            self._sorted = np.load(self.path, mmap_mode="r")
+        else:
+            self._sorted = np.empty(0, dtype=HASH_DTYPE)
+        if os.path.isfile(self.log_path):
+            self._log = np.unique(np.fromfile(self.log_path, dtype=HASH_DTYPE))
+        else:
+            self._log = np.empty(0, dtype=HASH_DTYPE)
+
+    def exists(self):
+        return os.path.isfile(self.path) or os.path.isfile(self.log_path)
+
+    def __len__(self):
+        # the log may repeat hashes of the sorted file after an interrupted compaction
+        return len(self._sorted) + int((~_isin_sorted(self._log, self._sorted)).sum())
+
+    # ----------------------------------------
+    # -- Lookup
+    # ----------------------------------------
+
+    def contains(self, hashes):
+        """Boolean mask of hashes already in the index"""
+        hashes = np.asarray(hashes, dtype=HASH_DTYPE)
+        with self._lock:
+            return _isin_sorted(hashes, self._sorted) | _isin_sorted(hashes, self._log)
+
+    def filter_new(self, df, dataset="search_interest"):
+        """Rows of df that are complete, unique within df and not in the index
+
+        The index is not updated, call add() once the rows are written.
+
+        Returns:
+            tuple: dataframe of new rows, dict with rows_in, missing, duplicates_batch,
+                duplicates_seen and rows_out
+        """
+        rows_in = len(df)
+        df = df.dropna(subset=[c for c in self.columns if c in df.columns])
+        missing = rows_in - len(df)
+
+        hashes = row_hashes(df, self.columns)
+        _, first = np.unique(hashes, return_index=True)
+        unique = np.zeros(len(df), dtype=bool)
+        unique[first] = True
+        seen = self.contains(hashes)
+
+        keep = unique & ~seen
+        stats = {
+            "rows_in": rows_in,
+            "missing": missing,
+            "duplicates_batch": int((~unique).sum()),
+            "duplicates_seen": int((unique & seen).sum()),
+            "rows_out": int(keep.sum()),
+        }
+
+        for reason in ("missing", "duplicates_batch", "duplicates_seen"):
+            if stats[reason]:
+                metrics.ROWS_DROPPED.inc(stats[reason], dataset=dataset, reason=reason)
+        if stats["rows_out"] < rows_in:
+            logging.info(f"Dedup {dataset}: {stats}")
+
+        return df[keep].reset_index(drop=True), stats
+
+    # ----------------------------------------
+    # -- Update
+    # ----------------------------------------
+
+    def add(self, df):
+        """Record the rows of df as written"""
+        if not len(df):
+            return
+        self.add_hashes(row_hashes(df, self.columns))
+
+    def add_hashes(self, hashes):
+        hashes = np.unique(np.asarray(hashes, dtype=HASH_DTYPE))
+        with self._lock:
+            hashes = hashes[~_isin_sorted(hashes, self._sorted)]
+            hashes = hashes[~_isin_sorted(hashes, self._log)]
+            if not len(hashes):
+                return
+            with open(self.log_path, "ab") as file:
+                hashes.tofile(file)
+            self._log = np.union1d(self._log, hashes)
+
+            if len(self._log) > max(
+                self.min_compact, self.compact_ratio * len(self._sorted)
+            ):
+                self._compact()
+
+    def compact(self):
+        """Merge the log into the sorted file"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        merged = np.union1d(self._sorted, self._log).astype(HASH_DTYPE)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npy")
+        with os.fdopen(fd, "wb") as file:
+            np.save(file, merged)
+        # a crash after the replace leaves hashes in both files, which is harmless
+        os.replace(tmp_path, self.path)
+        open(self.log_path, "wb").close()
+        self._sorted = np.load(self.path, mmap_mode="r")
+        self._log = np.empty(0, dtype=HASH_DTYPE)
+        logging.debug(f"Compacted {self.path} to {len(merged)} hashes")
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_path(filepath):
+    """Hash index file of a CSV, e.g. data/raw/x.csv -> data/raw/x.csv.hashes.npy"""
+    return f"{filepath}.hashes.npy"
+
+
+def open_index(filepath, columns=KEY_COLUMNS):
+    """Shared HashIndex of the CSV filepath
+
+    A new index of an existing CSV is seeded with the CSV's rows once, later appends
+    only hash their new rows.
+    """
+    path = os.path.abspath(index_path(filepath))
+    with _indexes_lock:
+        if path not in _indexes:
+            index = HashIndex(path, columns=columns)
+            if not index.exists() and os.path.isfile(filepath):
+                logging.info(f"Build hash index of {filepath}")
+                for chunk in pd.read_csv(filepath, chunksize=500_000):
+                    index.add(chunk.dropna(subset=["keyword", "date"]))
+                index.compact()
+            _indexes[path] = index
+        return _indexes[path]
@@ -0,0 +1,275 @@
+"""
+Point-in-time history of Yahoo ESG scores with delta-only writes
+
+Each fetch of get_index_firm_esg() is a full snapshot, but scores move slowly. The
+history stores only the fields of a ticker whose value changed since the ticker's
+state as of the fetch date, so daily snapshots of thousands of tickers stay small:
+
+    esg_deltas   (yahoo_ticker, field, as_of_date) -> value, null once a field turns
+                 missing in the fetched data. Numbers and strings are stored natively,
+                 lists and dicts like relatedControversy as JSON.
+    esg_fetches  as_of_date -> tickers fetched, deltas written
+
+The primary key doubles as index for as-of queries: rows are stored in (ticker, field,
+date) order, so the latest as_of_date <= X per ticker and field takes one ordered pass.
+
+Main functions
+    record_snapshot: write the deltas of a fetch
+    scores_as_of: wide scores of all or selected tickers as of a date
+    field_history: change points of fields, e.g. to align with controversy attention
+
+Example usage:
+
+    record_snapshot(esg_df, db_path="data/esg.sqlite", as_of_date="2023-01-15")
+    df = scores_as_of("2023-03-31", fields=["totalEsg", "highestControversy"])
+"""
+
+import json
+import logging
+import math
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+from . import metrics
+from .lazy_imports import lazy_import
+from .storage import DEFAULT_DB_PATH
+
+pd = lazy_import("pandas")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS esg_deltas (
+    yahoo_ticker TEXT NOT NULL,
+    field TEXT NOT NULL,
+    as_of_date TEXT NOT NULL,
+    value,
+    is_json INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (yahoo_ticker, field, as_of_date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_esg_deltas_field ON esg_deltas (field, as_of_date);
+
+CREATE TABLE IF NOT EXISTS esg_fetches (
+    as_of_date TEXT PRIMARY KEY,
+    tickers INTEGER,
+    deltas INTEGER,
+    recorded_at TEXT
+);
+"""
+
+# columns that describe the query, not the firm
+EXCLUDE_FIELDS = ["yahoo_ticker", "query_keyword"]
+
+
+def connect(db_path=DEFAULT_DB_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    con = sqlite3.connect(db_path, timeout=30)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript(SCHEMA)
+    return con
+
+
+def encode_value(value):
+    """(stored value, is_json) of a cell, NaN and None as None so missing values compare equal"""
+    if hasattr(value, "item") and not hasattr(value, "__len__"):
+        value = value.item()  # numpy scalar
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None, 0
+    if isinstance(value, (int, float, str)) and not isinstance(value, bool):
+        return value, 0
+    if isinstance(value, datetime):
+        return value.isoformat(), 0
+    return json.dumps(value, sort_keys=True, default=str), 1
+
+
+def decode_value(value, is_json):
+    return json.loads(value) if is_json else value
+
+
+def _as_of_query(n_tickers=None, n_fields=None):
+    conditions = ["as_of_date <= ?"]
+    if n_tickers:
+        conditions.append(f"yahoo_ticker IN ({','.join('?' * n_tickers)})")
+    if n_fields:
+        conditions.append(f"field IN ({','.join('?' * n_fields)})")
+    # SQLite takes bare columns from the row holding max(), one pass over the key index
+    return f"""
+        SELECT yahoo_ticker, field, value, is_json, max(as_of_date)
+        FROM esg_deltas
+        WHERE {" AND ".join(conditions)}
+        GROUP BY yahoo_ticker, field
+    """
+
+
+def _state(con, as_of_date, tickers=None, fields=None):
+    """(ticker, field) -> (value, is_json) as of as_of_date, fields set to null excluded"""
+    tickers, fields = list(tickers or []), list(fields or [])
+    rows = con.execute(
+        _as_of_query(len(tickers), len(fields)), [as_of_date] + tickers + fields
+    ).fetchall()
+    return {(t, f): (v, j) for t, f, v, j, _ in rows if v is not None}
+
+
+# ----------------------------------------
+# -- Write path
+# ----------------------------------------
+
+
+def _compensating_deltas(con, as_of_date, deltas, state):
+    """Deltas at the next fetch after as_of_date that keep its values of backfilled fields
+
+    Args:
+        deltas (list): (ticker, field, as_of_date, value, is_json) to be written
+        state (dict): (ticker, field) -> (value, is_json) as of as_of_date before the write
+    """
+    next_fetch = con.execute(
+        "SELECT min(as_of_date) FROM esg_fetches WHERE as_of_date > ?", (as_of_date,)
+    ).fetchone()[0]
+    if next_fetch is None or not deltas:
+        return []
+
+    changed = set(
+        con.execute(
+            """
+            SELECT yahoo_ticker, field FROM esg_deltas
+            WHERE as_of_date > ? AND as_of_date <= ?
+            """,
+            (as_of_date, next_fetch),
+        ).fetchall()
+    )
+    return [
+        (ticker, field, next_fetch) + state.get((ticker, field), (None, 0))
+        for ticker, field, *_ in deltas
+        if (ticker, field) not in changed
+    ]
+
+
+def record_snapshot(esg_df, db_path=DEFAULT_DB_PATH, as_of_date=None, fields=None):
+    """Write the fields that changed since the state as of as_of_date
+
+    When backfilling a date before the latest fetch, a changed field without a delta
+    up to the next recorded fetch gets a compensating delta at that fetch with the
+    value it had there, so scores as of later dates do not change.
+
+    Args:
+        esg_df (Dataframe): one row per yahoo_ticker, e.g. get_index_firm_esg() output
+        db_path (str): SQLite database, shared with storage.py by default
+        as_of_date (str): fetch date 'YYYY-MM-DD', defaults to today
+        fields (list): columns to track, defaults to all but EXCLUDE_FIELDS
+
+    Returns:
+        int: deltas written
+    """
+    as_of_date = str(as_of_date or datetime.utcnow().strftime("%Y-%m-%d"))[:10]
+    esg_df = esg_df.drop_duplicates("yahoo_ticker")
+    fields = fields or [c for c in esg_df.columns if c not in EXCLUDE_FIELDS]
+    tickers = esg_df["yahoo_ticker"].astype(str).tolist()
+
+    with closing(connect(db_path)) as con, con:
+        state = _state(con, as_of_date)
+        deltas = []
+        for ticker, record in zip(tickers, esg_df[fields].to_dict(orient="records")):
+            for field, value in record.items():
+                encoded = encode_value(value)
+                if state.get((ticker, field), (None, 0)) != encoded:
+                    deltas.append((ticker, field, as_of_date) + encoded)
+        deltas += _compensating_deltas(con, as_of_date, deltas, state)
+
+        con.executemany(
+            """
+            INSERT INTO esg_deltas (yahoo_ticker, field, as_of_date, value, is_json)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (yahoo_ticker, field, as_of_date) DO UPDATE SET
+                value = excluded.value, is_json = excluded.is_json
+            """,
+            deltas,
+        )
+        con.execute(
+            """
+            INSERT INTO esg_fetches (as_of_date, tickers, deltas, recorded_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (as_of_date) DO UPDATE SET tickers = excluded.tickers,
+                deltas = esg_fetches.deltas + excluded.deltas,
+                recorded_at = excluded.recorded_at
+            """,
+            (
+                as_of_date,
+                len(tickers),
+                len(deltas),
+                datetime.utcnow().isoformat(timespec="seconds"),
+            ),
+        )
+
+    metrics.ROWS_WRITTEN.inc(len(deltas), dataset="esg_deltas")
+    logging.info(
+        f"ESG history {as_of_date}: {len(deltas)} changed fields of {len(tickers)} tickers"
+    )
+    return len(deltas)
+
+
+# ----------------------------------------
+# -- Read path
+# ----------------------------------------
+
+
+def scores_as_of(as_of_date, db_path=DEFAULT_DB_PATH, tickers=None, fields=None):
+    """Latest value of every field per ticker on or before as_of_date
+
+    Returns:
+        Dataframe: yahoo_ticker as index, one column per field
+    """
+    with closing(connect(db_path)) as con:
+        state = _state(con, str(as_of_date)[:10], tickers, fields)
+    if not state:
+        return pd.DataFrame(index=pd.Index([], name="yahoo_ticker"))
+
+    long = pd.DataFrame(
+        [(t, f, decode_value(v, j)) for (t, f), (v, j) in state.items()],
+        columns=["yahoo_ticker", "field", "value"],
+    )
+    wide = long.pivot(index="yahoo_ticker", columns="field", values="value")
+    wide.columns.name = None
+    # numeric fields back to numbers, the pivot holds objects
+    for column in wide.columns:
+        converted = pd.to_numeric(wide[column], errors="coerce")
+        if converted.notna().sum() == wide[column].notna().sum():
+            wide[column] = converted
+    return wide
+
+
+def field_history(fields, db_path=DEFAULT_DB_PATH, tickers=None, start=None, end=None):
+    """Change points of fields per ticker, forward fill between dates for daily values
+
+    Returns:
+        Dataframe: as_of_date, yahoo_ticker, field, value
+    """
+    fields, tickers = list(fields), list(tickers or [])
+    conditions = [f"field IN ({','.join('?' * len(fields))})"]
+    params = fields
+    if tickers:
+        conditions.append(f"yahoo_ticker IN ({','.join('?' * len(tickers))})")
+        params += tickers
+    for value, op in [(start, ">="), (end, "<=")]:
+        if value is not None:
+            conditions.append(f"as_of_date {op} ?")
+            params.append(str(value)[:10])
+
+    with closing(connect(db_path)) as con:
+        df = pd.read_sql_query(
+            f"""
+            SELECT as_of_date, yahoo_ticker, field, value, is_json FROM esg_deltas
+            WHERE {" AND ".join(conditions)}
+            ORDER BY yahoo_ticker, field, as_of_date
+            """,
+            con,
+            params=params,
+            parse_dates=["as_of_date"],
+        )
+    df["value"] = [decode_value(v, j) for v, j in zip(df["value"], df["is_json"])]
+    return df.drop(columns="is_json")
+
+
+def fetches(db_path=DEFAULT_DB_PATH):
+    """Recorded fetch dates with tickers and deltas written"""
+    with closing(connect(db_path)) as con:
+        return pd.read_sql_query("SELECT * FROM esg_fetches ORDER BY as_of_date", con)
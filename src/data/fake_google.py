@@ -0,0 +1,611 @@
+"""
+Offline stand-in for Google Trends and Google search to load-test the ingestion stack
+
+Serves the endpoints that pytrends and google_results.py call, so that
+get_interest_over_time(), get_related_queries_pipeline() and
+get_results_count_pipeline() can run against localhost without touching Google.
+
+Emulated endpoints
+    * /trends/explore, /        cookie page (NID cookie)
+    * POST /trends/api/explore                  widget tokens
+    * GET /trends/api/widgetdata/multiline      interest over time
+    * GET /trends/api/widgetdata/relatedsearches  related queries (top, rising)
+    * GET /search?q=                            result-stats page
+
+Search interest is drawn from a deterministic latent daily series per keyword.
+Overlapping windows therefore agree with each other up to Google's 0-100 rescaling,
+and two runs with the same seed return identical data.
+
+Example usage:
+
+    from src.data.fake_google import FakeGoogleConfig, FakeGoogleServer
+    from src.data import google_trends as gt
+
+    config = FakeGoogleConfig(latency={"default": {"dist": "lognormal", "median_ms": 80}}, rate_429=0.05)
+    with FakeGoogleServer(config) as server:
+        gt.get_interest_over_time(keywords, "out.csv", "failed.csv", timeout=0, base_url=server.base_url)
+"""
+
+import json
+import logging
+import math
+import random
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, unquote_plus, urlsplit
+
+logger = logging.getLogger(__name__)
+
+EPOCH = date(1970, 1, 1)
+ENDPOINTS = ["cookie", "explore", "multiline", "relatedsearches", "search"]
+
+RELATED_VOCABULARY = [
+    "news",
+    "stock",
+    "share price",
+    "scandal",
+    "lawsuit",
+    "emissions",
+    "ceo",
+    "strike",
+    "fine",
+    "investigation",
+    "annual report",
+    "esg",
+    "sustainability",
+    "controversy",
+    "recall",
+    "fraud",
+    "layoffs",
+    "dividend",
+    "pollution",
+    "protest",
+]
+
+
+# ----------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------
+
+
+@dataclass
+class FakeGoogleConfig:
+    """Behaviour of the fake server
+
+    Args:
+        latency (dict): latency spec per endpoint name (see ENDPOINTS) with a "default" fallback.
+            A spec is a dict like {"dist": "lognormal", "median_ms": 120, "sigma": 0.5}.
+            Supported dists: constant (ms), uniform (low_ms, high_ms), exponential (mean_ms),
+            normal (mean_ms, sd_ms), lognormal (median_ms, sigma)
+        rate_429 (float): share of API requests answered with HTTP 429
+        empty_rate (float): share of API requests answered with an empty but valid payload
+        malformed_rate (float): share of API requests answered with truncated JSON or broken HTML
+        zero_volume_share (float): share of keywords without any search volume
+        spike_rate (float): daily probability of a controversy spike in the latent series
+        seed (int): seed for fault injection, latency sampling and synthetic data
+        today (str): reference date 'YYYY-MM-DD' for relative timeframes, defaults to the current date
+    """
+
+    latency: Dict[str, dict] = field(
+        default_factory=lambda: {"default": {"dist": "constant", "ms": 0}}
+    )
+    rate_429: float = 0.0
+    empty_rate: float = 0.0
+    malformed_rate: float = 0.0
+    zero_volume_share: float = 0.1
+    spike_rate: float = 0.004
+    seed: int = 0
+    today: Optional[str] = None
+
+    def reference_date(self) -> date:
+        if self.today is None:
+            return date.today()
+        return datetime.strptime(self.today, "%Y-%m-%d").date()
+
+
+def sample_latency(spec, rng):
+    """Returns latency in seconds drawn from a latency spec (see FakeGoogleConfig)"""
+    dist = spec.get("dist", "constant")
+
+    if dist == "constant":
+        ms = spec.get("ms", 0)
+    elif dist == "uniform":
+        ms = rng.uniform(spec.get("low_ms", 0), spec.get("high_ms", 0))
+    elif dist == "exponential":
+        mean_ms = spec.get("mean_ms", 0)
+        ms = rng.expovariate(1 / mean_ms) if mean_ms > 0 else 0
+    elif dist == "normal":
+        ms = rng.gauss(spec.get("mean_ms", 0), spec.get("sd_ms", 0))
+    elif dist == "lognormal":
+        ms = rng.lognormvariate(
+            math.log(spec.get("median_ms", 1)), spec.get("sigma", 0.5)
+        )
+    else:
+        raise ValueError(f"Unknown latency distribution: {dist}")
+
+    return max(ms, 0) / 1000
+
+
+# ----------------------------------------------------------
+# Synthetic data
+# ----------------------------------------------------------
+
+
+def _mix(*values):
+    """Deterministic 64-bit hash of integers (splitmix64 finaliser)"""
+    x = 0x9E3779B97F4A7C15
+    for v in values:
+        x = (x ^ (v & 0xFFFFFFFFFFFFFFFF)) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF
+        x = (x ^ (x >> 27)) * 0x94D049BB133111EB & 0xFFFFFFFFFFFFFFFF
+        x ^= x >> 31
+    return x
+
+
+def _unit(*values):
+    """Deterministic float in [0, 1) from integers"""
+    return _mix(*values) / 2**64
+
+
+@lru_cache(maxsize=4096)
+def _keyword_profile(keyword, seed, zero_volume_share):
+    """Level, seasonal amplitude, period and phase of the latent series for a keyword"""
+    kw_hash = zlib.crc32(keyword.casefold().encode("utf-8"))
+    if _unit(seed, kw_hash, 1) < zero_volume_share:
+        return kw_hash, 0.0, 0.0, 1.0, 0.0
+
+    level = 10 + 90 * _unit(seed, kw_hash, 2)
+    amplitude = 0.5 * _unit(seed, kw_hash, 3)
+    period = 60 + 300 * _unit(seed, kw_hash, 4)
+    phase = 2 * math.pi * _unit(seed, kw_hash, 5)
+
+    return kw_hash, level, amplitude, period, phase
+
+
+@lru_cache(maxsize=2**20)
+def _latent_value(keyword, day, seed, zero_volume_share, spike_rate):
+    """Search volume of keyword on day (days since 1970-01-01) on an absolute scale"""
+    kw_hash, level, amplitude, period, phase = _keyword_profile(
+        keyword, seed, zero_volume_share
+    )
+    if level == 0:
+        return 0.0
+
+    seasonal = 1 + amplitude * math.sin(2 * math.pi * day / period + phase)
+    noise = 0.3 * (_unit(seed, kw_hash, day, 6) - 0.5)
+    value = level * (seasonal + noise)
+
+    # controversy spikes decay over a week
+    for age in range(7):
+        if _unit(seed, kw_hash, day - age, 7) < spike_rate:
+            value += 4 * level * 0.5**age
+
+    return max(value, 0.0)
+
+
+def parse_timeframe(timeframe, today):
+    """Returns the points of a Trends timeline as (start datetime, span in hours)
+
+    Google's resolution rules: daily below ~270 days, weekly up to ~5 years,
+    monthly beyond and hourly for 'now' timeframes.
+    """
+    end = today
+    resolution = None
+
+    try:
+        if timeframe == "all":
+            start = date(2004, 1, 1)
+        elif timeframe.startswith("today "):
+            n, unit = timeframe.split(" ")[1].split("-")
+            n = int(n)
+            if unit == "y":
+                start = date(end.year - n, end.month, min(end.day, 28))
+            else:
+                start = end - timedelta(days=30 * n)
+        elif timeframe.startswith("now "):
+            n, unit = timeframe.split(" ")[1].split("-")
+            hours = int(n) * (24 if unit == "d" else 1)
+            stop = datetime(end.year, end.month, end.day, tzinfo=timezone.utc)
+            return [(stop - timedelta(hours=hours - h), 1) for h in range(hours)]
+        else:
+            start_str, end_str = timeframe.split(" ")
+            start = datetime.strptime(start_str[:10], "%Y-%m-%d").date()
+            end = datetime.strptime(end_str[:10], "%Y-%m-%d").date()
+    except ValueError:
+        logger.warning(f"Unknown timeframe {timeframe}, fall back to 'today 5-y'")
+        return parse_timeframe("today 5-y", today)
+
+    span = (end - start).days
+    if span <= 269:
+        resolution = "daily"
+    elif span <= 1890:
+        resolution = "weekly"
+    else:
+        resolution = "monthly"
+
+    points = []
+    if resolution == "daily":
+        day = start
+        while day <= end:
+            points.append((day, 24))
+            day += timedelta(days=1)
+    elif resolution == "weekly":
+        # weeks start on Sunday
+        day = start + timedelta(days=(6 - start.weekday()) % 7)
+        while day <= end:
+            points.append((day, 24 * 7))
+            day += timedelta(days=7)
+    else:
+        day = date(start.year, start.month, 1)
+        while day <= end:
+            next_month = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+            points.append((day, 24 * (next_month - day).days))
+            day = next_month
+
+    return [
+        (datetime(d.year, d.month, d.day, tzinfo=timezone.utc), hours)
+        for d, hours in points
+    ]
+
+
+# ----------------------------------------------------------
+# Server
+# ----------------------------------------------------------
+
+
+class FakeGoogleServer:
+    """Threaded HTTP server emulating Google Trends and Google search
+
+    Use as context manager or call start() and stop(). Point pytrends at base_url with
+    google_trends.create_pytrends_session(base_url=...) and the results count
+    pipeline at search_url.
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or FakeGoogleConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def search_url(self):
+        return f"{self.base_url}/search?q="
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="fake-google", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Fake Google server listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        logger.info(f"Fake Google server stopped: {self.stats()}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        """Request counts per endpoint and outcome"""
+        with self._lock:
+            return {endpoint: dict(counts) for endpoint, counts in self._stats.items()}
+
+    # -- request handling helpers, called from handler threads
+
+    def _record(self, endpoint, outcome):
+        with self._lock:
+            counts = self._stats.setdefault(endpoint, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+
+    def _draw(self, endpoint):
+        """Draw latency and fault for one request under the lock to stay reproducible"""
+        spec = self.config.latency.get(endpoint, self.config.latency.get("default", {}))
+        with self._lock:
+            latency = sample_latency(spec, self._rng)
+            if endpoint == "cookie":
+                return latency, None
+            u = self._rng.random()
+
+        fault = None
+        if u < self.config.rate_429:
+            fault = "429"
+        elif u < self.config.rate_429 + self.config.empty_rate:
+            fault = "empty"
+        elif (
+            u
+            < self.config.rate_429 + self.config.empty_rate + self.config.malformed_rate
+        ):
+            fault = "malformed"
+        return latency, fault
+
+    def _timeline(self, keywords, timeframe):
+        """timelineData entries for keywords, scaled to 0-100 like Google does"""
+        config = self.config
+        today = config.reference_date()
+        points = parse_timeframe(timeframe, today)
+
+        values = []
+        for start, hours in points:
+            first_day = (start.date() - EPOCH).days
+            n_days = max(hours // 24, 1)
+            row = []
+            for kw in keywords:
+                day_values = [
+                    _latent_value(
+                        kw, d, config.seed, config.zero_volume_share, config.spike_rate
+                    )
+                    for d in range(first_day, first_day + n_days)
+                ]
+                row.append(sum(day_values) / n_days)
+            values.append(row)
+
+        peak = max((v for row in values for v in row), default=0)
+        if peak == 0:
+            # Google answers with an empty timeline if no keyword has data
+            return []
+
+        now = datetime(today.year, today.month, today.day, tzinfo=timezone.utc)
+        timeline = []
+        for (start, hours), row in zip(points, values):
+            scaled = [int(round(100 * v / peak)) for v in row]
+            entry = {
+                "time": str(int(start.timestamp())),
+                "formattedTime": start.strftime("%b %d, %Y"),
+                "value": scaled,
+                "hasData": [v > 0 for v in scaled],
+                "formattedValue": [str(v) for v in scaled],
+            }
+            if start + timedelta(hours=hours) > now + timedelta(days=1):
+                entry["isPartial"] = True
+            timeline.append(entry)
+
+        return timeline
+
+    def _related(self, keyword):
+        """rankedList with top and rising related queries for keyword"""
+        seed = self.config.seed
+        kw_hash = zlib.crc32(keyword.casefold().encode("utf-8"))
+        n_top = 5 + int(15 * _unit(seed, kw_hash, 11))
+        n_rising = int(10 * _unit(seed, kw_hash, 12))
+
+        def query(i, salt):
+            word = RELATED_VOCABULARY[
+                int(len(RELATED_VOCABULARY) * _unit(seed, kw_hash, i, salt))
+            ]
+            return (
+                f"{keyword} {word}" if _unit(seed, kw_hash, i, salt + 1) < 0.7 else word
+            )
+
+        top, rising = [], []
+        for i in range(n_top):
+            value = max(100 - int(i * 100 / n_top), 1)
+            top.append(
+                {"query": query(i, 13), "value": value, "formattedValue": str(value)}
+            )
+        for i in range(n_rising):
+            value = 50 * int(1 + 200 * _unit(seed, kw_hash, i, 15))
+            rising.append(
+                {
+                    "query": query(i, 16),
+                    "value": value,
+                    "formattedValue": "Breakout" if value > 5000 else f"+{value}%",
+                }
+            )
+
+        # deduplicate queries, keep first occurence
+        for ranked in (top, rising):
+            seen = set()
+            ranked[:] = [
+                q for q in ranked if not (q["query"] in seen or seen.add(q["query"]))
+            ]
+
+        return [{"rankedKeyword": top}, {"rankedKeyword": rising}]
+
+    def _results_count(self, keyword):
+        kw_hash = zlib.crc32(keyword.casefold().encode("utf-8"))
+        return int(10 ** (3 + 6 * _unit(self.config.seed, kw_hash, 21)))
+
+
+# path -> endpoint, handled by FakeGoogleHandler._<endpoint>
+ROUTES = {
+    "/trends/api/explore": "explore",
+    "/trends/api/widgetdata/multiline": "multiline",
+    "/trends/api/widgetdata/relatedsearches": "relatedsearches",
+    "/search": "search",
+    "/": "cookie",
+    "/trends": "cookie",
+    "/trends/": "cookie",
+}
+
+
+def _route(path):
+    """Endpoint of a request path, None if unknown"""
+    if path.startswith("/trends/explore"):
+        return "cookie"
+    return ROUTES.get(path)
+
+
+class FakeGoogleHandler(BaseHTTPRequestHandler):
+    """Request handler, subclassed per FakeGoogleServer by _make_handler()"""
+
+    fake = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self._dispatch()
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        endpoint = _route(url.path)
+        if endpoint is None:
+            self.fake._record("unknown", "404")
+            self._send(404, "text/html", b"<html>Not found</html>")
+            return
+
+        latency, fault = self.fake._draw(endpoint)
+        time.sleep(latency)
+        self.fake._record(endpoint, fault or "ok")
+
+        if fault == "429":
+            self._send(429, "text/html", b"<html>Too many requests</html>")
+            return
+
+        try:
+            getattr(self, f"_{endpoint}")(params, fault)
+        except (KeyError, ValueError, IndexError) as e:
+            self.fake._record(endpoint, "bad_request")
+            self._send(400, "text/html", f"<html>{e}</html>".encode("utf-8"))
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, prefix, payload, fault):
+        body = prefix + json.dumps(payload)
+        if fault == "malformed":
+            body = body[: len(body) // 2]
+        self._send(200, "application/json; charset=utf-8", body.encode("utf-8"))
+
+    def _cookie(self, params, fault):
+        self._send(
+            200,
+            "text/html",
+            b"<html>Google Trends</html>",
+            headers={"Set-Cookie": "NID=fake-google; Path=/"},
+        )
+
+    def _explore(self, params, fault):
+        req = json.loads(params["req"])
+        items = req["comparisonItem"]
+        keywords = [item["keyword"] for item in items]
+        timeframe = items[0]["time"] if items else "today 5-y"
+        geo = items[0].get("geo", "") if items else ""
+
+        def restriction(kw):
+            return {
+                "geo": {"country": geo} if geo else {},
+                "time": timeframe,
+                "complexKeywordsRestriction": {
+                    "keyword": [{"type": "BROAD", "value": kw}]
+                },
+            }
+
+        widgets = [
+            {
+                "id": "TIMESERIES",
+                "token": "fake-timeseries",
+                "request": {
+                    "time": timeframe,
+                    "comparisonItem": [restriction(kw) for kw in keywords],
+                    "requestOptions": {"category": req.get("category", 0)},
+                },
+            }
+        ]
+        for i, kw in enumerate(keywords):
+            widgets.append(
+                {
+                    "id": "RELATED_QUERIES" + (f"_{i}" if i else ""),
+                    "token": f"fake-related-{i}",
+                    "request": {"restriction": restriction(kw)},
+                }
+            )
+
+        self._send_json(")]}'", {"widgets": widgets}, fault)
+
+    def _multiline(self, params, fault):
+        req = json.loads(params["req"])
+        keywords = [
+            item["complexKeywordsRestriction"]["keyword"][0]["value"]
+            for item in req["comparisonItem"]
+        ]
+        timeline = (
+            [] if fault == "empty" else self.fake._timeline(keywords, req["time"])
+        )
+        self._send_json(")]}',", {"default": {"timelineData": timeline}}, fault)
+
+    def _relatedsearches(self, params, fault):
+        req = json.loads(params["req"])
+        keyword = req["restriction"]["complexKeywordsRestriction"]["keyword"][0][
+            "value"
+        ]
+        if fault == "empty":
+            ranked = [{"rankedKeyword": []}, {"rankedKeyword": []}]
+        else:
+            ranked = self.fake._related(keyword)
+        self._send_json(")]}',", {"default": {"rankedList": ranked}}, fault)
+
+    def _search(self, params, fault):
+        keyword = unquote_plus(params["q"])
+        if fault == "empty":
+            body = "<html><body><p>Your search did not match any documents.</p></body></html>"
+        elif fault == "malformed":
+            body = '<html><body><div id="result-stats">About <b'
+        else:
+            count = f"{self.fake._results_count(keyword):,}"
+            body = (
+                f'<html><body><div id="result-stats">About {count} results'
+                "<nobr> (0.42 seconds)&nbsp;</nobr></div></body></html>"
+            )
+        self._send(200, "text/html; charset=UTF-8", body.encode("utf-8"))
+
+
+def _make_handler(server):
+    """Handler class bound to a FakeGoogleServer instance"""
+    return type("FakeGoogleHandler", (FakeGoogleHandler,), {"fake": server})
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run an offline fake Google server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", help="JSON file with FakeGoogleConfig fields")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = FakeGoogleConfig()
+    if args.config:
+        with open(args.config) as file:
+            config = FakeGoogleConfig(**json.load(file))
+
+    with FakeGoogleServer(config, port=args.port) as server:
+        print(f"Serving on {server.base_url}, press Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -3,16 +3,33 @@ Extract results count from Google with beautiful soup
 
 Methods take a list of keywords and return a dataframe.
 
+Fetching is network-bound, parsing with beautiful soup is CPU-bound and holds the GIL.
+get_results_counts() runs them as two stages: threads fetch raw pages into a bounded
+queue, a process pool parses them, so parsing scales with cores while fetches overlap.
+Small batches parse in the calling thread, a pool per batch would cost more than it saves.
+
 """
 
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+import os
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
 import logging
+from .lazy_imports import lazy_import
+from . import metrics, storage
+
+pd = lazy_import("pandas")
+requests = lazy_import("requests")
+bs4 = lazy_import("bs4")
 
 logger = logging.getLogger(__name__)
 
+# URLs below which get_results_counts() parses in the calling thread by default
+PARSE_INLINE_BELOW = 32
+# end of a fetch thread on the pages queue
+_DONE = object()
+
 
 def create_search_url(keyword_list, url="https://www.google.com/search?q="):
     """Create Google search URL for a keyword from keyword_list
@@ -31,6 +48,27 @@ def create_search_url(keyword_list, url="https://www.google.com/search?q="):
     return [url + sq for sq in search_query]
 
 
+def fetch_results_page(search_url, user_agent, session=None):
+    """Raw HTML of a Google search URL, network only"""
+    with metrics.track_request("results_count"):
+        result = (session or requests).get(search_url, headers=user_agent)
+        result.raise_for_status()
+    return result.content
+
+
+def parse_results_count(content):
+    """Results count in the HTML of a search page, CPU only and picklable for processes"""
+    soup = bs4.BeautifulSoup(content, "html.parser")
+
+    #  string that contains results count 'About 1,410,000,000 results'
+    total_results_text = soup.find("div", {"id": "result-stats"}).find(
+        text=True, recursive=False
+    )
+
+    # extract number
+    return int("".join([num for num in total_results_text if num.isdigit()]))
+
+
 def get_results_count(keyword, user_agent):
     """Gets Google's result count for a keyword
 
@@ -41,22 +79,131 @@ def get_results_count(keyword, user_agent):
     Returns:
         int: Results count
     """
-    result = requests.get(keyword, headers=user_agent)
-    soup = BeautifulSoup(result.content, "html.parser")
+    return parse_results_count(fetch_results_page(keyword, user_agent))
 
-    #  string that contains results count 'About 1,410,000,000 results'
-    total_results_text = soup.find("div", {"id": "result-stats"}).find(
-        text=True, recursive=False
-    )
 
-    # extract number
-    results_num = int("".join([num for num in total_results_text if num.isdigit()]))
+def _start_fetchers(search_urls, user_agent, fetch_workers, pages, stop):
+    """Fetch stage: threads put (index, page or error) on pages, then _DONE each"""
+    todo = queue.Queue()
+    for i, url in enumerate(search_urls):
+        todo.put((i, url))
+
+    def fetch():
+        # requests.Session is not thread-safe, one per fetch thread
+        session = requests.Session()
+        while not stop.is_set():
+            try:
+                i, url = todo.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                pages.put((i, fetch_results_page(url, user_agent, session)))
+            except Exception as e:
+                pages.put((i, e))
+        pages.put(_DONE)
+
+    fetchers = [
+        threading.Thread(target=fetch, daemon=True)
+        for _ in range(min(fetch_workers, len(search_urls)))
+    ]
+    for thread in fetchers:
+        thread.start()
+    return fetchers
+
+
+def _parse_pages(pages, fetchers, counts, errors, stop, executor, max_in_flight):
+    """Parse stage: parse pages until every fetcher is done, inline if no executor"""
+    in_flight = {}
+
+    def collect(futures):
+        for future in futures:
+            i = in_flight.pop(future)
+            try:
+                counts[i] = future.result()
+            except Exception as e:
+                errors[i] = e
+
+    try:
+        running = fetchers
+        while running:
+            item = pages.get()
+            if item is _DONE:
+                running -= 1
+                continue
+            i, content = item
+            if isinstance(content, Exception):
+                errors[i] = content
+                stop.set()
+            elif executor is None:
+                try:
+                    counts[i] = parse_results_count(content)
+                except Exception as e:
+                    errors[i] = e
+            else:
+                in_flight[executor.submit(parse_results_count, content)] = i
+                if len(in_flight) >= max_in_flight:
+                    collect(wait(in_flight, return_when=FIRST_COMPLETED)[0])
+        collect(list(in_flight))
+    finally:
+        stop.set()
+        for future in in_flight:
+            future.cancel()
+
+
+def get_results_counts(
+    search_urls, user_agent, fetch_workers=4, parse_workers=None, queue_size=None
+):
+    """Results counts of search_urls with concurrent fetching and parsing in processes
+
+    Fetch threads put raw pages into a queue of queue_size pages, fetches block while it
+    is full. The calling thread feeds the pages to a process pool with at most
+    2 * parse_workers parses in flight, so memory stays bounded when parsing lags.
 
-    return results_num
+    Args:
+        search_urls (list): output of create_search_url()
+        user_agent (dict): request headers
+        fetch_workers (int): concurrent requests
+        parse_workers (int): parsing processes. Defaults to the number of cores for
+            PARSE_INLINE_BELOW or more URLs, below that starting the pool costs more
+            than parsing. 0 parses in the calling thread.
+        queue_size (int): pages buffered between the stages, defaults to 2 * fetch_workers
+
+    Returns:
+        list: results count per URL in order. Raises the first error after all stages stopped.
+    """
+    if parse_workers is None:
+        parse_workers = os.cpu_count() if len(search_urls) >= PARSE_INLINE_BELOW else 0
+    pages = queue.Queue(maxsize=queue_size or 2 * fetch_workers)
+    stop = threading.Event()
+    fetchers = _start_fetchers(search_urls, user_agent, fetch_workers, pages, stop)
+
+    counts = [None] * len(search_urls)
+    errors = {}
+    executor = ProcessPoolExecutor(parse_workers) if parse_workers else None
+    try:
+        _parse_pages(
+            pages, len(fetchers), counts, errors, stop, executor, 2 * parse_workers
+        )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if errors:
+        i = min(errors)
+        logging.error(
+            f"Results count failed for {len(errors)} URLs, first {search_urls[i]}"
+        )
+        raise errors[i]
+    return counts
 
 
 def get_results_count_pipeline(
-    keyword_list, user_agent, url="https://www.google.com/search?q="
+    keyword_list,
+    user_agent,
+    url="https://www.google.com/search?q=",
+    storage_path=None,
+    fetch_workers=4,
+    parse_workers=None,
 ):
     """Google results count for each keyword of keyword_list in a dataframe
 
@@ -64,6 +211,10 @@ def get_results_count_pipeline(
         keyword_list (list): The keywords for which to get the results count
         user_agent (string): For example {"User-Agent": "Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.149 Safari/537.36"}
         url (string): Google's base search URL like "https://www.google.com/search?q=" (default)
+        storage_path (string): SQLite database to upsert results into, see storage.py
+        fetch_workers (int): concurrent requests, see get_results_counts()
+        parse_workers (int): parsing processes, see get_results_counts(). Batches below
+            PARSE_INLINE_BELOW keywords parse in the calling thread by default.
 
     Returns:
         dataframe: Google results count and query metadata
@@ -77,8 +228,13 @@ def get_results_count_pipeline(
         >> keyword_list = ['pizza', 'lufthansa']
         >> result_counts = get_results_count_pipeline(keyword_list, user_agent, base_url)
     """
-    search_urls = create_search_url(keyword_list)
-    result_count = [get_results_count(url, user_agent) for url in search_urls]
+    search_urls = create_search_url(keyword_list, url=url)
+    result_count = get_results_counts(
+        search_urls,
+        user_agent,
+        fetch_workers=fetch_workers,
+        parse_workers=parse_workers,
+    )
 
     df = pd.DataFrame(
         {
@@ -90,6 +246,9 @@ def get_results_count_pipeline(
     )
 
     assert_google_results(df=df, keyword_list=keyword_list, url=url)
+    metrics.record_batch("results_count")
+    if storage_path is not None:
+        storage.upsert_results_count(df, db_path=storage_path)
 
     return df
 
@@ -5,28 +5,76 @@ Methods take one keyword, call pytrends and return processed data as CSV or data
 Main functions
     (1) get_related_queries_pipeline: Returns dataframe of trending searches for a given topic
     (2) get_interest_over_time: Returns CSV with interest over time for specified keywords
+    (3) get_interest_over_time_grid, get_related_queries_grid: same queries for lists of geos
+        and categories, run concurrently under a shared rate limiter
 """
 
-import pandas as pd
-import numpy as np
 import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from random import randint
-from pytrends.request import TrendReq
-from .utils_data import list_batch, df_to_csv, sleep_countdown
+from .lazy_imports import lazy_import
+from .utils_data import list_batch, df_to_csv, drop_superseded, sleep_countdown
+from .cache import MISSING, get_cache_backend
+from .rate_limit import get_rate_limiter
+from . import dedup, metrics, storage
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+pytrends_request = lazy_import("pytrends.request")
+
+GOOGLE_TRENDS_HOST = "https://trends.google.com"
 
 # ----------------------------------------------------------
 # Google trends: Create session
 # ----------------------------------------------------------
 
 
-def create_pytrends_session():
-    """Create pytrends TrendReq() session on which .build_payload() can be called."""
-    pytrends_session = TrendReq()
+def create_pytrends_session(base_url=None):
+    """Create pytrends TrendReq() session on which .build_payload() can be called.
+
+    Args:
+        base_url (str): host serving the Trends API instead of Google,
+            e.g. a local fake_google.FakeGoogleServer. None queries Google.
+    """
+    set_pytrends_host(base_url or GOOGLE_TRENDS_HOST)
+    pytrends_session = pytrends_request.TrendReq()
 
     return pytrends_session
 
 
+def set_pytrends_host(host):
+    """Point all pytrends endpoints to host like 'http://127.0.0.1:8765'
+
+    pytrends reads its URLs from TrendReq class attributes,
+    so the change applies to every session in the process.
+    """
+    TrendReq = pytrends_request.TrendReq
+    if not _PYTRENDS_URLS:
+        # original endpoint URLs, to switch back and forth between hosts
+        _PYTRENDS_URLS.update(
+            {
+                name: url
+                for name, url in vars(TrendReq).items()
+                if name.endswith("_URL")
+                and isinstance(url, str)
+                and url.startswith(GOOGLE_TRENDS_HOST)
+            }
+        )
+
+    for name, url in _PYTRENDS_URLS.items():
+        setattr(TrendReq, name, url.replace(GOOGLE_TRENDS_HOST, host, 1))
+
+    if hasattr(pytrends_request, "BASE_TRENDS_URL"):
+        pytrends_request.BASE_TRENDS_URL = f"{host}/trends"
+
+
+_PYTRENDS_URLS = {}
+
+
 # ----------------------------------------------------------
 # Google trends: related queries
 # ----------------------------------------------------------
@@ -52,8 +100,9 @@ def get_related_queries(pytrends_session, keyword_list, cat=0, geo=""):
     df_related_queries = pd.DataFrame()
 
     try:
-        pytrends_session.build_payload(keyword_list, cat=cat, geo=geo)
-        df_related_queries = pytrends_session.related_queries()
+        with metrics.track_request("related_queries"):
+            pytrends_session.build_payload(keyword_list, cat=cat, geo=geo)
+            df_related_queries = pytrends_session.related_queries()
         logging.info(f"Query succeeded for {*keyword_list ,}")
 
     except Exception as e:
@@ -114,7 +163,12 @@ def create_related_queries_dataframe(
 
 
 def get_related_queries_pipeline(
-    pytrends_session, keyword_list, cat=0, geo="", geo_description="global"
+    pytrends_session,
+    keyword_list,
+    cat=0,
+    geo="",
+    geo_description="global",
+    storage_path=None,
 ):
     """Returns all response data for pytrend's .related_queries() in a single dataframe
 
@@ -122,6 +176,9 @@ def get_related_queries_pipeline(
 
         pytrends_session = create_pytrends_session()
         df = get_related_queries_pipeline(pytrends_session, keyword_list=['pizza', 'lufthansa'])
+
+    Args:
+        storage_path (str): SQLite database to upsert results into as well, see storage.py
     """
     response = get_related_queries(
         pytrends_session=pytrends_session, keyword_list=keyword_list, cat=cat, geo=geo
@@ -133,6 +190,9 @@ def get_related_queries_pipeline(
         keywords=keywords,
         geo_description=geo_description,
     )
+    metrics.record_batch("related_queries")
+    if storage_path is not None:
+        storage.upsert_related_queries(df_trends, db_path=storage_path, cat=cat)
 
     return df_trends
 
@@ -177,7 +237,7 @@ def process_interest_over_time(
 
     # empty df: no search result for any keyword
     else:
-        keywords = keywords.to_list()
+        keywords = list(keywords)
         logging.info(
             f"""process_interest_over_time() handles empty dataframe for {keywords}"""
         )
@@ -197,22 +257,28 @@ def process_interest_over_time(
         return df_zeros
 
 
-def query_interest_over_time(keywords, date_index=None, timeframe="today 5-y"):
+def query_interest_over_time(
+    keywords, date_index=None, timeframe="today 5-y", base_url=None, geo="", cat=0
+):
     """Forward keywords to Google Trends API and process results into long format
 
     Args:
         keywords (list): list of keywords, with maximum length 5
+        base_url (str): alternative Trends host, see create_pytrends_session()
+        geo (str): geolocation like DE, '' for global
+        cat (int): Trends category, 0 for all
 
     Returns:
         DataFrame: Search interest per keyword, preprocessed by process_interest_over_time()
 
     """
     # init pytrends
-    pt = create_pytrends_session()
-    pt.build_payload(kw_list=keywords, timeframe=timeframe)
+    pt = create_pytrends_session(base_url=base_url)
+    with metrics.track_request("trends_iot"):
+        pt.build_payload(kw_list=keywords, timeframe=timeframe, geo=geo, cat=cat)
 
-    # load search interest over time
-    df_query_result_raw = pt.interest_over_time()
+        # load search interest over time
+        df_query_result_raw = pt.interest_over_time()
 
     # preprocess query results
     df_query_result_processed = process_interest_over_time(
@@ -222,17 +288,18 @@ def query_interest_over_time(keywords, date_index=None, timeframe="today 5-y"):
     return df_query_result_processed
 
 
-def get_query_date_index(timeframe="today 5-y"):
+def get_query_date_index(timeframe="today 5-y", base_url=None):
     """Queries Google trends to have a valid index for query results that returned an empty dataframe
     Args:
         timeframe (string):
+        base_url (str): alternative Trends host, see create_pytrends_session()
 
     Returns:
         pd.Series: date index of Google trend's interest_over_time()
     """
 
     # init pytrends with query that ALWAYS works
-    pt = create_pytrends_session()
+    pt = create_pytrends_session(base_url=base_url)
     pt.build_payload(kw_list=["pizza", "lufthansa"], timeframe=timeframe)
     df = pt.interest_over_time()
 
@@ -242,6 +309,130 @@ def get_query_date_index(timeframe="today 5-y"):
     return df.date
 
 
+# ----------------------------------------------------------
+# Google trends: Incremental refresh
+# ----------------------------------------------------------
+
+
+def load_stored_interest(filepath):
+    """Stored search interest of filepath, latest value per keyword and date
+
+    Returns:
+        Dataframe: date, keyword, search_interest, empty if filepath does not exist
+    """
+    if not os.path.isfile(filepath):
+        return pd.DataFrame(columns=["date", "keyword", "search_interest"])
+
+    return drop_superseded(pd.read_csv(filepath, parse_dates=["date"]))
+
+
+def rescale_to_history(df_new, df_stored, min_overlap=4):
+    """Rescale a recent query window to the stored series and keep dates from the last stored one
+
+    Trends values are relative to the maximum within each query (0-100), so a recent window
+    is on a different scale than the stored history. Per keyword, the new slice is multiplied
+    by sum(stored overlap) / sum(new overlap), computed on dates present in both.
+
+    The last stored date is usually Trends' partial period (isPartial) at query time. It is
+    left out of the overlap and returned with the rescaled new value. Appended after the
+    stored row, it supersedes it in every reader, see utils_data.drop_superseded() and
+    streaming.superseded_rows().
+
+    Args:
+        df_new (pd.DataFrame): date, keyword, search_interest of the recent window
+        df_stored (pd.DataFrame): date, keyword, search_interest of the stored history
+        min_overlap (int): dates both must share to rescale a keyword, last stored date excluded
+
+    Returns:
+        tuple: rescaled rows from the last stored date per keyword on,
+            keywords that could not be rescaled (too little overlap or zero new overlap)
+    """
+    df_new = df_new.assign(date=pd.to_datetime(df_new["date"]))
+    last_stored = df_stored.groupby("keyword").date.max()
+    overlap = df_new.merge(
+        df_stored[["date", "keyword", "search_interest"]],
+        on=["keyword", "date"],
+        suffixes=("", "_stored"),
+    )
+    overlap = overlap.loc[overlap.date < overlap.keyword.map(last_stored)]
+    sums = overlap.groupby("keyword").agg(
+        n=("date", "size"),
+        new=("search_interest", "sum"),
+        stored=("search_interest_stored", "sum"),
+    )
+    # both zero: keyword had no interest in the overlap, keep values as they are
+    factor = (sums.stored / sums.new).where(sums.new > 0, np.nan)
+    factor[(sums.new == 0) & (sums.stored == 0)] = 1.0
+    factor[sums.n < min_overlap] = np.nan
+
+    failed = sorted(set(df_new.keyword) - set(factor.dropna().index))
+
+    df_new = df_new.loc[~df_new.keyword.isin(failed)]
+    refreshed = df_new.date >= df_new.keyword.map(last_stored)
+    df_append = df_new.loc[refreshed].copy()
+    df_append["search_interest"] = (
+        df_append.search_interest * df_append.keyword.map(factor)
+    ).round(2)
+
+    return df_append.reset_index(drop=True), failed
+
+
+def rescale_refresh(df, df_stored, filepath_failed=None):
+    """rescale_to_history() that appends keywords without usable overlap to filepath_failed"""
+    df, failed = rescale_to_history(df, df_stored)
+    if failed and filepath_failed:
+        df_to_csv(pd.DataFrame(failed), filepath=filepath_failed)
+        metrics.ROWS_WRITTEN.inc(len(failed), dataset="failed_keywords")
+        logging.warning(f"{failed} not rescaled, appended to {filepath_failed}")
+    elif failed:
+        logging.warning(f"{failed} not rescaled to the stored history, skipped")
+    return df
+
+
+def write_interest(df, filepath, deduplicate=False, storage_path=None, timeframe=None):
+    """Append search interest to filepath, optionally only rows not written before
+
+    Args:
+        deduplicate (bool): drop rows already in filepath with the hash index of
+            dedup.open_index(), cost scales with len(df) instead of the file size
+        storage_path (str): SQLite database to upsert the rows into as well
+        timeframe (str): timeframe of the rows, stored with them
+
+    Every write is cataloged with storage.catalog_append() in storage_path, or in
+    storage.DEFAULT_DB_PATH without it, so the dashboard lists the file's keywords and
+    storage.import_csv() imports it with its timeframe.
+
+    Returns:
+        Dataframe: rows written
+    """
+    index = dedup.open_index(filepath) if deduplicate else None
+    if index is not None:
+        df, _ = index.filter_new(df)
+    if not len(df):
+        return df
+
+    stat_before = os.stat(filepath) if os.path.isfile(filepath) else None
+    df_to_csv(df, filepath=filepath)
+    metrics.ROWS_WRITTEN.inc(len(df), dataset="search_interest")
+
+    if index is not None:
+        index.add(df)
+    if storage_path is not None:
+        storage.upsert_search_interest(df, db_path=storage_path, timeframe=timeframe)
+    try:
+        storage.catalog_append(
+            filepath,
+            df,
+            stat_before,
+            db_path=storage_path or storage.DEFAULT_DB_PATH,
+            timeframe=timeframe,
+            imported=storage_path is not None,
+        )
+    except sqlite3.Error as e:
+        logging.error(f"Catalog update failed for {filepath}: {e}")
+    return df
+
+
 # ---------------------------------------------------
 # MAIN QUERY FUNCTION
 # ---------------------------------------------------
@@ -254,6 +445,12 @@ def get_interest_over_time(
     timeframe="today 5-y",
     max_retries=3,
     timeout=10,
+    base_url=None,
+    incremental=False,
+    refresh_timeframe="today 12-m",
+    retry_queue=None,
+    storage_path=None,
+    deduplicate=False,
 ):
     """Main function to query Google Trend's interest_over_time() function.
     It respects the query's requirements like
@@ -263,9 +460,17 @@ def get_interest_over_time(
 
     Error handling:
         * retry after query error with increased timeout
-        * when a query fails after retries, related keywords are stored in csv in filepath_failed.
-
-
+        * when a query fails after retries, related keywords are stored in csv in filepath_failed,
+      or in retry_queue to be re-run later with RetryQueue.drain(), see retry_queue.py
+
+    Incremental mode:
+        Keywords already stored in filepath are queried for refresh_timeframe only. The recent
+        window is rescaled to the stored series on their overlap, see rescale_to_history(), and
+        dates from the last stored one on are appended, so the stored partial period is
+        refreshed. The refreshed row supersedes the stored one in all readers, see
+        utils_data.drop_superseded(). Keywords without stored history are queried for the
+        full timeframe.
+        Keywords that cannot be rescaled go to filepath_failed.
 
     Args:
         keyword_list (list): strings used for the google trends query
@@ -275,47 +480,353 @@ def get_interest_over_time(
         timeout (int): time to wait in seconds btw. queries
         timeframe (string): Defaults to last 5yrs, 'today 5-y',
         other values: 'all', Specific dates, 'YYYY-MM-DD YYYY-MM-DD',
+        base_url (str): alternative Trends host like a local fake_google server, None queries Google
+        incremental (bool): only fetch refresh_timeframe for keywords stored in filepath
+        refresh_timeframe (str): recent window overlapping the stored history. Keep the same
+            resolution as timeframe, e.g. 'today 12-m' is weekly like 'today 5-y'
+        retry_queue (RetryQueue): durable queue for failed batches instead of filepath_failed
+        storage_path (str): SQLite database to upsert results into as well, see storage.py
+        deduplicate (bool): append only rows not yet in filepath, see dedup.py
 
     Returns:
         None: Writes dataframe to csv
     """
-    # get basic date index for empty responses
-    date_index = get_query_date_index(timeframe=timeframe)
-
-    # divide list into batches of max 5 elements (requirement from Gtrends)
-    kw_batches = list_batch(lst=keyword_list, n=5)
-
-    for i, kw_batch in enumerate(kw_batches):
+    df_stored = None
+    if incremental:
+        df_stored = load_stored_interest(filepath)
+        stored = set(df_stored.keyword)
+        keywords_full = [kw for kw in keyword_list if kw not in stored]
+        keywords_refresh = [kw for kw in keyword_list if kw in stored]
+        logging.info(
+            f"Incremental refresh of {len(keywords_refresh)} keywords, "
+            f"full query of {len(keywords_full)} keywords without history"
+        )
+    else:
+        keywords_full, keywords_refresh = list(keyword_list), []
+
+    # divide lists into batches of max 5 elements (requirement from Gtrends)
+    jobs = [(kw_batch, timeframe, False) for kw_batch in list_batch(keywords_full, n=5)]
+    jobs += [
+        (kw_batch, refresh_timeframe, True)
+        for kw_batch in list_batch(keywords_refresh, n=5)
+    ]
+
+    # get basic date index for empty responses, one per timeframe
+    date_indices = {
+        tf: get_query_date_index(timeframe=tf, base_url=base_url)
+        for tf in {tf for _, tf, _ in jobs}
+    }
+
+    for i, (kw_batch, batch_timeframe, refresh) in enumerate(jobs):
         # retry until max_retries reached
+        last_error = None
         for attempt in range(max_retries):
 
             # random int from range around timeout
             timeout_randomized = randint(timeout - 3, timeout + 3)
             try:
                 df = query_interest_over_time(
-                    kw_batch, date_index=date_index, timeframe=timeframe
+                    kw_batch,
+                    date_index=date_indices[batch_timeframe],
+                    timeframe=batch_timeframe,
+                    base_url=base_url,
                 )
 
             except Exception as e:
+                last_error = e
                 logging.error(
                     f"query_interest_over_time() failed in get_interest_over_time with: {e}"
                 )
+                if attempt < max_retries - 1:
+                    metrics.RETRIES.inc(endpoint="trends_iot")
                 timeout += 3  # increase timetout to be safe
                 sleep_countdown(timeout_randomized, print_step=2)
 
             # query was successful: store results, sleep
             else:
                 logging.info(
-                    f"{i+1}/{len(list(kw_batches))} get_interest_over_time() query successful"
+                    f"{i+1}/{len(jobs)} get_interest_over_time() query successful"
                 )
-                df_to_csv(df, filepath=filepath)
-
-                if i < len(kw_batches) - 1:
+                if refresh:
+                    df = rescale_refresh(df, df_stored, filepath_failed)
+
+                if len(df):
+                    write_interest(
+                        df,
+                        filepath,
+                        deduplicate=deduplicate,
+                        storage_path=storage_path,
+                        timeframe=timeframe,
+                    )
+                metrics.record_batch("interest_over_time")
+
+                if i < len(jobs) - 1:
                     logging.info(f"Sleep {timeout_randomized}s")
                     sleep_countdown(timeout_randomized)
                 break
 
         # max_retries reached: store index of unsuccessful query
         else:
-            df_to_csv(pd.DataFrame(kw_batch), filepath=filepath_failed)
-            logging.warning(f"{kw_batch} appended to unsuccessful_queries")
+            if retry_queue is not None:
+                retry_queue.enqueue(
+                    "interest_over_time",
+                    kw_batch,
+                    # refresh batches are rescaled to the stored history on drain
+                    params={
+                        "filepath": filepath,
+                        "timeframe": timeframe,
+                        "refresh_timeframe": batch_timeframe if refresh else None,
+                        "filepath_failed": filepath_failed,
+                        "base_url": base_url,
+                        "storage_path": storage_path,
+                        "deduplicate": deduplicate,
+                    },
+                    error=last_error,
+                )
+            else:
+                df_to_csv(pd.DataFrame(kw_batch), filepath=filepath_failed)
+                metrics.ROWS_WRITTEN.inc(len(kw_batch), dataset="failed_keywords")
+                logging.warning(f"{kw_batch} appended to unsuccessful_queries")
+
+
+def retry_interest_over_time(
+    keywords,
+    filepath,
+    timeframe="today 5-y",
+    refresh_timeframe=None,
+    filepath_failed=None,
+    base_url=None,
+    storage_path=None,
+    deduplicate=False,
+):
+    """Query and store one keyword batch, raises on failure. Handler for RetryQueue.drain()
+
+    Batches of an incremental refresh have refresh_timeframe set. They are queried for
+    that window and rescaled to the stored history like in get_interest_over_time().
+    """
+    query_timeframe = refresh_timeframe or timeframe
+    date_index = get_query_date_index(timeframe=query_timeframe, base_url=base_url)
+    df = query_interest_over_time(
+        list(keywords),
+        date_index=date_index,
+        timeframe=query_timeframe,
+        base_url=base_url,
+    )
+    if refresh_timeframe:
+        df_stored = load_stored_interest(filepath)
+        df_stored = df_stored.loc[df_stored.keyword.isin(list(keywords))]
+        df = rescale_refresh(df, df_stored, filepath_failed)
+
+    write_interest(
+        df,
+        filepath,
+        deduplicate=deduplicate,
+        storage_path=storage_path,
+        timeframe=timeframe,
+    )
+
+
+# ---------------------------------------------------
+# GRID MODE: keyword batches x geos x categories
+# ---------------------------------------------------
+
+
+def _query_cell(kw_batch, timeframe, geo, cat, date_index, base_url, limiter):
+    """One keyword batch for one geo and category, cached per cell
+
+    Relative timeframes like 'today 5-y' move over time, so the key includes the last
+    date of the timeframe's date index. Empty responses, zero-filled from date_index,
+    are not cached and queried again on the next run.
+    """
+    backend = get_cache_backend("trends_grid")
+    window_end = (
+        str(pd.to_datetime(date_index).max().date())
+        if date_index is not None and len(date_index)
+        else None
+    )
+    key = ("trends_grid", tuple(kw_batch), timeframe, window_end, geo, cat, base_url)
+    df = backend.get(key)
+    metrics.record_cache("trends_grid", hit=df is not MISSING)
+    if df is not MISSING:
+        return df
+
+    limiter.acquire()
+    df = query_interest_over_time(
+        kw_batch,
+        date_index=date_index,
+        timeframe=timeframe,
+        base_url=base_url,
+        geo=geo,
+        cat=cat,
+    )
+    if len(df) and (df.search_interest != 0).any():
+        backend.set(key, df)
+    return df
+
+
+def get_interest_over_time_grid(
+    keyword_list,
+    geos=("",),
+    cats=(0,),
+    timeframe="today 5-y",
+    filepath=None,
+    filepath_failed=None,
+    max_workers=4,
+    max_retries=3,
+    base_url=None,
+    limiter=None,
+    storage_path=None,
+    deduplicate=False,
+):
+    """Interest over time for every keyword batch x geo x category cell, queried concurrently
+
+    All cells share the rate limiter, the date index of the timeframe and the
+    "trends_grid" cache, so a rerun only queries cells that failed or are not cached.
+
+    Example usage:
+
+        df = get_interest_over_time_grid(keywords, geos=["DE", "FR", "GB", "US"], cats=[0, 7])
+
+    Args:
+        keyword_list (list): strings used for the google trends query
+        geos (list): geolocations like DE, '' for global
+        cats (list): Trends categories, 0 for all
+        timeframe (string): same for all cells
+        filepath (string): csv to append results to, None only returns them
+        filepath_failed (string): csv for keyword batches that failed in some cell
+        max_workers (int): concurrent requests, throttled by the rate limiter
+        base_url (str): alternative Trends host, see create_pytrends_session()
+        limiter (RateLimiter): defaults to rate_limit.get_rate_limiter("trends")
+        storage_path (str): SQLite database to upsert results into, see storage.py
+        deduplicate (bool): append only rows not yet in filepath, see dedup.py
+
+    Returns:
+        Dataframe: date, keyword, search_interest, geo, cat
+    """
+    limiter = limiter or get_rate_limiter("trends")
+    date_index = get_query_date_index(timeframe=timeframe, base_url=base_url)
+    cells = [
+        (tuple(kw_batch), geo, cat)
+        for kw_batch in list_batch(lst=list(keyword_list), n=5)
+        for geo in geos
+        for cat in cats
+    ]
+    logging.info(f"Query {len(cells)} cells: {len(geos)} geos x {len(cats)} categories")
+
+    def run_cell(kw_batch, geo, cat):
+        for attempt in range(max_retries):
+            try:
+                return _query_cell(
+                    list(kw_batch), timeframe, geo, cat, date_index, base_url, limiter
+                )
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    raise
+                metrics.RETRIES.inc(endpoint="trends_iot")
+                logging.warning(f"{kw_batch} {geo or 'global'}/{cat} failed: {e}")
+                sleep_countdown(2 ** (attempt + 1), print_step=2)
+
+    df_list, failed = [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_cell, *cell): cell for cell in cells}
+        for future in as_completed(futures):
+            kw_batch, geo, cat = futures[future]
+            try:
+                df = future.result()
+            except Exception as e:
+                logging.error(f"{kw_batch} {geo or 'global'}/{cat} failed: {e}")
+                failed.append(
+                    pd.DataFrame({"keyword": kw_batch, "geo": geo, "cat": cat})
+                )
+                continue
+            df_list.append(df.assign(geo=geo or "global", cat=cat))
+            metrics.record_batch("interest_over_time_grid")
+
+    df = (
+        pd.concat(df_list, ignore_index=True)
+        if df_list
+        else pd.DataFrame(columns=["date", "keyword", "search_interest", "geo", "cat"])
+    )
+    if filepath is not None and len(df):
+        write_interest(
+            df,
+            filepath,
+            deduplicate=deduplicate,
+            storage_path=storage_path,
+            timeframe=timeframe,
+        )
+    elif storage_path is not None and len(df):
+        storage.upsert_search_interest(df, db_path=storage_path, timeframe=timeframe)
+    if filepath_failed is not None and failed:
+        df_failed = pd.concat(failed, ignore_index=True)
+        df_to_csv(df_failed, filepath=filepath_failed)
+        metrics.ROWS_WRITTEN.inc(len(df_failed), dataset="failed_keywords")
+
+    return df
+
+
+def get_related_queries_grid(
+    keyword_list,
+    geos=("",),
+    cats=(0,),
+    max_workers=4,
+    base_url=None,
+    limiter=None,
+    storage_path=None,
+):
+    """Related queries for every keyword batch x geo x category cell, queried concurrently
+
+    Args:
+        storage_path (str): SQLite database to upsert all cells into at once, see storage.py
+
+    Returns:
+        Dataframe: output of get_related_queries_pipeline() with geo and cat columns
+    """
+    limiter = limiter or get_rate_limiter("trends")
+    local = threading.local()
+
+    def run_cell(kw_batch, geo, cat):
+        # TrendReq sessions are not thread-safe, one per worker thread
+        if getattr(local, "session", None) is None:
+            local.session = create_pytrends_session(base_url=base_url)
+        limiter.acquire()
+        return get_related_queries_pipeline(
+            local.session,
+            keyword_list=list(kw_batch),
+            cat=cat,
+            geo=geo,
+            geo_description=geo or "global",
+        ).assign(cat=cat)
+
+    cells = [
+        (tuple(kw_batch), geo, cat)
+        for kw_batch in list_batch(lst=list(keyword_list), n=5)
+        for geo in geos
+        for cat in cats
+    ]
+    df_list = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_cell, *cell): cell for cell in cells}
+        for future in as_completed(futures):
+            kw_batch, geo, cat = futures[future]
+            try:
+                df_list.append(future.result())
+            except Exception as e:
+                logging.error(f"{kw_batch} {geo or 'global'}/{cat} failed: {e}")
+
+    if not df_list:
+        return pd.DataFrame(
+            columns=[
+                "query",
+                "value",
+                "keyword",
+                "ranking",
+                "geo",
+                "query_timestamp",
+                "cat",
+            ]
+        )
+    df = pd.concat(df_list, ignore_index=True)
+    if storage_path is not None:
+        storage.upsert_related_queries(df, db_path=storage_path)
+    return df
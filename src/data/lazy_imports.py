@@ -0,0 +1,55 @@
+"""
+Lazy module imports to keep the data modules fast to import
+
+lazy_import: module proxy that imports the real module on first attribute access
+
+Headless pipelines that only need list_batch() or df_to_csv() should not pay for
+pandas, pytrends, yahooquery or pytickersymbols until they actually call into them.
+benchmarks/import_time.py guards the import budget.
+"""
+
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported when one of its attributes is used"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name):
+    """Returns module name, imported on first attribute access
+
+    Example usage:
+
+        pd = lazy_import("pandas")
+        pd.DataFrame()  # pandas is imported here
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    return LazyModule(name)
@@ -0,0 +1,129 @@
+"""
+Manifests of incremental batch jobs and atomic JSON writes
+
+Batch jobs keep a manifest.json per output directory with the data fingerprint, options
+and output files of every item, so a rerun only processes items whose data changed:
+batch_render.render_firm_charts(), forecast.forecast_keywords() and the constituent
+snapshots of constituents.py.
+
+Main functions
+    slugify: file name safe version of a name
+    unique_slug: slugify() with a hash of the name, distinct names never share a file
+    atomic_write_json: replace a JSON file so an interrupted run leaves the previous one intact
+    load_manifest, write_manifest: manifest.json of a directory
+    is_current: manifest entry matches fingerprint and options and its files exist
+    run_in_processes: call a function per item in a process pool, results as completed
+
+Example usage:
+
+    manifest = load_manifest(out_dir)
+    jobs = {k: args for k, args in items if not is_current(manifest.get(k), fp, options, out_dir)}
+    for key, result, error in run_in_processes(render, jobs):
+        manifest[key] = {"fingerprint": fp, "options": options, "files": result["files"]}
+    write_manifest(manifest, out_dir)
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+MANIFEST_NAME = "manifest.json"
+
+
+def slugify(name, default="unnamed"):
+    """File name safe version of a name, e.g. 'Adidas AG' -> 'adidas_ag'"""
+    slug = re.sub(r"[^0-9a-zA-Z]+", "_", str(name)).strip("_").lower()
+    return slug or default
+
+
+def unique_slug(name):
+    """slugify() plus a hash of name, e.g. 'A&B AG' -> 'a_b_ag_894448f9'"""
+    digest = hashlib.sha1(str(name).encode("utf-8")).hexdigest()[:8]
+    return f"{slugify(name)}_{digest}"
+
+
+def atomic_write_json(obj, path, **json_kwargs):
+    """Write obj as JSON to a temp file in the same directory and move it over path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf8") as file:
+            json.dump(obj, file, **json_kwargs)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# ----------------------------------------
+# -- Manifest
+# ----------------------------------------
+
+
+def load_manifest(directory, default=None):
+    """Manifest of directory, default ({} if None) if there is none yet"""
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return {} if default is None else default
+    with open(path, encoding="utf8") as file:
+        return json.load(file)
+
+
+def write_manifest(manifest, directory):
+    atomic_write_json(
+        manifest, os.path.join(directory, MANIFEST_NAME), indent=2, sort_keys=True
+    )
+
+
+def is_current(entry, fingerprint, options, directory, expected_files=None):
+    """True if a manifest entry was built from the same data and options
+
+    Args:
+        entry (dict): manifest entry with fingerprint, options and files, or None
+        fingerprint (str): fingerprint of the item's data, e.g. df_fingerprint()
+        options (dict): options that change the output
+        directory (str): directory the entry's files are relative to
+        expected_files (list): files the entry must list, any non-empty list if None
+    """
+    if not entry:
+        return False
+    files = entry.get("files") or []
+    if expected_files is not None and sorted(files) != sorted(expected_files):
+        return False
+    return (
+        entry.get("fingerprint") == fingerprint
+        and entry.get("options") == options
+        and bool(files)
+        and all(os.path.isfile(os.path.join(directory, f)) for f in files)
+    )
+
+
+# ----------------------------------------
+# -- Process pool
+# ----------------------------------------
+
+
+def run_in_processes(func, jobs, max_workers=None):
+    """Call func(*args) for every key, args in jobs in a process pool
+
+    Args:
+        func (callable): picklable, module-level function
+        jobs (dict): key -> tuple of arguments
+        max_workers (int): processes, defaults to number of CPUs
+
+    Yields:
+        tuple: key, return value of func or None, error message or ''
+    """
+    if not jobs:
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(func, *args): key for key, args in jobs.items()}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), ""
+            except Exception as e:
+                yield futures[future], None, str(e)
@@ -0,0 +1,341 @@
+"""
+Ingestion metrics in Prometheus text format
+
+Counters, gauges and histograms for request latency, retries, rate limits (HTTP 429),
+batch throughput, cache hit rates and rows written. Export them for a local scraper either
+as textfile (node_exporter textfile collector) or via a small HTTP endpoint.
+
+Endpoints used as label: trends_iot, related_queries, results_count, yahoo_esg
+
+Example usage:
+
+    from src.data import metrics
+
+    metrics.start_http_server(9108)  # scrape http://localhost:9108/metrics
+    get_interest_over_time(...)
+    metrics.write_textfile("data/metrics/ingestion.prom")
+"""
+
+import bisect
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = [
+        (k, str(v).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\""))
+        for k, v in pairs
+    ]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+# ----------------------------------------
+# -- Metric types
+# ----------------------------------------
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, labelvalues, extra labels, value) tuples"""
+        with self._lock:
+            return [("", key, None, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, key, extra, value in self.samples():
+            labels = _format_labels(self.labelnames, key, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class RateGauge(_Metric):
+    """Events per minute over a sliding window, evaluated at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), window=60, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.window = window
+
+    def mark(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values.setdefault(key, deque()).append(time.monotonic())
+
+    def samples(self):
+        now = time.monotonic()
+        with self._lock:
+            samples = []
+            for key, events in self._values.items():
+                while events and events[0] < now - self.window:
+                    events.popleft()
+                samples.append(("", key, None, len(events) * 60 / self.window))
+            return samples
+
+    def get(self, **labels):
+        key = self._key(labels)
+        return next((s[3] for s in self.samples() if s[1] == key), 0)
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            samples = []
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append(
+                        ("_bucket", key, {"le": _format_value(bound)}, cumulative)
+                    )
+                samples.append(("_sum", key, None, total))
+                samples.append(("_count", key, None, cumulative))
+            return samples
+
+    def get(self, **labels):
+        """Number of observations"""
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+            return sum(counts)
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ----------------------------------------
+# -- Ingestion metrics
+# ----------------------------------------
+
+REQUEST_LATENCY = Histogram(
+    "esg_request_latency_seconds", "Latency of requests to data sources", ["endpoint"]
+)
+REQUESTS = Counter(
+    "esg_requests_total", "Requests to data sources by outcome", ["endpoint", "outcome"]
+)
+RETRIES = Counter("esg_retries_total", "Retried requests", ["endpoint"])
+RATE_LIMITED = Counter(
+    "esg_rate_limited_total", "Requests answered with HTTP 429", ["endpoint"]
+)
+BATCHES = Counter("esg_batches_total", "Completed keyword batches", ["pipeline"])
+BATCHES_PER_MINUTE = RateGauge(
+    "esg_batches_per_minute",
+    "Completed keyword batches in the last minute",
+    ["pipeline"],
+)
+CACHE_REQUESTS = Counter(
+    "esg_cache_requests_total", "Cache lookups by result", ["cache", "result"]
+)
+CACHE_HIT_RATIO = Gauge(
+    "esg_cache_hit_ratio", "Share of cache lookups that hit", ["cache"]
+)
+ROWS_WRITTEN = Counter("esg_rows_written_total", "Rows written to storage", ["dataset"])
+ROWS_DROPPED = Counter(
+    "esg_rows_dropped_total",
+    "Rows dropped before writing, see dedup.py",
+    ["dataset", "reason"],
+)
+TRANSFORM_DURATION = Histogram(
+    "esg_transform_seconds", "Wall time of dataframe transformations", ["step"]
+)
+
+
+def is_rate_limited(error):
+    """True if an exception stems from an HTTP 429 response"""
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    return "429" in str(error)
+
+
+@contextmanager
+def track_request(endpoint):
+    """Measure latency and outcome of the request(s) in the block"""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception as e:
+        outcome = "rate_limited" if is_rate_limited(e) else "error"
+        if outcome == "rate_limited":
+            RATE_LIMITED.inc(endpoint=endpoint)
+        raise
+    finally:
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, outcome=outcome)
+
+
+def record_batch(pipeline):
+    BATCHES.inc(pipeline=pipeline)
+    BATCHES_PER_MINUTE.mark(pipeline=pipeline)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+    hits = CACHE_REQUESTS.get(cache=cache, result="hit")
+    misses = CACHE_REQUESTS.get(cache=cache, result="miss")
+    CACHE_HIT_RATIO.set(hits / (hits + misses), cache=cache)
+
+
+def metrics_sink(profile):
+    """profiling.py sink, exports transformation wall time as histogram"""
+    TRANSFORM_DURATION.observe(profile.wall_s, step=profile.step)
+
+
+# ----------------------------------------
+# -- Export
+# ----------------------------------------
+
+
+def write_textfile(path, registry=REGISTRY):
+    """Write metrics atomically, for node_exporter's textfile collector or a later scrape"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as file:
+        file.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def start_http_server(port=9108, addr="127.0.0.1", registry=REGISTRY):
+    """Serve metrics on http://addr:port/metrics from a daemon thread
+
+    Returns:
+        ThreadingHTTPServer: call .shutdown() to stop
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    httpd = ThreadingHTTPServer((addr, port), MetricsHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Serving metrics on http://{addr}:{httpd.server_address[1]}/metrics")
+
+    return httpd
@@ -0,0 +1,231 @@
+"""
+Profiling of dataframe transformations
+
+profile_call: run a function once and measure wall time, CPU time, peak memory, rows and bytes
+set_metrics_sink: choose where measurements go (logging and metrics.py by default, any callable works)
+profiling_run: context manager that collects all measurements of a run into a RunReport
+RunReport: ranks the slowest transformations of a run
+
+Used by utils_data.wrap_logging_transform_df, so every decorated transform is profiled.
+Peak memory is only traced on request, tracemalloc slows down allocation-heavy steps:
+set PROFILE_TRACE_MEMORY=1 or call set_metrics_sink(..., trace_memory=True).
+
+Example usage:
+
+    with profiling_run("dax") as report:
+        df = drop_missings_duplicates(df)
+    print(report.ranking())
+"""
+
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Optional
+
+from .metrics import metrics_sink
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TransformProfile:
+    """Measurements of a single transformation step"""
+
+    step: str
+    wall_s: float
+    cpu_s: float
+    peak_mem_bytes: Optional[int]
+    rows_in: Optional[int]
+    rows_out: Optional[int]
+    bytes_in: Optional[int]
+    bytes_out: Optional[int]
+    started_at: float
+
+
+# ----------------------------------------
+# -- Sinks
+# ----------------------------------------
+
+
+def logging_sink(profile: TransformProfile) -> None:
+    """Default sink: one log line per transformation"""
+    mem = (
+        f"{profile.peak_mem_bytes / 2 ** 20:.1f} MiB peak"
+        if profile.peak_mem_bytes is not None
+        else "memory not traced"
+    )
+    logging.info(
+        f"{profile.step} --> {profile.wall_s * 1000:.1f} ms wall, "
+        f"{profile.cpu_s * 1000:.1f} ms cpu, {mem}, "
+        f"rows {profile.rows_in}->{profile.rows_out}"
+    )
+
+
+class RunReport:
+    """Sink that keeps all profiles of a run and ranks the slowest transformations"""
+
+    def __init__(self, name="run"):
+        self.name = name
+        self.profiles: List[TransformProfile] = []
+
+    def __call__(self, profile: TransformProfile) -> None:
+        self.profiles.append(profile)
+
+    def to_frame(self):
+        """All profiles as dataframe, one row per call"""
+        import pandas as pd
+
+        return pd.DataFrame([asdict(p) for p in self.profiles])
+
+    def ranking(self, top=10):
+        """Transformations ranked by total wall time, aggregated over calls"""
+        df = self.to_frame()
+        if df.empty:
+            return df
+
+        return (
+            df.groupby("step")
+            .agg(
+                calls=("wall_s", "size"),
+                wall_s=("wall_s", "sum"),
+                cpu_s=("cpu_s", "sum"),
+                max_wall_s=("wall_s", "max"),
+                peak_mem_bytes=("peak_mem_bytes", "max"),
+                rows_in=("rows_in", "sum"),
+                rows_out=("rows_out", "sum"),
+            )
+            .sort_values("wall_s", ascending=False)
+            .head(top)
+            .reset_index()
+        )
+
+
+_sinks: List[Callable[[TransformProfile], None]] = [logging_sink, metrics_sink]
+_trace_memory = os.environ.get("PROFILE_TRACE_MEMORY", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+
+def set_metrics_sink(*sinks, trace_memory=None):
+    """Replace the sinks that receive a TransformProfile after each transformation
+
+    Args:
+        sinks (callable): functions taking a TransformProfile, e.g. logging_sink or a RunReport
+        trace_memory (bool): measure peak memory with tracemalloc, slows down allocation-heavy
+            steps. Off by default, unless the env var PROFILE_TRACE_MEMORY=1 is set
+    """
+    global _trace_memory
+    _sinks[:] = sinks
+    if trace_memory is not None:
+        _trace_memory = trace_memory
+
+
+def get_metrics_sinks():
+    return list(_sinks)
+
+
+@contextmanager
+def profiling_run(name="run", top=10):
+    """Collect the profiles of all transformations in the block and log the slowest ones"""
+    report = RunReport(name)
+    _sinks.append(report)
+    try:
+        yield report
+    finally:
+        _sinks.remove(report)
+        if report.profiles:
+            logging.info(
+                f"Slowest transformations of {name}:\n{report.ranking(top).to_string(index=False)}"
+            )
+
+
+# ----------------------------------------
+# -- Measurement
+# ----------------------------------------
+
+
+def frame_size(obj):
+    """Rows and bytes of a dataframe, (None, None) for other objects"""
+    if hasattr(obj, "memory_usage") and hasattr(obj, "columns"):
+        return len(obj), int(obj.memory_usage(index=True, deep=True).sum())
+    return None, None
+
+
+# absolute peaks of the enclosing steps that reset_peak() hid from tracemalloc
+_peak_floors: List[int] = []
+# Python < 3.9 cannot reset the peak, nested steps then report the enclosing peak
+_reset_peak = getattr(tracemalloc, "reset_peak", None)
+
+
+def _start_step():
+    """Reset the traced peak for a step, returns traced memory before it"""
+    current, peak = tracemalloc.get_traced_memory()
+    if _peak_floors:
+        _peak_floors[-1] = max(_peak_floors[-1], peak)
+    _peak_floors.append(0)
+    if _reset_peak is not None:
+        _reset_peak()
+    return current
+
+
+def _end_step(mem_before):
+    """Peak of the step above mem_before, the enclosing step keeps it in its floor"""
+    peak = max(tracemalloc.get_traced_memory()[1], _peak_floors.pop())
+    if _peak_floors:
+        _peak_floors[-1] = max(_peak_floors[-1], peak)
+    return max(peak - mem_before, 0)
+
+
+def profile_call(func, args, kwargs, step=None):
+    """Call func(*args, **kwargs) exactly once and send its TransformProfile to the sinks
+
+    Exceptions from func propagate unchanged, without a profile.
+
+    Returns:
+        Return value of func
+    """
+    step = step or func.__name__
+    # nested profiled steps share the outer trace, each measures its own peak
+    trace = _trace_memory and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+    tracing = tracemalloc.is_tracing()
+    mem_before = _start_step() if tracing else 0
+
+    started_at = time.time()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        result = func(*args, **kwargs)
+        wall_s = time.perf_counter() - wall_start
+        cpu_s = time.process_time() - cpu_start
+    finally:
+        peak = _end_step(mem_before) if tracing else None
+        if trace:
+            tracemalloc.stop()
+
+    rows_in, bytes_in = frame_size(args[0]) if args else (None, None)
+    rows_out, bytes_out = frame_size(result)
+
+    profile = TransformProfile(
+        step=step,
+        wall_s=wall_s,
+        cpu_s=cpu_s,
+        peak_mem_bytes=peak,
+        rows_in=rows_in,
+        rows_out=rows_out,
+        bytes_in=bytes_in,
+        bytes_out=bytes_out,
+        started_at=started_at,
+    )
+    for sink in list(_sinks):
+        try:
+            sink(profile)
+        except Exception as e:
+            logger.error(f"Metrics sink {sink} failed for {step}: {e}")
+
+    return result
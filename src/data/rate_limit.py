@@ -0,0 +1,99 @@
+"""
+Thread-safe token bucket rate limiter shared by concurrent Trends queries
+
+Google answers bursts with HTTP 429. Concurrent fetchers take a token before each request,
+the bucket refills at rate_per_minute and allows short bursts up to burst tokens.
+
+RateLimiter: token bucket, acquire() blocks until a token is available
+set_rate_limiter/get_rate_limiter: named limiters shared across modules, like cache backends
+
+Example usage:
+
+    limiter = get_rate_limiter("trends")
+    with limiter:
+        pt.build_payload(...)
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket that refills rate_per_minute tokens per minute, up to burst tokens"""
+
+    def __init__(self, rate_per_minute=10, burst=1):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive")
+        self.rate_per_minute = rate_per_minute
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(
+            self.burst, self._tokens + elapsed * self.rate_per_minute / 60
+        )
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available, never blocks"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, timeout=None):
+        """Block until a token is available
+
+        Args:
+            timeout (float): give up after timeout seconds, None waits forever
+
+        Returns:
+            bool: True if a token was taken
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) * 60 / self.rate_per_minute
+
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def set_rate_limiter(limiter, name="trends"):
+    """Share limiter under name, e.g. a faster one for the local fake_google server"""
+    with _limiters_lock:
+        _limiters[name] = limiter
+
+
+def get_rate_limiter(name="trends", rate_per_minute=10, burst=1):
+    """Limiter registered under name, created with rate_per_minute and burst on first use"""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(rate_per_minute=rate_per_minute, burst=burst)
+        return _limiters[name]
@@ -0,0 +1,234 @@
+"""
+Load many raw CSVs of one dataset concurrently with a unified schema
+
+data/raw mixes timestamped outputs of several pipelines. Files are classified by their
+header, parsed in a thread or process pool, normalized to the dataset's columns and
+dtypes and concatenated once with provenance columns:
+
+    source_file     file name the row was read from, categorical
+    run_timestamp   timestamp in the file name (timestamp_now() format), else file mtime
+
+Datasets and the header columns that identify them, checked in this order:
+
+    search_interest   date, keyword, search_interest (geo, cat optional)
+    related_queries   query, value, keyword, ranking, geo, query_timestamp
+    results_count     keyword, results_count, search_url, query_timestamp
+    failed_keywords   single column '0' of df_to_csv(pd.DataFrame(kw_batch)) or keyword
+
+Example usage:
+
+    files = discover("data/raw/*.csv")
+    df = load_dataset("data/raw/*.csv", "search_interest", max_workers=8)
+"""
+
+import csv
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from glob import glob
+
+from .lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+# column -> dtype, the first columns identify the dataset, see OPTIONAL for defaults
+SCHEMAS = {
+    "search_interest": {
+        "date": "datetime64[ns]",
+        "keyword": "object",
+        "search_interest": "float64",
+        "geo": "object",
+        "cat": "int64",
+    },
+    "related_queries": {
+        "query": "object",
+        "value": "float64",
+        "keyword": "object",
+        "ranking": "object",
+        "geo": "object",
+        "query_timestamp": "datetime64[ns]",
+    },
+    "results_count": {
+        "keyword": "object",
+        "results_count": "float64",
+        "search_url": "object",
+        "query_timestamp": "datetime64[ns]",
+    },
+    "failed_keywords": {"keyword": "object", "geo": "object", "cat": "int64"},
+}
+OPTIONAL = {
+    "search_interest": {"geo": "global", "cat": 0},
+    "failed_keywords": {"geo": "global", "cat": 0},
+}
+CATEGORICAL = ["keyword", "geo", "ranking", "source_file"]
+
+TIMESTAMP_PATTERN = re.compile(r"(\d{6}-\d{6})")
+
+
+def read_header(filepath):
+    with open(filepath, newline="", encoding="utf8") as file:
+        return next(csv.reader(file), [])
+
+
+def sniff_schema(filepath):
+    """Dataset name of filepath by its header, None if no schema matches"""
+    try:
+        header = set(read_header(filepath))
+    except (OSError, UnicodeDecodeError) as e:
+        logging.warning(f"Cannot read header of {filepath}: {e}")
+        return None
+
+    for dataset, columns in SCHEMAS.items():
+        required = set(columns) - set(OPTIONAL.get(dataset, {}))
+        if required <= header:
+            return dataset
+    if header == {"0"}:
+        return "failed_keywords"
+    return None
+
+
+def run_timestamp(filepath):
+    """Run time in the file name like *_230115-093000.csv, file mtime otherwise"""
+    match = TIMESTAMP_PATTERN.search(os.path.basename(filepath))
+    if match:
+        try:
+            return datetime.strptime(match.group(1), "%y%m%d-%H%M%S")
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(os.path.getmtime(filepath))
+
+
+def discover(pattern):
+    """Files matching pattern with dataset, size and run timestamp
+
+    Returns:
+        Dataframe: path, dataset, bytes, run_timestamp sorted by run_timestamp
+    """
+    rows = [
+        {
+            "path": path,
+            "dataset": sniff_schema(path),
+            "bytes": os.path.getsize(path),
+            "run_timestamp": run_timestamp(path),
+        }
+        for path in glob(pattern)
+        if os.path.isfile(path)
+    ]
+    files = pd.DataFrame(rows, columns=["path", "dataset", "bytes", "run_timestamp"])
+    return files.sort_values(["run_timestamp", "path"]).reset_index(drop=True)
+
+
+# ----------------------------------------
+# -- Parse
+# ----------------------------------------
+
+
+def normalize(df, dataset):
+    """Columns and dtypes of SCHEMAS[dataset], missing optional columns filled"""
+    schema = SCHEMAS[dataset]
+    if dataset == "failed_keywords" and "0" in df.columns:
+        df = df.rename(columns={"0": "keyword"})
+
+    for column, default in OPTIONAL.get(dataset, {}).items():
+        if column not in df.columns:
+            df[column] = default
+        else:
+            df[column] = df[column].fillna(default)
+
+    for column, dtype in schema.items():
+        if dtype.startswith("datetime"):
+            df[column] = pd.to_datetime(df[column], errors="coerce")
+        elif dtype in ("float64", "int64"):
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df[list(schema)]
+
+
+def read_file(filepath, dataset):
+    """Parse one file into the dataset schema with provenance. Runs in a worker."""
+    schema = SCHEMAS[dataset]
+    header = read_header(filepath)
+    usecols = [c for c in header if c in schema or c == "0"]
+    dtypes = {c: "object" for c in usecols if schema.get(c) == "object"}
+
+    df = pd.read_csv(filepath, usecols=usecols, dtype=dtypes, engine="c")
+    df = normalize(df, dataset)
+    df["source_file"] = os.path.basename(filepath)
+    df["run_timestamp"] = run_timestamp(filepath)
+    # factorize strings in the workers, load_dataset() only merges categories
+    for column in CATEGORICAL:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def unify_categories(frames, columns):
+    """Give categorical columns of all frames the same categories, so concat keeps them"""
+    for column in columns:
+        if not all(column in frame.columns for frame in frames):
+            continue
+        categories = frames[0][column].cat.categories
+        for frame in frames[1:]:
+            categories = categories.union(frame[column].cat.categories)
+        dtype = pd.CategoricalDtype(categories)
+        for frame in frames:
+            frame[column] = frame[column].astype(dtype)
+
+
+def empty_dataset(dataset):
+    """Frame with the columns and dtypes load_dataset() returns, without rows"""
+    return normalize(pd.DataFrame(columns=list(SCHEMAS[dataset])), dataset).assign(
+        source_file=pd.Series(dtype="category"),
+        run_timestamp=pd.Series(dtype="datetime64[ns]"),
+    )
+
+
+def load_dataset(pattern, dataset, max_workers=None, processes=False, files=None):
+    """All files of dataset matching pattern, parsed concurrently and concatenated once
+
+    Threads suffice when files are small, processes scale CSV parsing across cores for
+    large files at the cost of pickling the parsed frames back.
+
+    Args:
+        pattern (str): glob like 'data/raw/*.csv'
+        dataset (str): key of SCHEMAS
+        max_workers (int): pool size, defaults to the executor's default
+        processes (bool): parse in a process pool instead of threads
+        files (Dataframe): output of discover(), avoids sniffing headers again
+
+    Returns:
+        Dataframe: SCHEMAS[dataset] columns, source_file, run_timestamp. Rows are in
+            run_timestamp order of their files.
+    """
+    if dataset not in SCHEMAS:
+        raise ValueError(f"Unknown dataset {dataset}, choose from {list(SCHEMAS)}")
+    files = discover(pattern) if files is None else files
+    paths = files.loc[files["dataset"] == dataset, "path"].tolist()
+    if not paths:
+        return empty_dataset(dataset)
+
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    frames, failed = [], []
+    with executor_class(max_workers=max_workers) as executor:
+        # results in file order, so rows stay in run order
+        futures = [executor.submit(read_file, path, dataset) for path in paths]
+        for path, future in zip(paths, futures):
+            try:
+                frames.append(future.result())
+            except Exception as e:
+                logging.warning(f"Skip {path}: {e}")
+                failed.append(path)
+
+    if not frames:
+        logging.warning(f"All {len(failed)} {dataset} files failed to load")
+        return empty_dataset(dataset)
+
+    unify_categories(frames, CATEGORICAL)
+    df = pd.concat(frames, ignore_index=True)
+    logging.info(
+        f"Loaded {len(df)} {dataset} rows from {len(frames)} files, {len(failed)} failed"
+    )
+    return df
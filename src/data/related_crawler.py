@@ -0,0 +1,292 @@
+"""
+Breadth-first crawl of Google Trends related queries
+
+Expands seed terms to their related queries, those queries' related queries and so on,
+until max_depth or the query budget is reached. Used to discover ESG controversy terms.
+
+    * frontier deduplicated on normalized query strings
+    * highest 'rising' value first within a depth, top queries after rising ones
+    * 5 keywords per payload, batches run concurrently under the shared rate limiter
+    * frontier, batches in flight, seen queries and results are checkpointed to JSON
+      after every batch, a crawl with the same checkpoint_path resumes where it stopped
+
+Example usage:
+
+    crawler = RelatedQueriesCrawler(["greenwashing", "child labor"], max_depth=2,
+                                    checkpoint_path="data/interim/crawl.json")
+    df = crawler.run()
+"""
+
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from . import metrics
+from .google_trends import create_pytrends_session, get_related_queries_pipeline
+from .lazy_imports import lazy_import
+from .manifest import atomic_write_json
+from .rate_limit import get_rate_limiter
+
+pd = lazy_import("pandas")
+
+RESULT_COLUMNS = ["source", "query", "value", "ranking", "depth", "geo"]
+# priority of seeds, above any rising value and finite so checkpoints stay valid JSON
+SEED_PRIORITY = 1e12
+
+
+def normalize_query(query):
+    """Lowercase, unicode-normalized query with single spaces"""
+    query = unicodedata.normalize("NFKC", str(query)).casefold()
+    return re.sub(r"\s+", " ", query).strip()
+
+
+class RelatedQueriesCrawler:
+    """Breadth-first related queries crawl with checkpoints
+
+    Args:
+        seeds (list): start terms at depth 0
+        max_depth (int): depth of the deepest queried terms, seeds have depth 0
+        max_queries (int): budget of keywords sent to Trends
+        cat (int): Trends category
+        geo (str): geolocation like 'DE', '' for global
+        include_top (bool): also expand 'top' related queries, after 'rising' ones
+        batch_size (int): keywords per payload, at most 5
+        max_workers (int): concurrent payloads
+        max_retries (int): attempts per batch before its keywords are dropped
+        base_url (str): alternative Trends host, see create_pytrends_session()
+        limiter (RateLimiter): defaults to rate_limit.get_rate_limiter("trends")
+        checkpoint_path (str): JSON checkpoint, resumed if it exists
+    """
+
+    def __init__(
+        self,
+        seeds,
+        max_depth=2,
+        max_queries=200,
+        cat=0,
+        geo="",
+        include_top=True,
+        batch_size=5,
+        max_workers=2,
+        max_retries=2,
+        base_url=None,
+        limiter=None,
+        checkpoint_path=None,
+    ):
+        self.max_depth = max_depth
+        self.max_queries = max_queries
+        self.cat = cat
+        self.geo = geo
+        self.include_top = include_top
+        self.batch_size = min(batch_size, 5)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_url = base_url
+        self.limiter = limiter or get_rate_limiter("trends")
+        self.checkpoint_path = checkpoint_path
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._seq = 0
+        self.frontier = []
+        self.in_flight = []
+        self.seen = set()
+        self.attempts = {}
+        self.queried = 0
+        self.failed = []
+        self.results = []
+
+        if checkpoint_path and os.path.isfile(checkpoint_path):
+            self.load_checkpoint()
+        else:
+            for seed in seeds:
+                self.push(seed, depth=0, priority=SEED_PRIORITY)
+
+    # ----------------------------------------
+    # -- Frontier
+    # ----------------------------------------
+
+    def push(self, query, depth, priority):
+        """Add query to the frontier unless it was seen before. Returns True if added."""
+        key = normalize_query(query)
+        if not key or key in self.seen or depth > self.max_depth:
+            return False
+        self.seen.add(key)
+        self._seq += 1
+        # heapq pops the smallest: shallower first, then higher priority, then insertion order
+        heapq.heappush(self.frontier, (depth, -priority, self._seq, key))
+        return True
+
+    def pop_batch(self):
+        """Up to batch_size queries of the shallowest depth in the frontier
+
+        Returns:
+            list: (key, depth, rank) with the rank they had in the frontier
+        """
+        batch = []
+        while self.frontier and len(batch) < self.batch_size:
+            depth = self.frontier[0][0]
+            if batch and depth != batch[0][1]:
+                break
+            if self.queried + len(batch) >= self.max_queries:
+                break
+            _, rank, _, key = heapq.heappop(self.frontier)
+            batch.append((key, depth, rank))
+        self.queried += len(batch)
+        return batch
+
+    # ----------------------------------------
+    # -- Checkpoints
+    # ----------------------------------------
+
+    def save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        state = {
+            "frontier": [list(item) for item in self.frontier],
+            "in_flight": [[list(item) for item in batch] for batch in self.in_flight],
+            "seen": sorted(self.seen),
+            "attempts": self.attempts,
+            "queried": self.queried,
+            "failed": self.failed,
+            "results": self.results,
+            "seq": self._seq,
+            "saved_at": datetime.utcnow().isoformat(timespec="seconds"),
+        }
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_path))
+        os.makedirs(directory, exist_ok=True)
+        atomic_write_json(state, self.checkpoint_path, allow_nan=False)
+
+    def load_checkpoint(self):
+        with open(self.checkpoint_path, encoding="utf8") as file:
+            state = json.load(file)
+        self.frontier = [tuple(item) for item in state["frontier"]]
+        heapq.heapify(self.frontier)
+        self.seen = set(state["seen"])
+        self.attempts = state["attempts"]
+        self.queried = state["queried"]
+        self.failed = state["failed"]
+        self.results = state["results"]
+        self._seq = state["seq"]
+        # batches that were running when the crawl stopped go back to the frontier
+        in_flight = state.get("in_flight", [])
+        for batch in in_flight:
+            self._restore(batch)
+        logging.info(
+            f"Resume crawl from {self.checkpoint_path}: {len(self.frontier)} queued, "
+            f"{len(in_flight)} interrupted batches requeued, {self.queried} queried"
+        )
+
+    # ----------------------------------------
+    # -- Crawl
+    # ----------------------------------------
+
+    def _session(self):
+        # TrendReq sessions are not thread-safe, one per worker thread
+        if getattr(self._local, "session", None) is None:
+            self._local.session = create_pytrends_session(base_url=self.base_url)
+        return self._local.session
+
+    def query_batch(self, batch):
+        """Related queries of a batch. Runs in a worker thread."""
+        self.limiter.acquire()
+        keywords = [key for key, _, _ in batch]
+        # get_related_queries() returns an empty frame on errors, unpacking it raises
+        return get_related_queries_pipeline(
+            self._session(),
+            keyword_list=keywords,
+            cat=self.cat,
+            geo=self.geo,
+            geo_description=self.geo or "global",
+        )
+
+    def _expand(self, batch, df):
+        depths = {key: depth for key, depth, _ in batch}
+        for row in df.itertuples(index=False):
+            source = normalize_query(row.keyword)
+            depth = depths.get(source, 0) + 1
+            try:
+                value = float(row.value)
+            except (TypeError, ValueError):
+                value = 0.0
+            self.results.append(
+                {
+                    "source": source,
+                    "query": normalize_query(row.query),
+                    "value": value,
+                    "ranking": row.ranking,
+                    "depth": depth,
+                    "geo": self.geo or "global",
+                }
+            )
+            if row.ranking == "rising":
+                self.push(row.query, depth, priority=value)
+            elif self.include_top:
+                # top queries after all rising ones of the same depth
+                self.push(row.query, depth, priority=-1e9 + value)
+
+    def _restore(self, batch):
+        """Put popped keys back into the frontier with their rank, without counting an attempt"""
+        for key, depth, rank in batch:
+            self._seq += 1
+            heapq.heappush(self.frontier, (depth, rank, self._seq, key))
+        self.queried -= len(batch)
+
+    def _requeue(self, batch, error):
+        for key, depth, rank in batch:
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+            if self.attempts[key] < self.max_retries:
+                self._seq += 1
+                heapq.heappush(self.frontier, (depth, rank, self._seq, key))
+                self.queried -= 1
+            else:
+                self.failed.append(key)
+        logging.warning(
+            f"Related queries failed for {[k for k, _, _ in batch]}: {error}"
+        )
+
+    def run(self):
+        """Crawl until the frontier is empty, max_depth is reached or the budget is spent
+
+        Returns:
+            Dataframe: source, query, value, ranking, depth, geo per related query
+        """
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                with self._lock:
+                    while len(running) < self.max_workers:
+                        batch = self.pop_batch()
+                        if not batch:
+                            break
+                        self.in_flight.append(batch)
+                        running[executor.submit(self.query_batch, batch)] = batch
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = running.pop(future)
+                    with self._lock:
+                        self.in_flight.remove(batch)
+                        try:
+                            self._expand(batch, future.result())
+                        except Exception as e:
+                            metrics.RETRIES.inc(endpoint="related_queries")
+                            self._requeue(batch, e)
+                        self.save_checkpoint()
+
+        logging.info(
+            f"Crawl finished: {self.queried} queried, {len(self.seen)} seen, "
+            f"{len(self.frontier)} left in frontier, {len(self.failed)} failed"
+        )
+        return self.to_frame()
+
+    def to_frame(self):
+        return pd.DataFrame(self.results, columns=RESULT_COLUMNS)
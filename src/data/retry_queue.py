@@ -0,0 +1,348 @@
+"""
+Durable retry queue for failed keyword batches in SQLite
+
+Batches that exhaust their retries are enqueued with error class, attempt count and the
+time they become eligible again. drain() re-runs eligible batches with exponential backoff.
+A batch that keeps failing is split into single keywords, so one bad keyword does not
+block the other four. Single keywords that still fail go to the dead_letter table.
+
+RetryQueue: enqueue, drain, pending, dead_letters
+Jobs are names mapped to handlers in drain(), e.g. "interest_over_time" ->
+google_trends.retry_interest_over_time, called as handler(keywords, **params).
+
+Example usage:
+
+    queue = RetryQueue("data/raw/retry_queue.sqlite")
+    get_interest_over_time(keywords, filepath, filepath_failed, retry_queue=queue)
+    queue.drain({"interest_over_time": retry_interest_over_time})
+
+    python -m src.data.retry_queue data/raw/retry_queue.sqlite --drain
+"""
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+
+from . import metrics
+from .lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+# endpoint label of the retry metrics per job, as in metrics.track_request()
+JOB_ENDPOINTS = {"interest_over_time": "trends_iot"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    keywords TEXT NOT NULL,
+    params TEXT NOT NULL,
+    error_class TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_eligible_at REAL NOT NULL,
+    created_at TEXT,
+    updated_at TEXT,
+    UNIQUE (job, keywords, params)
+);
+CREATE INDEX IF NOT EXISTS idx_queue_eligible ON queue (next_eligible_at);
+CREATE TABLE IF NOT EXISTS dead_letter (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    params TEXT NOT NULL,
+    error_class TEXT,
+    error TEXT,
+    attempts INTEGER,
+    dead_at TEXT
+);
+"""
+
+
+def _now_iso():
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+
+def _dumps(obj):
+    return json.dumps(obj, sort_keys=True, default=str)
+
+
+class RetryQueue:
+    """Failed batches in SQLite with backoff and dead-lettering
+
+    Args:
+        path (str): SQLite file, created if missing
+        max_attempts (int): failed drains of a batch before it is split or dead-lettered
+        base_delay (float): seconds before the first retry, doubled per attempt
+        max_delay (float): cap of the backoff in seconds
+    """
+
+    def __init__(self, path, max_attempts=4, base_delay=300, max_delay=6 * 3600):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()):
+            pass
+
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        con.executescript(SCHEMA)
+        return con
+
+    def backoff(self, attempts):
+        """Seconds until the next attempt, exponential with jitter"""
+        delay = min(self.base_delay * 2 ** max(attempts - 1, 0), self.max_delay)
+        return delay * random.uniform(0.8, 1.2)
+
+    # ----------------------------------------
+    # -- Write
+    # ----------------------------------------
+
+    def enqueue(self, job, keywords, params=None, error=None, attempts=0, delay=None):
+        """Record a failed batch. Enqueuing the same batch again keeps a single entry.
+
+        Args:
+            job (str): handler name used by drain()
+            keywords (list): keyword batch
+            params (dict): JSON serializable keyword arguments of the handler
+            error (Exception): last error, its class is stored for triage
+            attempts (int): failed drains so far
+            delay (float): seconds until eligible, defaults to backoff(attempts)
+        """
+        delay = self.backoff(attempts) if delay is None else delay
+        with closing(self._connect()) as con, con:
+            con.execute(
+                """
+                INSERT INTO queue (job, keywords, params, error_class, error, attempts,
+                    next_eligible_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (job, keywords, params) DO UPDATE SET
+                    error_class = excluded.error_class,
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    job,
+                    _dumps(list(keywords)),
+                    _dumps(params or {}),
+                    type(error).__name__ if error is not None else None,
+                    str(error) if error is not None else None,
+                    attempts,
+                    time.time() + delay,
+                    _now_iso(),
+                    _now_iso(),
+                ),
+            )
+        logging.info(f"Enqueued {job} retry for {list(keywords)}")
+
+    def _fail(self, con, entry, error):
+        attempts = entry["attempts"] + 1
+        error_class, message = type(error).__name__, str(error)
+
+        if attempts < self.max_attempts:
+            con.execute(
+                """
+                UPDATE queue SET attempts = ?, next_eligible_at = ?, error_class = ?,
+                    error = ?, updated_at = ? WHERE id = ?
+                """,
+                (
+                    attempts,
+                    time.time() + self.backoff(attempts),
+                    error_class,
+                    message,
+                    _now_iso(),
+                    entry["id"],
+                ),
+            )
+            return "retry"
+
+        con.execute("DELETE FROM queue WHERE id = ?", (entry["id"],))
+        keywords = entry["keywords"]
+        if len(keywords) > 1:
+            # isolate the failing keyword(s): retry each keyword on its own
+            for kw in keywords:
+                con.execute(
+                    """
+                    INSERT OR IGNORE INTO queue (job, keywords, params, error_class, error,
+                        attempts, next_eligible_at, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)
+                    """,
+                    (
+                        entry["job"],
+                        _dumps([kw]),
+                        entry["params_json"],
+                        error_class,
+                        message,
+                        time.time(),
+                        _now_iso(),
+                        _now_iso(),
+                    ),
+                )
+            return "split"
+
+        con.execute(
+            """
+            INSERT INTO dead_letter (job, keyword, params, error_class, error, attempts, dead_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                entry["job"],
+                keywords[0],
+                entry["params_json"],
+                error_class,
+                message,
+                attempts,
+                _now_iso(),
+            ),
+        )
+        logging.warning(f"{keywords[0]} dead-lettered after {attempts} attempts")
+        return "dead"
+
+    # ----------------------------------------
+    # -- Read
+    # ----------------------------------------
+
+    def eligible(self, now=None, limit=None):
+        """Entries whose next_eligible_at has passed, oldest first"""
+        query = """
+            SELECT id, job, keywords, params, attempts FROM queue
+            WHERE next_eligible_at <= ? ORDER BY next_eligible_at
+        """
+        args = [time.time() if now is None else now]
+        if limit is not None:
+            query += " LIMIT ?"
+            args.append(limit)
+        with closing(self._connect()) as con:
+            rows = con.execute(query, args).fetchall()
+        return [
+            {
+                "id": id_,
+                "job": job,
+                "keywords": json.loads(keywords),
+                "params": json.loads(params),
+                "params_json": params,
+                "attempts": attempts,
+            }
+            for id_, job, keywords, params, attempts in rows
+        ]
+
+    def pending(self):
+        """All queued entries as dataframe"""
+        with closing(self._connect()) as con:
+            return pd.read_sql_query(
+                "SELECT * FROM queue ORDER BY next_eligible_at", con
+            )
+
+    def dead_letters(self):
+        """Permanently failing keywords as dataframe"""
+        with closing(self._connect()) as con:
+            return pd.read_sql_query("SELECT * FROM dead_letter ORDER BY dead_at", con)
+
+    def _next_eligible_at(self, exclude_jobs=()):
+        exclude_jobs = list(exclude_jobs)
+        placeholders = ",".join("?" * len(exclude_jobs))
+        with closing(self._connect()) as con:
+            return con.execute(
+                f"SELECT min(next_eligible_at) FROM queue WHERE job NOT IN ({placeholders})",
+                exclude_jobs,
+            ).fetchone()[0]
+
+    def __len__(self):
+        with closing(self._connect()) as con:
+            return con.execute("SELECT count(*) FROM queue").fetchone()[0]
+
+    # ----------------------------------------
+    # -- Drain
+    # ----------------------------------------
+
+    def drain(self, handlers, limit=None, pause=0, wait=False):
+        """Re-run eligible entries with their job handler
+
+        Args:
+            handlers (dict): job name -> callable(keywords, **params), raises on failure
+            limit (int): maximum entries in this drain
+            pause (float): seconds between entries, e.g. to respect rate limits
+            wait (bool): keep draining until the queue is empty, sleeping until
+                the next entry becomes eligible
+
+        Returns:
+            dict: number of entries per outcome ok, retry, split, dead, skipped
+        """
+        outcomes = {"ok": 0, "retry": 0, "split": 0, "dead": 0, "skipped": 0}
+        done = 0
+        unknown_jobs = set()
+
+        while limit is None or done < limit:
+            entries = [
+                entry for entry in self.eligible() if entry["job"] not in unknown_jobs
+            ]
+            if limit is not None:
+                entries = entries[: limit - done]
+            if not entries:
+                if not wait:
+                    break
+                next_at = self._next_eligible_at(exclude_jobs=unknown_jobs)
+                if next_at is None:
+                    break
+                time.sleep(max(next_at - time.time(), 0.1))
+                continue
+
+            for entry in entries:
+                handler = handlers.get(entry["job"])
+                if handler is None:
+                    logging.warning(f"No handler for job {entry['job']}, skip")
+                    unknown_jobs.add(entry["job"])
+                    outcomes["skipped"] += 1
+                    continue
+
+                try:
+                    handler(entry["keywords"], **entry["params"])
+                except Exception as e:
+                    metrics.RETRIES.inc(
+                        endpoint=JOB_ENDPOINTS.get(entry["job"], "other")
+                    )
+                    with closing(self._connect()) as con, con:
+                        outcome = self._fail(con, entry, e)
+                else:
+                    with closing(self._connect()) as con, con:
+                        con.execute("DELETE FROM queue WHERE id = ?", (entry["id"],))
+                    outcome = "ok"
+
+                outcomes[outcome] += 1
+                done += 1
+                if pause:
+                    time.sleep(pause)
+
+        logging.info(f"Drained retry queue: {outcomes}, {len(self)} left")
+        return outcomes
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .google_trends import retry_interest_over_time
+
+    parser = argparse.ArgumentParser(description="Inspect or drain the retry queue")
+    parser.add_argument("path", help="retry queue SQLite file")
+    parser.add_argument("--drain", action="store_true")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--pause", type=float, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    queue = RetryQueue(args.path)
+    if args.drain:
+        queue.drain(
+            {"interest_over_time": retry_interest_over_time},
+            limit=args.limit,
+            pause=args.pause,
+        )
+    print(queue.pending()[["job", "keywords", "error_class", "attempts"]].to_string())
+    print(f"{len(queue.dead_letters())} dead-lettered keywords")
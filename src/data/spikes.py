@@ -0,0 +1,336 @@
+"""
+Spike detection in search interest across all keywords in one pass
+
+Search interest is reshaped into a dates x keywords matrix, rolling statistics run
+along the date axis for all keywords at once instead of groupby('keyword').rolling().
+
+Methods
+    mad: robust z-score against the trailing median and MAD (median absolute deviation)
+    ewma: z-score against an exponentially weighted mean and variance
+
+wide_matrix: long search interest -> dates x keywords array
+rolling_mad_scores: trailing median/MAD scores with sliding windows, chunked over keywords
+ewma_scores: EWMA scores, one vectorized step per date
+detect_spikes: spike events with firm/term metadata
+SpikeDetector: keeps rolling state and scores only newly appended dates
+
+Example usage:
+
+    labels = label_query_keywords(esg_df.query_keyword, controversy_keywords)
+    events = detect_spikes(df, labels=labels, method="mad", window=52, threshold=3.5)
+
+    detector = SpikeDetector(window=52, labels=labels)
+    detector.update(df_history)
+    new_events = detector.update(df_new_batch)
+"""
+
+import logging
+
+from .lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# scales MAD to the standard deviation of normally distributed data
+MAD_SCALE = 1.4826
+# floors of the scaled MAD and EWMA standard deviation, in search interest points, so
+# a jump after a flat baseline like a run of zero filled dates scores finite
+MIN_DISPERSION = 1.0
+
+EVENT_COLUMNS = [
+    "date",
+    "keyword",
+    "firm_name",
+    "term",
+    "search_interest",
+    "baseline",
+    "score",
+]
+
+
+def wide_matrix(df, keywords=None):
+    """Dates x keywords float array from long data (date, keyword, search_interest)
+
+    Returns:
+        tuple: array with NaN for missing cells, dates, keywords
+    """
+    df_dates = pd.to_datetime(df["date"])
+    dates = pd.DatetimeIndex(np.sort(df_dates.unique()), name="date")
+    keywords = pd.Index(
+        np.sort(df.keyword.unique()) if keywords is None else keywords,
+        name="keyword",
+    )
+
+    row = dates.get_indexer(df_dates)
+    col = keywords.get_indexer(df.keyword)
+    known = col >= 0
+
+    values = np.full((len(dates), len(keywords)), np.nan)
+    values[row[known], col[known]] = df["search_interest"].to_numpy(dtype=float)[known]
+
+    return values, dates, keywords
+
+
+# ----------------------------------------
+# -- Scores
+# ----------------------------------------
+
+
+def _nanmedian(windows, count):
+    """Median over the last axis ignoring NaN, given the number of non-NaN values
+
+    Sorting moves NaN to the end, so the median sits at the middle of the first
+    count values. Much faster than np.nanmedian on many small windows.
+    """
+    ordered = np.sort(windows, axis=-1)
+    lo = np.clip((count - 1) // 2, 0, None)[..., None]
+    hi = np.clip(count // 2, 0, windows.shape[-1] - 1)[..., None]
+    median = (
+        np.take_along_axis(ordered, lo, axis=-1)
+        + np.take_along_axis(ordered, hi, axis=-1)
+    )[..., 0] / 2
+    return np.where(count > 0, median, np.nan)
+
+
+def rolling_mad_scores(values, window=52, min_periods=None, chunk_size=512):
+    """Robust z-scores against the median and MAD of the previous `window` dates
+
+    The current date is excluded from its own baseline, the scaled MAD is floored at
+    MIN_DISPERSION. Keywords are processed in chunks, the sliding window views cost
+    window x chunk_size values per date.
+
+    Args:
+        values (np.ndarray): dates x keywords, NaN for missing values
+        window (int): trailing dates in the baseline
+        min_periods (int): values needed for a score, defaults to window // 2
+        chunk_size (int): keywords per chunk
+
+    Returns:
+        tuple: scores and baseline medians, same shape as values
+    """
+    min_periods = min_periods or max(window // 2, 2)
+    n_dates, n_keywords = values.shape
+    scores = np.full(values.shape, np.nan)
+    medians = np.full(values.shape, np.nan)
+    if n_dates <= 1:
+        return scores, medians
+
+    # pad the start so every date t sees values[t - window : t]
+    padded = np.vstack([np.full((window, n_keywords), np.nan), values[:-1]])
+
+    for start in range(0, n_keywords, chunk_size):
+        cols = slice(start, start + chunk_size)
+        windows = np.lib.stride_tricks.sliding_window_view(
+            padded[:, cols], window, axis=0
+        )[:n_dates]
+        count = np.sum(~np.isnan(windows), axis=-1)
+        enough = count >= min_periods
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            median = _nanmedian(windows, count)
+            mad = MAD_SCALE * _nanmedian(np.abs(windows - median[..., None]), count)
+            score = (values[:, cols] - median) / np.fmax(mad, MIN_DISPERSION)
+
+        score[~enough] = np.nan
+        scores[:, cols] = score
+        medians[:, cols] = np.where(enough, median, np.nan)
+
+    return scores, medians
+
+
+def ewma_scores(values, halflife=8, min_periods=8, state=None):
+    """Z-scores against the exponentially weighted mean and variance before each date
+
+    The standard deviation is floored at MIN_DISPERSION.
+
+    Args:
+        values (np.ndarray): dates x keywords, NaN for missing values
+        halflife (float): dates after which a value's weight has halved
+        min_periods (int): values seen before a score is emitted
+        state (dict): mean, var and count per keyword from a previous call
+
+    Returns:
+        tuple: scores, baseline means, state after the last date
+    """
+    alpha = 1 - np.exp(np.log(0.5) / halflife)
+    n_keywords = values.shape[1]
+    if state is None:
+        state = {
+            "mean": np.full(n_keywords, np.nan),
+            "var": np.zeros(n_keywords),
+            "count": np.zeros(n_keywords, dtype=int),
+        }
+    mean, var, count = state["mean"].copy(), state["var"].copy(), state["count"].copy()
+
+    scores = np.full(values.shape, np.nan)
+    means = np.full(values.shape, np.nan)
+    for t, x in enumerate(values):
+        seen = count >= min_periods
+        score = (x - mean) / np.maximum(np.sqrt(var), MIN_DISPERSION)
+        scores[t] = np.where(seen, score, np.nan)
+        means[t] = np.where(seen, mean, np.nan)
+
+        valid = ~np.isnan(x)
+        first = valid & np.isnan(mean)
+        diff = np.where(valid, x - np.nan_to_num(mean), 0.0)
+        mean = np.where(first, x, np.where(valid, mean + alpha * diff, mean))
+        var = np.where(
+            valid & ~first,
+            (1 - alpha) * (var + alpha * diff**2),
+            np.where(first, 0, var),
+        )
+        count = count + valid
+
+    return scores, means, {"mean": mean, "var": var, "count": count}
+
+
+# ----------------------------------------
+# -- Events
+# ----------------------------------------
+
+
+def spike_events(values, scores, baseline, dates, keywords, threshold, labels=None):
+    """Cells with score above threshold as tidy frame with firm/term metadata"""
+    rows, cols = np.nonzero(np.nan_to_num(scores, nan=-np.inf) > threshold)
+    events = pd.DataFrame(
+        {
+            "date": dates[rows],
+            "keyword": keywords[cols],
+            "search_interest": values[rows, cols],
+            "baseline": baseline[rows, cols],
+            "score": scores[rows, cols],
+        }
+    )
+
+    if labels is not None:
+        events = events.merge(
+            labels.drop_duplicates("query_keyword").rename(
+                columns={"query_keyword": "keyword"}
+            ),
+            on="keyword",
+            how="left",
+        )
+    else:
+        events["firm_name"] = None
+        events["term"] = None
+
+    return events[EVENT_COLUMNS].sort_values(["date", "score"], ascending=[True, False])
+
+
+def detect_spikes(
+    df,
+    labels=None,
+    method="mad",
+    window=52,
+    threshold=3.5,
+    min_periods=None,
+    halflife=8,
+):
+    """Spike events in long search interest for all keywords at once
+
+    Args:
+        df (pd.DataFrame): date, keyword, search_interest from get_interest_over_time()
+        labels (pd.DataFrame): query_keyword, firm_name, term from label_query_keywords()
+        method (str): 'mad' or 'ewma'
+        window (int): trailing dates of the MAD baseline
+        threshold (float): minimum score of a spike
+        halflife (float): halflife in dates of the EWMA baseline
+
+    Returns:
+        Dataframe: date, keyword, firm_name, term, search_interest, baseline, score
+    """
+    values, dates, keywords = wide_matrix(df)
+
+    if method == "mad":
+        scores, baseline = rolling_mad_scores(values, window, min_periods)
+    elif method == "ewma":
+        scores, baseline, _ = ewma_scores(
+            values, halflife, min_periods or max(window // 2, 2)
+        )
+    else:
+        raise ValueError(f"Unknown spike detection method {method}")
+
+    events = spike_events(values, scores, baseline, dates, keywords, threshold, labels)
+    logging.info(f"{len(events)} spikes in {len(keywords)} keywords ({method})")
+
+    return events
+
+
+class SpikeDetector:
+    """Incremental spike detection that only scores dates after the last update
+
+    Keeps the last `window` dates of each keyword for the MAD baseline, or the
+    EWMA mean/variance, so a new batch costs O(new dates x keywords).
+    """
+
+    def __init__(
+        self,
+        method="mad",
+        window=52,
+        threshold=3.5,
+        min_periods=None,
+        halflife=8,
+        labels=None,
+    ):
+        if method not in ("mad", "ewma"):
+            raise ValueError(f"Unknown spike detection method {method}")
+        self.method = method
+        self.window = window
+        self.threshold = threshold
+        self.min_periods = min_periods or max(window // 2, 2)
+        self.halflife = halflife
+        self.labels = labels
+
+        self.keywords = pd.Index([], name="keyword")
+        self.last_date = None
+        self._history = np.empty((0, 0))
+        self._ewma_state = None
+
+    def _add_keywords(self, keywords):
+        new = pd.Index(keywords).difference(self.keywords)
+        if len(new) == 0:
+            return
+        self.keywords = self.keywords.append(new)
+        self._history = np.hstack(
+            [self._history, np.full((len(self._history), len(new)), np.nan)]
+        )
+        if self._ewma_state is not None:
+            self._ewma_state = {
+                "mean": np.append(self._ewma_state["mean"], np.full(len(new), np.nan)),
+                "var": np.append(self._ewma_state["var"], np.zeros(len(new))),
+                "count": np.append(self._ewma_state["count"], np.zeros(len(new), int)),
+            }
+
+    def update(self, df):
+        """Score dates in df after the last processed date
+
+        Dates up to the last processed date are ignored, so overlapping batches are safe.
+
+        Returns:
+            Dataframe: spike events of the new dates
+        """
+        if self.last_date is not None:
+            df = df.loc[pd.to_datetime(df["date"]) > self.last_date]
+        if df.empty:
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+
+        self._add_keywords(df.keyword.unique())
+        values, dates, _ = wide_matrix(df, keywords=self.keywords)
+
+        if self.method == "mad":
+            combined = np.vstack([self._history, values])
+            scores, baseline = rolling_mad_scores(
+                combined, self.window, self.min_periods
+            )
+            n_new = len(values)
+            scores, baseline = scores[-n_new:], baseline[-n_new:]
+            self._history = combined[-self.window :]
+        else:
+            scores, baseline, self._ewma_state = ewma_scores(
+                values, self.halflife, self.min_periods, state=self._ewma_state
+            )
+
+        self.last_date = dates.max()
+        return spike_events(
+            values, scores, baseline, dates, self.keywords, self.threshold, self.labels
+        )
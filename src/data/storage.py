@@ -0,0 +1,662 @@
+"""
+Embedded SQLite storage with upsert semantics for all ingested data
+
+One table per dataset with a composite primary key, so re-running a query overwrites
+its rows instead of appending duplicates:
+
+    search_interest   (keyword, geo, cat, timeframe, date)
+    related_queries   (keyword, geo, cat, ranking, query, query_date)
+    results_count     (keyword, query_date)
+    esg_scores        (yahoo_ticker, as_of_date)
+    files             (path) -> dataset, schema version, timeframe, geo, rows, date
+                      range, size and mtime of CSVs in data/raw, whether they are imported
+    file_keywords     (path, keyword) -> rows and date range of a keyword in a CSV
+
+Writes are bulk executemany() calls in one transaction, WAL mode lets the dashboard
+read while ingestion writes.
+
+Main functions
+    upsert_search_interest, upsert_related_queries, upsert_results_count, upsert_esg_scores
+    load_search_interest: rows of selected keywords, geo, timeframe and date range
+    list_keywords, list_timeframes: keywords with row counts and date ranges, timeframes
+    catalog_append: catalog rows appended to a CSV, called by every ingestion write
+    import_csv: upsert search interest CSVs that are new or changed since their last import
+    list_files, list_file_keywords: cataloged CSVs and their keywords
+
+Example usage:
+
+    upsert_search_interest(df, db_path="data/esg.sqlite", timeframe="today 5-y")
+    df = load_search_interest(["greenwashing"], db_path="data/esg.sqlite")
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from glob import glob
+
+from . import metrics
+from .lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+DEFAULT_DB_PATH = "data/esg.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_interest (
+    keyword TEXT NOT NULL,
+    geo TEXT NOT NULL DEFAULT 'global',
+    cat INTEGER NOT NULL DEFAULT 0,
+    timeframe TEXT NOT NULL,
+    date TEXT NOT NULL,
+    search_interest REAL,
+    updated_at TEXT,
+    PRIMARY KEY (keyword, geo, cat, timeframe, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_search_interest_date ON search_interest (date);
+
+CREATE TABLE IF NOT EXISTS related_queries (
+    keyword TEXT NOT NULL,
+    geo TEXT NOT NULL DEFAULT 'global',
+    cat INTEGER NOT NULL DEFAULT 0,
+    ranking TEXT NOT NULL,
+    query TEXT NOT NULL,
+    query_date TEXT NOT NULL,
+    value REAL,
+    query_timestamp TEXT,
+    PRIMARY KEY (keyword, geo, cat, ranking, query, query_date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_related_queries_query ON related_queries (query);
+
+CREATE TABLE IF NOT EXISTS results_count (
+    keyword TEXT NOT NULL,
+    query_date TEXT NOT NULL,
+    results_count INTEGER,
+    search_url TEXT,
+    query_timestamp TEXT,
+    PRIMARY KEY (keyword, query_date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS esg_scores (
+    yahoo_ticker TEXT NOT NULL,
+    as_of_date TEXT NOT NULL,
+    firm_name TEXT,
+    totalEsg REAL,
+    environmentScore REAL,
+    socialScore REAL,
+    governanceScore REAL,
+    highestControversy REAL,
+    peerGroup TEXT,
+    payload TEXT,
+    PRIMARY KEY (yahoo_ticker, as_of_date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_esg_scores_firm ON esg_scores (firm_name);
+
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dataset TEXT NOT NULL,
+    schema_version INTEGER,
+    timeframe TEXT,
+    geo TEXT,
+    rows INTEGER,
+    min_date TEXT,
+    max_date TEXT,
+    bytes INTEGER,
+    mtime_ns INTEGER,
+    imported INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS file_keywords (
+    path TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    min_date TEXT,
+    max_date TEXT,
+    PRIMARY KEY (path, keyword)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_file_keywords_keyword ON file_keywords (keyword);
+"""
+
+# bump when the columns of a dataset's CSVs change
+SCHEMA_VERSIONS = {"search_interest": 1}
+
+ESG_COLUMNS = [
+    "firm_name",
+    "totalEsg",
+    "environmentScore",
+    "socialScore",
+    "governanceScore",
+    "highestControversy",
+    "peerGroup",
+]
+
+
+def connect(db_path=DEFAULT_DB_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    con = sqlite3.connect(db_path, timeout=30)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.executescript(SCHEMA)
+    return con
+
+
+def _now_iso():
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+
+def _day(values):
+    """ISO dates 'YYYY-MM-DD' of a datetime-like column"""
+    return pd.to_datetime(values).dt.strftime("%Y-%m-%d")
+
+
+def _none_if_nan(values):
+    return values.astype(object).where(values.notna(), None)
+
+
+def _upsert(table, columns, key, rows, db_path):
+    """Insert rows, overwriting non-key columns of rows with an existing key"""
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in key)
+    sql = f"""
+        INSERT INTO {table} ({", ".join(columns)})
+        VALUES ({", ".join("?" * len(columns))})
+        ON CONFLICT ({", ".join(key)}) DO UPDATE SET {updates}
+    """
+    with closing(connect(db_path)) as con, con:
+        con.executemany(sql, rows)
+    metrics.ROWS_WRITTEN.inc(len(rows), dataset=table)
+    logging.info(f"Upserted {len(rows)} rows into {table}")
+    return len(rows)
+
+
+# ----------------------------------------
+# -- Write path
+# ----------------------------------------
+
+
+def upsert_search_interest(
+    df, db_path=DEFAULT_DB_PATH, timeframe="today 5-y", geo="global", cat=0
+):
+    """Upsert long search interest (date, keyword, search_interest)
+
+    geo and cat columns of df, e.g. from get_interest_over_time_grid(), take precedence
+    over the geo and cat arguments.
+
+    Returns:
+        int: rows written
+    """
+    if df.empty:
+        return 0
+    n = len(df)
+    rows = zip(
+        df["keyword"].astype(str),
+        df["geo"].fillna("global") if "geo" in df.columns else [geo] * n,
+        df["cat"].astype(int) if "cat" in df.columns else [cat] * n,
+        [timeframe] * n,
+        _day(df["date"]),
+        _none_if_nan(df["search_interest"].astype(float)),
+        [_now_iso()] * n,
+    )
+    return _upsert(
+        "search_interest",
+        [
+            "keyword",
+            "geo",
+            "cat",
+            "timeframe",
+            "date",
+            "search_interest",
+            "updated_at",
+        ],
+        ["keyword", "geo", "cat", "timeframe", "date"],
+        list(rows),
+        db_path,
+    )
+
+
+def upsert_related_queries(df, db_path=DEFAULT_DB_PATH, cat=0):
+    """Upsert output of get_related_queries_pipeline(), one row per query and day
+
+    A cat column of df, e.g. from get_related_queries_grid(), takes precedence over cat.
+    """
+    if df.empty:
+        return 0
+    n = len(df)
+    timestamps = pd.to_datetime(df["query_timestamp"])
+    rows = zip(
+        df["keyword"].astype(str),
+        df["geo"].fillna("global"),
+        df["cat"].astype(int) if "cat" in df.columns else [cat] * n,
+        df["ranking"].astype(str),
+        df["query"].astype(str),
+        timestamps.dt.strftime("%Y-%m-%d"),
+        _none_if_nan(pd.to_numeric(df["value"], errors="coerce")),
+        timestamps.dt.strftime("%Y-%m-%dT%H:%M:%S"),
+    )
+    return _upsert(
+        "related_queries",
+        [
+            "keyword",
+            "geo",
+            "cat",
+            "ranking",
+            "query",
+            "query_date",
+            "value",
+            "query_timestamp",
+        ],
+        ["keyword", "geo", "cat", "ranking", "query", "query_date"],
+        list(rows),
+        db_path,
+    )
+
+
+def upsert_results_count(df, db_path=DEFAULT_DB_PATH):
+    """Upsert output of get_results_count_pipeline(), one row per keyword and day"""
+    if df.empty:
+        return 0
+    timestamps = pd.to_datetime(df["query_timestamp"])
+    rows = zip(
+        df["keyword"].astype(str),
+        timestamps.dt.strftime("%Y-%m-%d"),
+        _none_if_nan(df["results_count"]),
+        df["search_url"].astype(str),
+        timestamps.dt.strftime("%Y-%m-%dT%H:%M:%S"),
+    )
+    return _upsert(
+        "results_count",
+        ["keyword", "query_date", "results_count", "search_url", "query_timestamp"],
+        ["keyword", "query_date"],
+        list(rows),
+        db_path,
+    )
+
+
+def upsert_esg_scores(esg_df, db_path=DEFAULT_DB_PATH, as_of_date=None):
+    """Upsert ESG scores per ticker, e.g. esg_firm_query_keywords_pipeline() output
+
+    One row per yahoo_ticker and day. Columns beyond the core scores are kept as JSON
+    in payload.
+    """
+    if esg_df.empty:
+        return 0
+    as_of_date = as_of_date or datetime.utcnow().strftime("%Y-%m-%d")
+    esg_df = esg_df.drop(columns=["query_keyword"], errors="ignore")
+    esg_df = esg_df.drop_duplicates("yahoo_ticker")
+
+    core = [c for c in ESG_COLUMNS if c in esg_df.columns]
+    extra = [c for c in esg_df.columns if c not in core and c != "yahoo_ticker"]
+    # to_dict() of a frame without columns has no records
+    records = esg_df[extra].to_dict(orient="records") if extra else [{}] * len(esg_df)
+    payload = [json.dumps(record, default=str) for record in records]
+    columns = ["yahoo_ticker", "as_of_date"] + core + ["payload"]
+    rows = zip(
+        esg_df["yahoo_ticker"].astype(str),
+        [as_of_date] * len(esg_df),
+        *[_none_if_nan(esg_df[c]) for c in core],
+        payload,
+    )
+    return _upsert(
+        "esg_scores", columns, ["yahoo_ticker", "as_of_date"], list(rows), db_path
+    )
+
+
+# ----------------------------------------
+# -- Catalog of CSVs
+# ----------------------------------------
+
+
+def _date_range(df):
+    if df is None or "date" not in df.columns or not len(df):
+        return None, None
+    dates = _day(df["date"]).dropna()
+    return (dates.min(), dates.max()) if len(dates) else (None, None)
+
+
+def _geos(df):
+    """Comma separated geos of df's rows, 'global' if it has no geo column"""
+    if df is None or "keyword" not in df.columns:
+        return None
+    if "geo" not in df.columns:
+        return "global"
+    return ",".join(sorted(df["geo"].fillna("global").astype(str).unique()))
+
+
+def _merge_range(*values):
+    values = [v for v in values if v is not None]
+    return (min(values), max(values)) if values else (None, None)
+
+
+def _record_file(
+    con, filepath, dataset, df=None, timeframe=None, imported=False, append=False
+):
+    """Catalog filepath with the keywords, geos and date range of df
+
+    Args:
+        df (Dataframe): rows of the file, or only the rows appended if append
+        imported (bool): rows are in the dataset's table, or there are none to import
+        append (bool): add df to the file's entry instead of replacing it
+    """
+    stat = os.stat(filepath)
+    previous = con.execute(
+        "SELECT rows, min_date, max_date, geo, timeframe, imported FROM files "
+        "WHERE path = ?",
+        (filepath,),
+    ).fetchone()
+    if not append or previous is None:
+        con.execute("DELETE FROM file_keywords WHERE path = ?", (filepath,))
+        previous = None
+
+    rows = len(df) if df is not None else None
+    min_date, max_date = _date_range(df)
+    geo = _geos(df)
+    if previous is not None:
+        (
+            prev_rows,
+            prev_min,
+            prev_max,
+            prev_geo,
+            prev_timeframe,
+            prev_imported,
+        ) = previous
+        rows = (prev_rows or 0) + (rows or 0)
+        min_date, max_date = _merge_range(prev_min, prev_max, min_date, max_date)
+        geos = set(filter(None, f"{prev_geo or ''},{geo or ''}".split(",")))
+        geo = ",".join(sorted(geos)) or None
+        timeframe = timeframe or prev_timeframe
+        imported = imported and bool(prev_imported)
+
+    con.execute(
+        """
+        INSERT OR REPLACE INTO files (path, dataset, schema_version, timeframe, geo,
+            rows, min_date, max_date, bytes, mtime_ns, imported, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            filepath,
+            dataset,
+            SCHEMA_VERSIONS.get(dataset),
+            timeframe,
+            geo,
+            rows,
+            min_date,
+            max_date,
+            stat.st_size,
+            stat.st_mtime_ns,
+            int(imported),
+            _now_iso(),
+        ),
+    )
+
+    if df is None or "keyword" not in df.columns or not len(df):
+        return
+    per_keyword = (
+        pd.DataFrame({"keyword": df["keyword"].astype(str), "date": _day(df["date"])})
+        .groupby("keyword")["date"]
+        .agg(["size", "min", "max"])
+    )
+    con.executemany(
+        """
+        INSERT INTO file_keywords (path, keyword, rows, min_date, max_date)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (path, keyword) DO UPDATE SET rows = rows + excluded.rows,
+            -- multi-argument min() and max() are null if any argument is null
+            min_date = min(
+                coalesce(min_date, excluded.min_date),
+                coalesce(excluded.min_date, min_date)
+            ),
+            max_date = max(
+                coalesce(max_date, excluded.max_date),
+                coalesce(excluded.max_date, max_date)
+            )
+        """,
+        zip(
+            [filepath] * len(per_keyword),
+            per_keyword.index,
+            per_keyword["size"].tolist(),
+            _none_if_nan(per_keyword["min"]),
+            _none_if_nan(per_keyword["max"]),
+        ),
+    )
+
+
+def catalog_append(
+    filepath,
+    df,
+    stat_before,
+    db_path=DEFAULT_DB_PATH,
+    timeframe=None,
+    imported=False,
+    dataset="search_interest",
+):
+    """Catalog rows just appended to filepath. Called on every ingestion write.
+
+    A file that existed before but is not cataloged with its previous size and mtime
+    was written elsewhere, its entry is dropped and import_csv() scans it completely.
+
+    Args:
+        filepath (str): CSV that df was appended to
+        df (Dataframe): rows appended
+        stat_before (os.stat_result): stat of filepath before the append, None if new
+        timeframe (str): timeframe of the rows
+        imported (bool): df was upserted into db_path as well
+
+    Returns:
+        bool: True if the file is cataloged
+    """
+    filepath = os.path.abspath(filepath)
+    with closing(connect(db_path)) as con, con:
+        known = con.execute(
+            "SELECT bytes, mtime_ns FROM files WHERE path = ?", (filepath,)
+        ).fetchone()
+        if stat_before is not None and known != (
+            stat_before.st_size,
+            stat_before.st_mtime_ns,
+        ):
+            con.execute("DELETE FROM files WHERE path = ?", (filepath,))
+            con.execute("DELETE FROM file_keywords WHERE path = ?", (filepath,))
+            return False
+
+        _record_file(
+            con,
+            filepath,
+            dataset,
+            df=df,
+            timeframe=timeframe,
+            imported=imported,
+            append=stat_before is not None,
+        )
+    return True
+
+
+def import_csv(pattern, db_path=DEFAULT_DB_PATH, timeframe="today 5-y"):
+    """Upsert search interest CSVs matching pattern that are not imported yet or changed
+    since, and catalog every file
+
+    Files are tracked in the files table by size and mtime, so calling this on every
+    dashboard run only reads files written since. A file keeps the timeframe it was
+    cataloged with by catalog_append(), timeframe applies to files without one. Rows
+    repeated across files collapse to one per key, the file written last wins.
+
+    Returns:
+        int: rows written
+    """
+    with closing(connect(db_path)) as con:
+        known = {
+            path: (size, mtime_ns, imported, file_timeframe)
+            for path, size, mtime_ns, imported, file_timeframe in con.execute(
+                "SELECT path, bytes, mtime_ns, imported, timeframe FROM files"
+            )
+        }
+
+    total = 0
+    for filepath in sorted(glob(pattern), key=os.path.getmtime):
+        filepath = os.path.abspath(filepath)
+        stat = os.stat(filepath)
+        size, mtime_ns, imported, file_timeframe = known.get(
+            filepath, (None, None, 0, None)
+        )
+        if imported and (size, mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            continue
+
+        try:
+            df = pd.read_csv(filepath)
+        except Exception as e:
+            logging.warning(f"Skip unreadable file {filepath}: {e}")
+            df, dataset = None, "unreadable"
+        else:
+            is_search_interest = {"date", "keyword", "search_interest"} <= set(
+                df.columns
+            )
+            dataset = "search_interest" if is_search_interest else "other"
+
+        if dataset != "search_interest":
+            df, file_timeframe = None, None
+        else:
+            file_timeframe = file_timeframe or timeframe
+            total += upsert_search_interest(
+                df, db_path=db_path, timeframe=file_timeframe
+            )
+        with closing(connect(db_path)) as con, con:
+            _record_file(
+                con, filepath, dataset, df=df, timeframe=file_timeframe, imported=True
+            )
+    return total
+
+
+# ----------------------------------------
+# -- Read path
+# ----------------------------------------
+
+
+def _filters(**filters):
+    """WHERE clause and parameters of the filters that are not None"""
+    filters = {column: value for column, value in filters.items() if value is not None}
+    if not filters:
+        return "", []
+    where = " AND ".join(f"{column} = ?" for column in filters)
+    return f"WHERE {where}", list(filters.values())
+
+
+def list_keywords(db_path=DEFAULT_DB_PATH, timeframe=None, geo=None):
+    """Keywords in search_interest with rows, date range, geos and timeframes
+
+    Args:
+        timeframe (str): only rows of this timeframe, all if None
+        geo (str): only rows of this geo, all if None
+    """
+    where, params = _filters(timeframe=timeframe, geo=geo)
+    with closing(connect(db_path)) as con:
+        return pd.read_sql_query(
+            f"""
+            SELECT keyword, count(*) AS rows, min(date) AS min_date, max(date) AS max_date,
+                group_concat(DISTINCT geo) AS geos,
+                group_concat(DISTINCT timeframe) AS timeframes
+            FROM search_interest
+            {where}
+            GROUP BY keyword
+            ORDER BY keyword
+            """,
+            con,
+            params=params,
+        )
+
+
+def list_timeframes(db_path=DEFAULT_DB_PATH, geo=None):
+    """Timeframes in search_interest, most rows first"""
+    where, params = _filters(geo=geo)
+    with closing(connect(db_path)) as con:
+        rows = con.execute(
+            f"""
+            SELECT timeframe FROM search_interest {where}
+            GROUP BY timeframe
+            ORDER BY count(*) DESC
+            """,
+            params,
+        ).fetchall()
+    return [timeframe for (timeframe,) in rows]
+
+
+def list_files(db_path=DEFAULT_DB_PATH):
+    """Cataloged CSVs with dataset, schema version, timeframe, geo, rows, date range and
+    size, newest first"""
+    with closing(connect(db_path)) as con:
+        return pd.read_sql_query(
+            "SELECT * FROM files ORDER BY mtime_ns DESC",
+            con,
+            parse_dates=["updated_at"],
+        )
+
+
+def list_file_keywords(db_path=DEFAULT_DB_PATH, dataset="search_interest"):
+    """Keywords of cataloged CSVs with files, rows and date range, without reading them"""
+    with closing(connect(db_path)) as con:
+        return pd.read_sql_query(
+            """
+            SELECT k.keyword, count(*) AS files, sum(k.rows) AS rows,
+                min(k.min_date) AS min_date, max(k.max_date) AS max_date,
+                group_concat(DISTINCT f.timeframe) AS timeframes
+            FROM file_keywords k JOIN files f ON k.path = f.path
+            WHERE f.dataset = ?
+            GROUP BY k.keyword
+            ORDER BY k.keyword
+            """,
+            con,
+            params=(dataset,),
+        )
+
+
+def load_search_interest(
+    keywords,
+    db_path=DEFAULT_DB_PATH,
+    geo=None,
+    cat=None,
+    timeframe=None,
+    start=None,
+    end=None,
+):
+    """Search interest of keywords, optionally filtered by geo, cat, timeframe and date range
+
+    Returns:
+        Dataframe: date, keyword, search_interest, geo, cat, timeframe
+    """
+    keywords = list(keywords)
+    if not keywords:
+        return pd.DataFrame(
+            columns=["date", "keyword", "search_interest", "geo", "cat", "timeframe"]
+        )
+
+    conditions = [f"keyword IN ({','.join('?' * len(keywords))})"]
+    params = keywords
+    for column, value, op in [
+        ("geo", geo, "="),
+        ("cat", cat, "="),
+        ("timeframe", timeframe, "="),
+        ("date", start, ">="),
+        ("date", end, "<="),
+    ]:
+        if value is not None:
+            conditions.append(f"{column} {op} ?")
+            params.append(str(value)[:10] if column == "date" else value)
+
+    with closing(connect(db_path)) as con:
+        return pd.read_sql_query(
+            f"""
+            SELECT date, keyword, search_interest, geo, cat, timeframe
+            FROM search_interest
+            WHERE {" AND ".join(conditions)}
+            ORDER BY keyword, date
+            """,
+            con,
+            params=params,
+            parse_dates=["date"],
+        )
+
+
+def load_table(table, db_path=DEFAULT_DB_PATH):
+    """Whole related_queries, results_count or esg_scores table"""
+    if table not in ("related_queries", "results_count", "esg_scores"):
+        raise ValueError(f"Unknown table {table}")
+    with closing(connect(db_path)) as con:
+        return pd.read_sql_query(f"SELECT * FROM {table}", con)
@@ -0,0 +1,230 @@
+"""
+Chunked streaming of large raw CSVs in bounded memory
+
+get_raw_data() and load_data() parse a whole file at once. For multi-GB exports of
+full-index runs the file is read in typed chunks instead and every step keeps only
+state that is small compared to the file:
+
+    iter_chunks: typed chunks with explicit dtypes and usecols, C parser
+    drop_missings_duplicates_stream: drop_missings_duplicates() across chunks, keeps
+        one 64-bit hash per unique row instead of the rows
+    superseded_rows, drop_rows: rows a later row of the same keyword and date replaces,
+        e.g. the partial period of an incremental refresh, found in a first pass
+    TimeUnitMean: mergeable sum and count per keyword and time unit, the streaming
+        counterpart of group_search_interest_on_time_unit()
+    aggregate_file: all of the above for one file
+
+Example usage:
+
+    df = aggregate_file("data/raw/full_index_search_interest.csv", unit="M")
+
+    agg = TimeUnitMean(unit="W")
+    for chunk in drop_missings_duplicates_stream(iter_chunks(filepath)):
+        agg.update(chunk)
+    df = agg.result()
+"""
+
+import logging
+
+from .lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+SEARCH_INTEREST_DTYPES = {"keyword": "category", "search_interest": "float32"}
+DATE_COLUMNS = ["date"]
+CHUNKSIZE = 500_000
+
+
+def iter_chunks(
+    filepath,
+    chunksize=CHUNKSIZE,
+    usecols=("date", "keyword", "search_interest"),
+    dtypes=None,
+    date_columns=DATE_COLUMNS,
+):
+    """Yield typed dataframes of up to chunksize rows
+
+    Dates are converted per chunk after parsing, which is faster than parse_dates.
+    The C parser is used since the pyarrow engine does not support chunksize.
+
+    Args:
+        filepath (str): CSV with header
+        chunksize (int): rows per chunk
+        usecols (list): columns to read, None reads all
+        dtypes (dict): column -> dtype, defaults to SEARCH_INTEREST_DTYPES
+        date_columns (list): columns converted to datetime64
+
+    Yields:
+        Dataframe: chunk with the dtypes given
+    """
+    dtypes = SEARCH_INTEREST_DTYPES if dtypes is None else dtypes
+    usecols = list(usecols) if usecols is not None else None
+    if usecols is not None:
+        dtypes = {k: v for k, v in dtypes.items() if k in usecols}
+
+    reader = pd.read_csv(
+        filepath,
+        usecols=usecols,
+        dtype=dtypes,
+        chunksize=chunksize,
+        engine="c",
+        low_memory=False,
+    )
+    rows = 0
+    for chunk in reader:
+        for column in date_columns:
+            if column in chunk.columns:
+                chunk[column] = pd.to_datetime(chunk[column], cache=True)
+        rows += len(chunk)
+        yield chunk
+    logging.debug(f"Streamed {rows} rows from {filepath}")
+
+
+# ----------------------------------------
+# -- Transforms
+# ----------------------------------------
+
+
+def _key_hashes(chunk, columns):
+    keys = chunk[list(columns)]
+    # categories hash by code, which differs between chunks
+    keys = keys.astype(
+        {c: "object" for c in keys.columns if keys[c].dtype.name == "category"}
+    )
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def superseded_rows(filepath, chunksize=CHUNKSIZE, key=("keyword", "date")):
+    """Positions of complete rows followed by a later complete row with the same key
+
+    Same rows as utils_data.drop_superseded() drops after dropna(), one pass over the
+    file keeping a 64-bit hash per row.
+
+    Returns:
+        np.ndarray: sorted row positions in the file, header excluded
+    """
+    positions, hashes, offset = [], [], 0
+    for chunk in iter_chunks(filepath, chunksize=chunksize):
+        complete = chunk.notna().all(axis=1).to_numpy()
+        positions.append(offset + np.flatnonzero(complete))
+        hashes.append(_key_hashes(chunk[complete], key))
+        offset += len(chunk)
+    if not positions:
+        return np.empty(0, dtype=int)
+
+    positions, hashes = np.concatenate(positions), np.concatenate(hashes)
+    # first occurrence in the reversed array is the last row of each key
+    _, last = np.unique(hashes[::-1], return_index=True)
+    latest = np.zeros(len(hashes), dtype=bool)
+    latest[len(hashes) - 1 - last] = True
+    return positions[~latest]
+
+
+def drop_rows(chunks, positions):
+    """Yield chunks without the rows at positions, counted across chunks"""
+    offset = 0
+    for chunk in chunks:
+        drop = np.isin(np.arange(offset, offset + len(chunk)), positions)
+        offset += len(chunk)
+        yield chunk[~drop].reset_index(drop=True) if drop.any() else chunk
+
+
+def drop_missings_duplicates_stream(chunks, subset=None):
+    """Yield chunks without missings and rows already yielded in earlier chunks
+
+    Same result as drop_missings_duplicates() on the concatenated chunks, but only a
+    sorted array of 8 byte row hashes is kept in memory.
+
+    Args:
+        chunks (iterable): dataframes with the same columns
+        subset (list): columns that identify duplicates, None uses all columns
+    """
+    seen = np.empty(0, dtype="uint64")
+    for chunk in chunks:
+        chunk = chunk.dropna()
+        hashes = _key_hashes(chunk, chunk.columns if subset is None else subset)
+
+        first = np.zeros(len(hashes), dtype=bool)
+        first[np.unique(hashes, return_index=True)[1]] = True
+        if len(seen):
+            pos = np.searchsorted(seen, hashes)
+            pos[pos == len(seen)] = 0
+            first &= seen[pos] != hashes
+
+        seen = np.union1d(seen, hashes[first])
+        yield chunk[first].reset_index(drop=True)
+
+
+class TimeUnitMean:
+    """Mean search interest per keyword and time unit from partial sums and counts
+
+    Partial aggregates of chunks, files or workers are merged with update() or merge(),
+    memory is bounded by keywords x time units, not rows.
+
+    Args:
+        unit (str): pandas frequency like 'M' or 'W', same bins as pd.Grouper(freq=unit)
+        value (str): column to average
+    """
+
+    def __init__(self, unit="M", value="search_interest"):
+        self.unit = unit
+        self.value = value
+        self.partial = None
+
+    def partial_of(self, chunk):
+        """Sum and count per keyword and time unit of one chunk"""
+        # float64 sums, float32 chunks would lose precision over many rows
+        frame = pd.DataFrame(
+            {
+                "keyword": chunk["keyword"].astype(str),
+                "date": chunk["date"],
+                self.value: chunk[self.value].astype("float64"),
+            }
+        )
+        grouped = frame.groupby(["keyword", pd.Grouper(key="date", freq=self.unit)])[
+            self.value
+        ].agg(["sum", "count"])
+        return grouped[grouped["count"] > 0]
+
+    def update(self, chunk):
+        self.merge(self.partial_of(chunk))
+        return self
+
+    def merge(self, partial):
+        """Add a partial aggregate, e.g. of another TimeUnitMean"""
+        if isinstance(partial, TimeUnitMean):
+            partial = partial.partial
+        if partial is None or partial.empty:
+            return self
+        if self.partial is None:
+            self.partial = partial
+        else:
+            self.partial = self.partial.add(partial, fill_value=0)
+        return self
+
+    def result(self):
+        """Dataframe like group_search_interest_on_time_unit(): keyword, date, mean value"""
+        if self.partial is None:
+            return pd.DataFrame(columns=["keyword", "date", self.value])
+        mean = (self.partial["sum"] / self.partial["count"]).rename(self.value)
+        return mean.sort_index().reset_index()
+
+
+def aggregate_file(filepath, unit="M", chunksize=CHUNKSIZE, deduplicate=True):
+    """Stream filepath through deduplication and time unit aggregation
+
+    Deduplication drops superseded rows as well, at the cost of a first pass.
+
+    Returns:
+        Dataframe: keyword, date, search_interest mean per time unit
+    """
+    chunks = iter_chunks(filepath, chunksize=chunksize)
+    if deduplicate:
+        superseded = superseded_rows(filepath, chunksize=chunksize)
+        chunks = drop_missings_duplicates_stream(drop_rows(chunks, superseded))
+
+    agg = TimeUnitMean(unit=unit)
+    for chunk in chunks:
+        agg.update(chunk)
+    return agg.result()
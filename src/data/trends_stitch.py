@@ -0,0 +1,281 @@
+"""
+Daily search interest over years, stitched from overlapping Trends windows
+
+Trends returns daily values only for windows up to ~269 days, longer timeframes are weekly.
+Stitching queries overlapping daily windows and chains them onto one scale:
+
+    1. plan_windows: overlapping date windows covering start to end
+    2. fetch_windows: query all keyword x window pairs concurrently under the shared rate
+       limiter, windows that ended in the past are cached
+    3. stitch_windows: per window the scale factor to its predecessor is the ratio of
+       their sums on the overlap, factors are chained with a cumulative product for all
+       keywords at once, then rescaled to 0-100
+
+Example usage:
+
+    df = stitch_daily_history(["adidas fraud", "bmw strike"], "2019-01-01", "2023-12-31")
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from . import metrics
+from .cache import MISSING, get_cache_backend
+from .google_trends import query_interest_over_time
+from .lazy_imports import lazy_import
+from .rate_limit import get_rate_limiter
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+MAX_DAILY_DAYS = 269
+CACHE_NAME = "trends_windows"
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def plan_windows(start, end, window_days=MAX_DAILY_DAYS, overlap_days=60):
+    """Overlapping windows from start to end, each short enough for daily data
+
+    Returns:
+        list: (start date, end date) tuples, consecutive windows share overlap_days days
+    """
+    start, end = _as_date(start), _as_date(end)
+    if overlap_days >= window_days:
+        raise ValueError("overlap_days must be smaller than window_days")
+
+    windows = []
+    window_start = start
+    while True:
+        window_end = min(window_start + timedelta(days=window_days - 1), end)
+        windows.append((window_start, window_end))
+        if window_end >= end:
+            break
+        window_start = window_end - timedelta(days=overlap_days - 1)
+
+    return windows
+
+
+def window_timeframe(window):
+    return f"{window[0]:%Y-%m-%d} {window[1]:%Y-%m-%d}"
+
+
+# ----------------------------------------
+# -- Fetch
+# ----------------------------------------
+
+
+def fetch_window(keyword, window, base_url=None, limiter=None, max_retries=3):
+    """Daily search interest of keyword in window, cached once the window is complete
+
+    Windows ending within the last 3 days may still change and are not cached.
+
+    Returns:
+        Dataframe: date, keyword, search_interest
+    """
+    cache = get_cache_backend(CACHE_NAME)
+    key = ("trends_window", keyword, window_timeframe(window), base_url)
+    complete = window[1] < date.today() - timedelta(days=3)
+
+    if complete:
+        df = cache.get(key)
+        metrics.record_cache(CACHE_NAME, hit=df is not MISSING)
+        if df is not MISSING:
+            return df
+
+    limiter = limiter or get_rate_limiter("trends")
+    date_index = pd.Series(pd.date_range(window[0], window[1], freq="D"), name="date")
+
+    for attempt in range(max_retries):
+        limiter.acquire()
+        try:
+            df = query_interest_over_time(
+                [keyword],
+                date_index=date_index,
+                timeframe=window_timeframe(window),
+                base_url=base_url,
+            )
+            break
+        except Exception as e:
+            if attempt == max_retries - 1:
+                raise
+            metrics.RETRIES.inc(endpoint="trends_iot")
+            logging.warning(f"{keyword} {window_timeframe(window)} failed with {e}")
+            time.sleep(2**attempt)
+
+    if complete:
+        cache.set(key, df)
+
+    return df
+
+
+def fetch_windows(keywords, windows, base_url=None, max_workers=4, limiter=None):
+    """Fetch all keyword x window pairs concurrently
+
+    Returns:
+        tuple: dict (keyword, window) -> dataframe, list of failed (keyword, window)
+    """
+    results, failed = {}, []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_window, kw, window, base_url, limiter): (kw, window)
+            for kw in keywords
+            for window in windows
+        }
+        for future in as_completed(futures):
+            kw, window = futures[future]
+            try:
+                results[(kw, window)] = future.result()
+            except Exception as e:
+                logging.error(f"Window {window_timeframe(window)} of {kw} failed: {e}")
+                failed.append((kw, window))
+
+    return results, failed
+
+
+# ----------------------------------------
+# -- Stitch
+# ----------------------------------------
+
+
+def window_array(results, keywords, windows):
+    """(keyword, window, day) array of fetched values, NaN outside each window
+
+    Returns:
+        tuple: array, daily DatetimeIndex from first window start to last window end
+    """
+    days = pd.date_range(windows[0][0], windows[-1][1], freq="D", name="date")
+    values = np.full((len(keywords), len(windows), len(days)), np.nan)
+
+    for k, kw in enumerate(keywords):
+        for w, window in enumerate(windows):
+            df = results.get((kw, window))
+            if df is None or df.empty:
+                continue
+            pos = days.get_indexer(pd.to_datetime(df["date"]).dt.normalize())
+            ok = pos >= 0
+            values[k, w, pos[ok]] = df["search_interest"].to_numpy(dtype=float)[ok]
+
+    return values, days
+
+
+def chain_factors(values, keywords=None):
+    """Scale factor of every window relative to the first, for all keywords at once
+
+    The factor between consecutive windows is sum(previous overlap) / sum(current overlap).
+    Overlaps without interest in either window carry the previous scale forward, a zero
+    ratio would zero all later windows of the keyword.
+
+    Args:
+        values (np.ndarray): (keyword, window, day)
+        keywords (list): keyword per row of values, only used for logging
+
+    Returns:
+        np.ndarray: (keyword, window) cumulative factors
+    """
+    valid = ~np.isnan(values)
+    both = valid[:, 1:] & valid[:, :-1]
+    prev_sum = np.where(both, values[:, :-1], 0).sum(axis=-1)
+    curr_sum = np.where(both, values[:, 1:], 0).sum(axis=-1)
+
+    usable = (prev_sum > 0) & (curr_sum > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where(usable, prev_sum / curr_sum, 1.0)
+
+    # gaps are expected for rare keywords, where both sides are zero
+    gaps = ~usable & ((prev_sum > 0) | (curr_sum > 0))
+    for k, w in zip(*np.nonzero(gaps)):
+        name = keywords[k] if keywords is not None else k
+        logging.info(
+            f"{name}: no interest on one side of the overlap of windows {w} and {w + 1}, "
+            "keep the previous scale"
+        )
+
+    return np.concatenate(
+        [np.ones((values.shape[0], 1)), np.cumprod(ratio, axis=1)], axis=1
+    )
+
+
+def stitch_windows(results, keywords, windows):
+    """One consistent daily series per keyword, rescaled to 0-100
+
+    Returns:
+        Dataframe: date, keyword, search_interest
+    """
+    values, days = window_array(results, keywords, windows)
+    scaled = values * chain_factors(values, keywords)[:, :, None]
+
+    # overlapping days: average of the rescaled windows
+    with np.errstate(invalid="ignore"):
+        counts = (~np.isnan(scaled)).sum(axis=1)
+        series = np.where(counts > 0, np.nansum(scaled, axis=1) / counts, np.nan)
+        peak = np.nanmax(np.where(np.isnan(series), -np.inf, series), axis=1)
+        series = np.where(peak[:, None] > 0, series / peak[:, None] * 100, series)
+
+    return pd.DataFrame(
+        {
+            "date": np.tile(days.values, len(keywords)),
+            "keyword": np.repeat(list(keywords), len(days)),
+            "search_interest": series.ravel().round(2),
+        }
+    ).dropna(subset=["search_interest"])
+
+
+def stitch_daily_history(
+    keywords,
+    start,
+    end=None,
+    base_url=None,
+    max_workers=4,
+    limiter=None,
+    window_days=MAX_DAILY_DAYS,
+    overlap_days=60,
+):
+    """Daily search interest per keyword from start to end
+
+    Each keyword is queried on its own, so its values do not depend on other keywords
+    of the batch. Set a DiskCache for "trends_windows" to reuse windows across runs:
+    cache.set_cache_backend(DiskCache("data/interim/trends_windows"), name="trends_windows")
+
+    Args:
+        keywords (list): search terms
+        start (str): first day 'YYYY-MM-DD'
+        end (str): last day, defaults to today
+        base_url (str): alternative Trends host, see create_pytrends_session()
+        max_workers (int): concurrent requests, throttled by the rate limiter
+        limiter (RateLimiter): defaults to rate_limit.get_rate_limiter("trends")
+        window_days (int): days per window, at most 269 for daily data
+        overlap_days (int): days shared by consecutive windows
+
+    Returns:
+        Dataframe: date, keyword, search_interest. Keywords with failed windows are omitted.
+    """
+    keywords = list(dict.fromkeys(keywords))
+    windows = plan_windows(start, end or date.today(), window_days, overlap_days)
+    logging.info(
+        f"Stitch {len(keywords)} keywords from {len(windows)} windows "
+        f"({len(keywords) * len(windows)} requests at most)"
+    )
+
+    results, failed = fetch_windows(
+        keywords, windows, base_url=base_url, max_workers=max_workers, limiter=limiter
+    )
+    incomplete = sorted({kw for kw, _ in failed})
+    if incomplete:
+        logging.warning(f"Skip keywords with failed windows: {incomplete}")
+    keywords = [kw for kw in keywords if kw not in incomplete]
+    if not keywords:
+        return pd.DataFrame(columns=["date", "keyword", "search_interest"])
+
+    df = stitch_windows(results, keywords, windows)
+    metrics.record_batch("trends_stitch")
+
+    return df
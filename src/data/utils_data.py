@@ -1,35 +1,70 @@
 """
 UTILITY FUNCTIONS
 
-load_data: Load dataframe from filepath
+load_data: Load dataframe from filepath, cached in the backend of cache.py
+drop_superseded: keep the latest row per keyword and date of search interest
 list_remove_duplicates: drop duplicate elements from list
 list_flatten: flatten nested list
 n_batch: generator for n-sized list batches
 list_batch: get n-sized chunks from n_batch generator
 df_to_csv: write csv either create new or append to existing
 timestamp_now: get string
+df_fingerprint: content hash of a dataframe
 sleep_countdown(): countdown in console
+wrap_logging_transform_df: profile df transformations, see profiling.py
 
 """
 
+from __future__ import annotations
+
+import hashlib
 import os
 import sys
 import time
-import pandas as pd
 from datetime import datetime
-import streamlit as st
 from functools import wraps
 import logging
+from .cache import cached
+from .lazy_imports import lazy_import
+from .profiling import profile_call
+
+pd = lazy_import("pandas")
 
 # ----------------------------------------
 # -- Plot data
 # ----------------------------------------
 
 
-@st.cache(allow_output_mutation=True)
+def _load_data_key(filepath, parse_dates=False):
+    """Cache key that changes when the file changes"""
+    stat = os.stat(filepath)
+    if isinstance(parse_dates, list):
+        parse_dates = tuple(parse_dates)
+    return ("load_data", str(filepath), stat.st_mtime_ns, stat.st_size, parse_dates)
+
+
+@cached("load_data", key=_load_data_key)
 def load_data(filepath, parse_dates=False):
-    """Load data from filepath. parse_dates takes list of date columns to convert to datetime"""
-    return pd.read_csv(filepath, parse_dates=parse_dates)
+    """Load data from filepath. parse_dates takes list of date columns to convert to datetime
+
+    Results are cached, inject another backend with cache.set_cache_backend(backend, name="load_data").
+    The cached dataframe is shared, copy it before mutating in place.
+    Search interest keeps the latest row per keyword and date, see drop_superseded().
+    """
+    return drop_superseded(pd.read_csv(filepath, parse_dates=parse_dates))
+
+
+def drop_superseded(df):
+    """Search interest without rows superseded by a later row of the same keyword and date
+
+    An incremental refresh appends the rescaled partial period after its stored row,
+    the later row wins. geo and cat are part of the key if present. Frames that are not
+    search interest are returned as they are.
+    """
+    if not {"date", "keyword", "search_interest"} <= set(df.columns):
+        return df
+    key = [c for c in ("keyword", "date", "geo", "cat") if c in df.columns]
+    return df.drop_duplicates(key, keep="last")
 
 
 def group_search_interest_on_time_unit(df, unit="M"):
@@ -106,6 +141,14 @@ def df_to_csv(df, filepath):
         df.to_csv(f"{filepath}", index=False, header=False, mode="a")
 
 
+def df_fingerprint(df, index=True):
+    """Hex digest that changes whenever values, columns or (optionally) the index of df change"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(list(df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=index).values.tobytes())
+    return digest.hexdigest()
+
+
 def timestamp_now():
     """Return UTC timestamp string in format: yyyy/mm/dd-hh/mm/ss"""
     return datetime.utcnow().strftime("%y%m%d-%H%M%S")
@@ -128,34 +171,29 @@ def sleep_countdown(duration, print_step=2):
 
 
 def wrap_logging_transform_df(func):
-    """Wrapper to compare df before and after transformation"""
+    """Wrapper to profile a df transformation and compare df before and after
+
+    Runs func exactly once. Wall time, CPU time, peak memory, rows and bytes in/out
+    go to the metrics sinks of profiling.py; the row difference is logged as before.
+    """
 
     @wraps(func)
     def with_logging(*args, **kwargs):
+        df_edit = profile_call(func, args, kwargs)
 
-        try:
-            df_orig: pd.DataFrame = args[0]
-            df_edit: pd.DataFrame = func(*args, **kwargs)
-
-            # df_edit and df_orig should be dataframe
-            if not isinstance(df_orig, pd.DataFrame):
-                raise TypeError(
-                    f"{func.__name__} args[0] is not a dataframe, but type: {type(args[0])}). Skip logging."
-                )
-
-            if not isinstance(df_edit, pd.DataFrame):
-                raise TypeError(
-                    f"{func.__name__} did not return dataframe, but type: {type(df_edit)}. Skip logging."
-                )
-
-            else:
+        df_orig = args[0] if args else None
+        if isinstance(df_orig, pd.DataFrame) and isinstance(df_edit, pd.DataFrame):
+            # logging must never break the transform
+            try:
                 logging_transform_df(df_orig, df_edit, func.__name__)
-                return df_edit
-
-        except Exception as e:
-            logging.error(f"{func.__name__} - wrap_logging_transform_df(): {e}")
+            except Exception as e:
+                logging.error(f"{func.__name__} - wrap_logging_transform_df(): {e}")
+        else:
+            logging.debug(
+                f"{func.__name__} did not transform dataframe to dataframe. Skip row logging."
+            )
 
-        return func(*args, **kwargs)
+        return df_edit
 
     return with_logging
 
@@ -166,7 +204,7 @@ def logging_transform_df(
     "Logging utility to show row difference between two dataframes"
     N_orig, N_edit = len(df_orig), len(df_edit)
     N_diff = N_orig - N_edit
-    pct_diff = N_diff / N_orig * 100
+    pct_diff = N_diff / N_orig * 100 if N_orig else 0.0
 
     # sign for added or removed rows
     if N_diff > 0:
@@ -185,14 +223,17 @@ def logging_transform_df(
 
 @wrap_logging_transform_df
 def drop_missings_duplicates(df: pd.DataFrame) -> pd.DataFrame:
-    "Return df without missings and duplicates"
+    """Return df without missings, superseded rows and duplicates
+
+    Deduplicates the whole frame, to append only new rows to a file see dedup.HashIndex
+    """
     df_nomiss = df.dropna()
-    df_nodup = df_nomiss.drop_duplicates()
+    df_nodup = drop_superseded(df_nomiss).drop_duplicates()
 
     return df_nodup.reset_index(drop=True)
 
 
 def get_raw_data(filepath) -> pd.DataFrame:
-    "Return data without preprocessing"
+    "Return data without preprocessing but superseded rows, see drop_superseded()"
     logging.info(f"Reading file: {filepath}")
-    return pd.read_csv(filepath, parse_dates=["date"])
+    return drop_superseded(pd.read_csv(filepath, parse_dates=["date"]))
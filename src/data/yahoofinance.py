@@ -1,12 +1,14 @@
 """
 Retrieve firm-level esg scores, process firm names and construct query strings
 """
-from yahooquery import Ticker
-from pytickersymbols import PyTickerSymbols
 import logging
-import numpy as np
-import pandas as pd
-import yaml
+from .lazy_imports import lazy_import
+from . import constituents, esg_history, metrics, storage
+
+pd = lazy_import("pandas")
+yaml = lazy_import("yaml")
+yahooquery = lazy_import("yahooquery")
+pytickersymbols_module = lazy_import("pytickersymbols")
 
 
 # ---------------------------------------------------
@@ -25,28 +27,12 @@ def get_index_stock_details(pytickersymbols, index_name):
 
     Returns:
         Dataframe:
-    """
-    index_details = pd.DataFrame(pytickersymbols.get_stocks_by_index(index_name))
 
-    # string encoding
-    try:
-        index_details.name = index_details.name.str.encode("latin-1").str.decode(
-            "utf-8"
-        )
-    except Exception:
-        logging.warning(f"Encoding error for {index_name}")
-        index_details.name = index_details.name.str.encode("utf-8").str.decode("utf-8")
-
-    # retrieve yahoo ticker symbol
-    index_details["yahoo_ticker"] = index_details.symbols.apply(
-        lambda x: x[0]["yahoo"] if len(x) > 1 else np.nan
+    Rebuilds the details on every call, constituents.load_index_details() keeps snapshots.
+    """
+    return constituents.index_details_from_stocks(
+        pytickersymbols.get_stocks_by_index(index_name), index_name
     )
-    index_details.yahoo_ticker.fillna(index_details.symbol, inplace=True)
-
-    # set ticker as index
-    index_details.set_index("yahoo_ticker", inplace=True, drop=False)
-
-    return index_details
 
 
 # ---------------------------------------------------
@@ -61,17 +47,26 @@ def get_esg_details(yahoo_ticker):
     if isinstance(yahoo_ticker, pd.Series):
         yahoo_ticker = yahoo_ticker.to_list()
 
-    ticker_details = Ticker(yahoo_ticker)
-    esg_df = pd.DataFrame(ticker_details.esg_scores).T
+    with metrics.track_request("yahoo_esg"):
+        ticker_details = yahooquery.Ticker(yahoo_ticker)
+        esg_df = pd.DataFrame(ticker_details.esg_scores).T
 
     return esg_df
 
 
-def get_index_firm_esg(pytickersymbols, index_name):
-    """Merge index, firm name and esg data"""
-    index_stocks = get_index_stock_details(
-        pytickersymbols=pytickersymbols, index_name=index_name
-    )
+def get_index_firm_esg(pytickersymbols, index_name, snapshot_dir=None):
+    """Merge index, firm name and esg data
+
+    With snapshot_dir, constituents come from the snapshots of constituents.py.
+    """
+    if snapshot_dir is not None:
+        index_stocks = constituents.load_index_details(
+            index_name, pytickersymbols=pytickersymbols, snapshot_dir=snapshot_dir
+        )
+    else:
+        index_stocks = get_index_stock_details(
+            pytickersymbols=pytickersymbols, index_name=index_name
+        )
     esg_details = get_esg_details(yahoo_ticker=index_stocks.yahoo_ticker)
 
     stocks_esg = pd.concat([index_stocks, esg_details], axis=1)
@@ -141,24 +136,70 @@ def create_query_keywords(esg_df, keyword_list, explode=True):
         return esg_df
 
 
-def esg_firm_query_keywords_pipeline(index_name, path_to_settings):
+def label_query_keywords(query_keywords, controversy_keywords):
+    """Split query keywords into firm name and controversy term
+
+    Matches the longest controversy keyword at the end of each query keyword,
+    the inverse of create_query_keywords(). A term has to follow a space or be the
+    whole keyword, so 'tax' does not match 'syntax'. Unmatched keywords keep an
+    empty term.
+
+    Args:
+        query_keywords (list): query keywords like 'adidas pollution'
+        controversy_keywords (list): terms from get_esg_controversy_keywords()
+
+    Returns:
+        Dataframe: one row per unique query_keyword with firm_name and term
+    """
+    keywords = pd.Series(pd.unique(pd.Series(query_keywords, dtype="object")))
+    firm_name = keywords.copy()
+    term = pd.Series("", index=keywords.index, dtype="object")
+
+    for kw in sorted(set(controversy_keywords), key=len, reverse=True):
+        match = (term == "") & (keywords.str.endswith(f" {kw}") | (keywords == kw))
+        term[match] = kw
+        firm_name[match] = keywords[match].str[: -len(kw)].str.strip()
+
+    return pd.DataFrame(
+        {"query_keyword": keywords, "firm_name": firm_name, "term": term}
+    )
+
+
+def esg_firm_query_keywords_pipeline(
+    index_name,
+    path_to_settings,
+    snapshot_dir=None,
+    history_path=None,
+    storage_path=None,
+):
     """ESG scores, processed firm names and firm name query strings in a dataframe.
 
     Args:
         index_name (string): Index name, one of PyTickerSymbols().get_all_indices()
         path_to_settings (string): path to settings.yaml, where all esg keywords are specified
+        snapshot_dir (string): constituent snapshots like constituents.SNAPSHOT_DIR,
+            None rebuilds the constituents from pytickersymbols
+        history_path (string): SQLite database to record changed scores in, see esg_history.py
+        storage_path (string): SQLite database to upsert today's scores into, see storage.py
 
     Returns:
         Dataframe: esg scores and related data from Yahoo!Finance incl. processed firm names and query keywords
 
     """
-    pytickersymbols = PyTickerSymbols()
+    pytickersymbols = pytickersymbols_module.PyTickerSymbols()
     controversy_keywords = get_esg_controversy_keywords(path_to_settings)
     esg_df = (
-        get_index_firm_esg(pytickersymbols=pytickersymbols, index_name=index_name)
+        get_index_firm_esg(
+            pytickersymbols=pytickersymbols,
+            index_name=index_name,
+            snapshot_dir=snapshot_dir,
+        )
         .pipe(replace_firm_names, settings_path=path_to_settings)
         .pipe(remove_missing_esg_firms)
-        .pipe(create_query_keywords, keyword_list=controversy_keywords)
     )
+    if history_path is not None:
+        esg_history.record_snapshot(esg_df, db_path=history_path)
+    if storage_path is not None:
+        storage.upsert_esg_scores(esg_df, db_path=storage_path)
 
-    return esg_df
+    return create_query_keywords(esg_df, keyword_list=controversy_keywords)
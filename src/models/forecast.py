@@ -0,0 +1,227 @@
+"""
+Per-keyword search interest forecasts with prophet
+
+Fits one prophet model per keyword in a process pool. Fitted models are stored as
+prophet JSON next to their forecasts, a manifest keeps the data fingerprint per keyword,
+so a rerun only refits keywords whose series changed. All-zero series, common after
+the zero fill in process_interest_over_time(), are not fitted.
+
+Example usage:
+
+    forecasts, summary = forecast_keywords(df, model_dir="models/dax", periods=12, max_workers=4)
+
+    python -m src.models.forecast data/raw/dax_search_interest.csv --model-dir models/dax
+"""
+
+import logging
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from ..data.manifest import (
+    is_current,
+    load_manifest,
+    run_in_processes,
+    unique_slug,
+    write_manifest,
+)
+from ..data.utils_data import df_fingerprint
+
+logger = logging.getLogger(__name__)
+
+FORECAST_COLUMNS = ["keyword", "ds", "yhat", "yhat_lower", "yhat_upper"]
+
+
+def model_slug(keyword):
+    """File name of a keyword, with a hash so that similar keywords never collide"""
+    return unique_slug(keyword)
+
+
+def load_model(model_dir, keyword):
+    """Fitted prophet model of keyword from model_dir"""
+    from prophet.serialize import model_from_json
+
+    with open(os.path.join(model_dir, f"{model_slug(keyword)}.json")) as file:
+        return model_from_json(file.read())
+
+
+def fit_keyword(keyword, df_keyword, model_dir, periods, freq, prophet_kwargs):
+    """Fit, store and forecast the model of one keyword. Runs in a worker process.
+
+    Returns:
+        dict: keyword, written files and error message if any
+    """
+    # prophet pulls in cmdstanpy, import it in the worker only
+    from prophet import Prophet
+    from prophet.serialize import model_to_json
+
+    for name in ("prophet", "cmdstanpy"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    try:
+        model = Prophet(**prophet_kwargs)
+        model.fit(
+            df_keyword.rename(columns={"date": "ds", "search_interest": "y"})[
+                ["ds", "y"]
+            ]
+        )
+        future = model.make_future_dataframe(
+            periods=periods, freq=freq, include_history=False
+        )
+        forecast = model.predict(future)[["ds", "yhat", "yhat_lower", "yhat_upper"]]
+    except Exception as e:
+        return {"keyword": keyword, "files": [], "error": str(e)}
+
+    base = os.path.join(model_dir, model_slug(keyword))
+    with open(f"{base}.json", "w") as file:
+        file.write(model_to_json(model))
+    forecast.assign(keyword=keyword)[FORECAST_COLUMNS].to_csv(
+        f"{base}_forecast.csv", index=False
+    )
+
+    return {
+        "keyword": keyword,
+        "files": [
+            f"{os.path.basename(base)}.json",
+            f"{os.path.basename(base)}_forecast.csv",
+        ],
+        "error": "",
+    }
+
+
+def forecast_keywords(
+    df,
+    model_dir,
+    periods=12,
+    freq=None,
+    max_workers=None,
+    force=False,
+    prophet_kwargs=None,
+):
+    """Forecast each keyword's search interest, refitting only keywords with changed data
+
+    Args:
+        df (pd.DataFrame): long search interest data (date, keyword, search_interest)
+        model_dir (str): directory for fitted models, forecasts and manifest.json
+        periods (int): dates to forecast
+        freq (str): pandas frequency of the dates, inferred if None
+        max_workers (int): processes, defaults to number of CPUs
+        force (bool): refit all keywords
+        prophet_kwargs (dict): arguments of Prophet(), part of the cache key
+
+    Returns:
+        tuple: forecasts (keyword, ds, yhat, yhat_lower, yhat_upper),
+            summary with one row per keyword and status fitted, cached, skipped or failed
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    manifest = load_manifest(model_dir)
+    prophet_kwargs = prophet_kwargs or {}
+
+    if freq is None:
+        dates = pd.DatetimeIndex(
+            pd.to_datetime(df["date"]).drop_duplicates().sort_values()
+        )
+        freq = pd.infer_freq(dates) if len(dates) >= 3 else None
+        freq = freq or "W"
+    options = {"periods": periods, "freq": freq, "prophet_kwargs": prophet_kwargs}
+
+    jobs, results = {}, []
+    for keyword, df_keyword in df.groupby("keyword", sort=True):
+        df_keyword = df_keyword[["date", "search_interest"]].sort_values("date")
+        df_keyword = df_keyword.dropna().reset_index(drop=True)
+
+        if len(df_keyword) < 2 or (df_keyword.search_interest == 0).all():
+            results.append(
+                {"keyword": keyword, "status": "skipped", "files": [], "error": ""}
+            )
+            continue
+
+        fingerprint = df_fingerprint(df_keyword, index=False)
+        entry = manifest.get(keyword)
+        unchanged = is_current(entry, fingerprint, options, model_dir)
+        if unchanged and not force:
+            results.append(
+                {
+                    "keyword": keyword,
+                    "status": "cached",
+                    "files": entry["files"],
+                    "error": "",
+                }
+            )
+            continue
+        jobs[keyword] = (fingerprint, df_keyword)
+
+    logger.info(
+        f"Fit {len(jobs)} keyword models, reuse or skip {len(results)} keywords"
+    )
+
+    if jobs:
+        args = {
+            keyword: (keyword, df_keyword, model_dir, periods, freq, prophet_kwargs)
+            for keyword, (_, df_keyword) in jobs.items()
+        }
+        for keyword, result, error in run_in_processes(fit_keyword, args, max_workers):
+            result = result or {"keyword": keyword, "files": [], "error": error}
+            if result["files"]:
+                manifest[keyword] = {
+                    "fingerprint": jobs[keyword][0],
+                    "options": options,
+                    "files": result["files"],
+                    "fitted_at": datetime.utcnow().isoformat(timespec="seconds"),
+                }
+            if result["error"]:
+                logger.warning(f"{keyword}: {result['error']}")
+            result["status"] = "fitted" if result["files"] else "failed"
+            results.append(result)
+
+        write_manifest(manifest, model_dir)
+
+    summary = pd.DataFrame(results).sort_values("keyword").reset_index(drop=True)
+
+    forecast_files = [
+        os.path.join(model_dir, f)
+        for files in summary.files
+        for f in files
+        if f.endswith("_forecast.csv")
+    ]
+    forecasts = (
+        pd.concat(
+            [pd.read_csv(f, parse_dates=["ds"]) for f in forecast_files],
+            ignore_index=True,
+        )
+        if forecast_files
+        else pd.DataFrame(columns=FORECAST_COLUMNS)
+    )
+
+    return forecasts, summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Forecast search interest per keyword")
+    parser.add_argument("csv", nargs="+", help="long search interest CSVs")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--periods", type=int, default=12)
+    parser.add_argument("--freq", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument("--out", default=None, help="CSV for all forecasts")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    df = pd.concat(
+        [pd.read_csv(f, parse_dates=["date"]) for f in args.csv], ignore_index=True
+    )
+    forecasts, summary = forecast_keywords(
+        df,
+        model_dir=args.model_dir,
+        periods=args.periods,
+        freq=args.freq,
+        max_workers=args.workers,
+        force=args.force,
+    )
+    print(summary.status.value_counts().to_string())
+    if args.out:
+        forecasts.to_csv(args.out, index=False)
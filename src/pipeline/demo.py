@@ -1,18 +1,23 @@
 import datetime
+import mmap
+import os
 from pathlib import Path
-from typing import Optional, Union, List
+from typing import Iterator, Optional, Tuple, Union, List
 import logging
 
 import imageio
-from io import BytesIO
 
 import prefect
-from prefect import task, Parameter, Flow
+from prefect import task, Parameter, Flow, unmapped
 from prefect.engine.signals import SKIP
 from prefect.tasks.shell import ShellTask
 from prefect.executors import LocalDaskExecutor
 
 Runable = Optional[Union[str, List[str]]]
+Span = Tuple[int, int]
+
+FRAME_BOUNDARY = b"\n" * 4
+FRAMES_DIR = Path("src/pipeline/temp/frames")
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -39,50 +44,76 @@ download: Runable = ShellTask(
 )
 
 
+def iter_frame_spans(buffer, boundary: bytes = FRAME_BOUNDARY) -> Iterator[Span]:
+    """
+    Scans `buffer` for `boundary` and yields the (start, end) offsets
+    of the non-empty frames in between, same frames as
+    `bytes.split(boundary)` without copying.
+    """
+    start = 0
+    while True:
+        end = buffer.find(boundary, start)
+        stop = len(buffer) if end == -1 else end
+        if stop > start:
+            yield start, stop
+        if end == -1:
+            return
+        start = end + len(boundary)
+
+
 @task(skip_on_upstream_skip=False)
-def load_and_split(fname: str) -> list:
+def load_and_split(fname: str) -> List[Span]:
     """
-    Loads image data file at `fname` and splits it into
-    multiple frames.  Returns a list of bytes, one element
-    for each frame.
+    Memory-maps image data file at `fname` and scans it for frame
+    boundaries.  Returns a list of (start, end) byte offsets, one
+    element for each frame, so the frames stay on disk until written.
     """
     prefect.context.get("logger")
-    with open(fname, "rb") as f:
-        imgs = f.read()
-
-    return [img for img in imgs.split(b"\n" * 4) if img]
+    # an empty file cannot be memory-mapped
+    if os.path.getsize(fname) == 0:
+        return []
+    with open(fname, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mm:
+        return list(iter_frame_spans(mm))
 
 
 @task
-def write_to_disk(image: bytes) -> bytes:
+def write_to_disk(fname: str, span: Span) -> Path:
     """
-    Given a single image represented as bytes, writes the image
-    to the present working directory with a filename determined
-    by `map_index`.  Returns the image bytes.
+    Given the byte offsets of a single image in `fname`, writes the
+    image to the frames directory with a filename determined by
+    `map_index`.  The slice of the mapped file is written without copying.
+    Returns the frame path.
     """
     prefect.context.get("logger")
     frame_no = prefect.context.get("map_index")
-    Path("src/pipeline/temp/frames").touch()
     # make sure the path exists, as prefect does not populate path for you
-    frame_path = Path("src/pipeline/temp/frames/frame_{0:0=2d}.gif".format(frame_no))
-    with open(frame_path, "wb") as f:
-        f.write(image)
-    return image
+    FRAMES_DIR.mkdir(parents=True, exist_ok=True)
+    frame_path = FRAMES_DIR / "frame_{0:0=2d}.gif".format(frame_no)
+    start, end = span
+    with open(fname, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mm:
+        with memoryview(mm) as view, open(frame_path, "wb") as out:
+            out.write(view[start:end])
+    return frame_path
 
 
 @task
-def combine_to_gif(image_bytes: list, gif_file: Path) -> None:
+def combine_to_gif(frame_paths: List[Path], gif_file: Path) -> None:
     """
-    Given a list of ordered images represented as bytes,
-    combines them into a single GIF stored in the present working directory.
+    Given a list of ordered image files, appends them one by one to a
+    single GIF, so only one decoded frame is held in memory at a time.
     """
     prefect.context.get("logger")
-    images = [imageio.imread(BytesIO(image)) for image in image_bytes]
-    imageio.mimsave(gif_file, images)
+    with imageio.get_writer(gif_file, mode="I") as writer:
+        for frame_path in frame_paths:
+            writer.append_data(imageio.imread(frame_path))
 
 
 with Flow("Image ETL") as flow:
-    Path("src/pipeline/temp").touch()
+    Path("src/pipeline/temp").mkdir(parents=True, exist_ok=True)
     image_path = Path("src/pipeline/temp/image-data.img")
     gif_path = Path("src/pipeline/temp/comb.gif")
 
@@ -101,7 +132,7 @@ with Flow("Image ETL") as flow:
     images = load_and_split(fname=DATA_FILE, upstream_tasks=[curl])
 
     # Load
-    frames = write_to_disk.map(images)
+    frames = write_to_disk.map(unmapped(DATA_FILE), images)
     combine_to_gif(frames, gif_path)
 
 if __name__ == "__main__":
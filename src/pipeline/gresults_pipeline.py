@@ -1,3 +1,4 @@
+from concurrent.futures import ProcessPoolExecutor
 from typing import Tuple, Any, List
 import requests
 import pandas as pd
@@ -11,6 +12,8 @@ from bs4 import BeautifulSoup
 
 
 SETTINGS = "settings.yaml"
+# pages below which parse_results_counts() parses without a process pool
+PARSE_INLINE_BELOW = 32
 
 
 def prefect_logger():
@@ -47,19 +50,28 @@ def create_search_url(base_url, keyword_list):
 
 
 @task
-def get_results_count(user_agent, query) -> int:
-    """Gets Google's result count for a keyword
+def fetch_results_page(user_agent, query) -> bytes:
+    """Gets the raw Google search page of a query, network only
+
+    Mapped over the queries and run by the threads of LocalDaskExecutor. Parsing is
+    left to parse_results_counts(), so the GIL-bound soup does not serialize the fetches.
 
     Args:
-        keyword (string): The keyword for which to get the results count
         user_agent (string): For example {"User-Agent": "Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like
             Gecko) Chrome/80.0.3987.149 Safari/537.36"}
+        query (string): Google search URL
 
     Returns:
-        int: Results count
+        bytes: HTML of the search page
     """
     result = requests.get(query, headers=user_agent)
-    soup = BeautifulSoup(result.content, "html.parser")
+    result.raise_for_status()
+    return result.content
+
+
+def parse_results_count(content) -> int:
+    """Results count in the HTML of a search page, module level to run in processes"""
+    soup = BeautifulSoup(content, "html.parser")
 
     #  string that contains results count 'About 1,410,000,000 results'
     total_results_text = soup.find("div", {"id": "result-stats"}).find(
@@ -67,8 +79,27 @@ def get_results_count(user_agent, query) -> int:
     )
 
     # extract number
-    results_num = int("".join([num for num in total_results_text if num.isdigit()]))
-    return results_num
+    return int("".join([num for num in total_results_text if num.isdigit()]))
+
+
+@task
+def parse_results_counts(pages, max_workers=None) -> List[int]:
+    """Parses the fetched pages in a process pool, scales with cores
+
+    Fewer than PARSE_INLINE_BELOW pages are parsed in the task's thread, starting the
+    pool costs more than parsing them.
+
+    Args:
+        pages (list): output of the mapped fetch_results_page()
+        max_workers (int): parsing processes, defaults to the number of cores
+
+    Returns:
+        list: Results count per page in order
+    """
+    if len(pages) < PARSE_INLINE_BELOW:
+        return [parse_results_count(page) for page in pages]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(parse_results_count, pages, chunksize=4))
 
 
 @task
@@ -132,9 +163,10 @@ with Flow("gresults") as flow:
     user_agent, base_url, keyword_list = load_settings(SETTINGS)
     search_urls = create_search_url(base_url, keyword_list)
     prefect_logger().info(f"created search_urls as {search_urls}")
-    search_counts = apply_map(
-        get_results_count, user_agent=unmapped(user_agent), query=search_urls
+    pages = apply_map(
+        fetch_results_page, user_agent=unmapped(user_agent), query=search_urls
     )
+    search_counts = parse_results_counts(pages)
     results_df = get_results_df(base_url, keyword_list, search_urls, search_counts)
     assert_google_results(results_df, keyword_list, search_urls)
     print_result(results_df)
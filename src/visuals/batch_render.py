@@ -0,0 +1,211 @@
+"""
+Batch rendering of one search-interest chart per firm
+
+Splits long search interest data (date, keyword, search_interest) by firm, builds
+the figures in a process pool with the tsf template and writes HTML and static images
+to disk. A manifest keeps the data fingerprint per firm, so unchanged firms are skipped
+on the next run.
+
+Static images need kaleido. Without it, only HTML is written and the manifest only
+expects the HTML files, so unchanged firms are still skipped.
+
+Example usage:
+
+    python -m src.visuals.batch_render data/raw/dax_search_interest.csv --out-dir reports/figures/dax
+"""
+
+import importlib.util
+import logging
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from ..data.manifest import (
+    is_current,
+    load_manifest,
+    run_in_processes,
+    unique_slug,
+    write_manifest,
+)
+from ..data.utils_data import df_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def writable_formats(formats):
+    """Formats that can be written here, static images only with kaleido installed"""
+    if importlib.util.find_spec("kaleido") is not None:
+        return list(formats)
+    return [fmt for fmt in formats if fmt == "html"]
+
+
+def render_firm(firm_name, df_firm, out_dir, formats, colorscale, width_px):
+    """Build and write the chart of one firm. Runs in a worker process.
+
+    Returns:
+        dict: firm_name, written files and error message if any
+    """
+    from . import downsample, figures
+
+    figures.register_template(colorscale, template_name="tsf")
+
+    # legend shows the controversy term, the firm is in the title
+    df_plot = df_firm.assign(
+        keyword=df_firm.term.where(df_firm.term != "", df_firm.keyword)
+    )
+    df_plot = downsample.downsample_long(
+        df_plot[["date", "keyword", "search_interest"]],
+        n_out=downsample.points_for_width(width_px),
+    )
+    fig = figures.search_interest_figure(
+        df_plot, template_name="tsf", title=f"{firm_name}: controversy search interest"
+    )
+
+    files, errors = [], []
+    base = os.path.join(out_dir, unique_slug(firm_name))
+    for fmt in formats:
+        path = f"{base}.{fmt}"
+        try:
+            if fmt == "html":
+                fig.write_html(path, include_plotlyjs="cdn")
+            else:
+                fig.write_image(path, width=width_px, height=int(width_px * 0.6))
+            files.append(os.path.basename(path))
+        except (ValueError, ImportError, RuntimeError) as e:
+            errors.append(f"{fmt}: {e}")
+
+    return {"firm_name": firm_name, "files": files, "error": "; ".join(errors)}
+
+
+def render_firm_charts(
+    df,
+    labels,
+    out_dir,
+    formats=("html", "png"),
+    max_workers=None,
+    force=False,
+    colorscale=None,
+    width_px=900,
+    settings_filepath="settings.yaml",
+):
+    """Render one chart per firm in a process pool, skipping firms with unchanged data
+
+    Args:
+        df (pd.DataFrame): long search interest data (date, keyword, search_interest)
+        labels (pd.DataFrame): query_keyword, firm_name, term, e.g. from yahoofinance.label_query_keywords()
+        out_dir (str): directory for charts and manifest.json
+        formats (tuple): any of html, png, svg, pdf
+        max_workers (int): processes, defaults to number of CPUs
+        force (bool): re-render all firms
+        colorscale (list): colors of the tsf template, defaults to the colorscale of
+            settings_filepath
+        settings_filepath (str): settings.yaml with the colorscale
+
+    Returns:
+        pd.DataFrame: one row per firm with status rendered, skipped or failed
+    """
+    if colorscale is None:
+        from . import figures
+
+        colorscale = figures.load_colorscale(settings_filepath)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+
+    df = df.merge(labels, left_on="keyword", right_on="query_keyword", how="inner")
+    if df.empty:
+        logger.warning("No keyword of df matches labels, nothing to render")
+        return pd.DataFrame(columns=["firm_name", "status", "files", "error"])
+
+    skipped_formats = sorted(set(formats) - set(writable_formats(formats)))
+    if skipped_formats:
+        logger.warning(f"kaleido not installed, skip formats {skipped_formats}")
+    formats = writable_formats(formats)
+
+    options = {
+        "formats": formats,
+        "colorscale": list(colorscale),
+        "width_px": width_px,
+    }
+    jobs, results = {}, []
+    for firm_name, df_firm in df.groupby("firm_name", sort=True):
+        df_firm = df_firm.sort_values(["keyword", "date"]).reset_index(drop=True)
+        fingerprint = df_fingerprint(
+            df_firm[["date", "keyword", "search_interest"]], index=False
+        )
+        entry = manifest.get(firm_name)
+        expected_files = [f"{unique_slug(firm_name)}.{fmt}" for fmt in formats]
+        unchanged = is_current(entry, fingerprint, options, out_dir, expected_files)
+        if unchanged and not force:
+            results.append(
+                {
+                    "firm_name": firm_name,
+                    "status": "skipped",
+                    "files": entry["files"],
+                    "error": "",
+                }
+            )
+            continue
+        jobs[firm_name] = (fingerprint, df_firm)
+
+    logger.info(f"Render {len(jobs)} firm charts, skip {len(results)} unchanged")
+
+    if jobs:
+        args = {
+            firm_name: (firm_name, df_firm, out_dir, formats, colorscale, width_px)
+            for firm_name, (_, df_firm) in jobs.items()
+        }
+        for firm_name, result, error in run_in_processes(
+            render_firm, args, max_workers
+        ):
+            result = result or {"firm_name": firm_name, "files": [], "error": error}
+            if result["files"]:
+                manifest[firm_name] = {
+                    "fingerprint": jobs[firm_name][0],
+                    "options": options,
+                    "files": result["files"],
+                    "rendered_at": datetime.utcnow().isoformat(timespec="seconds"),
+                }
+            if result["error"]:
+                logger.warning(f"{firm_name}: {result['error']}")
+            result["status"] = "rendered" if result["files"] else "failed"
+            results.append(result)
+
+        write_manifest(manifest, out_dir)
+
+    return pd.DataFrame(results).sort_values("firm_name").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ..data.yahoofinance import get_esg_controversy_keywords, label_query_keywords
+
+    parser = argparse.ArgumentParser(
+        description="Render one search interest chart per firm"
+    )
+    parser.add_argument("csv", nargs="+", help="long search interest CSVs")
+    parser.add_argument("--settings", default="settings.yaml")
+    parser.add_argument("--out-dir", default="reports/figures")
+    parser.add_argument("--formats", default="html,png")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    df = pd.concat(
+        [pd.read_csv(f, parse_dates=["date"]) for f in args.csv], ignore_index=True
+    )
+    labels = label_query_keywords(
+        df.keyword, get_esg_controversy_keywords(args.settings)
+    )
+    summary = render_firm_charts(
+        df,
+        labels,
+        out_dir=args.out_dir,
+        formats=tuple(args.formats.split(",")),
+        max_workers=args.workers,
+        force=args.force,
+        settings_filepath=args.settings,
+    )
+    print(summary.status.value_counts().to_string())
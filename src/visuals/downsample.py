@@ -0,0 +1,125 @@
+"""
+Downsample line chart data before building plotly figures
+
+Largest-Triangle-Three-Buckets (LTTB) keeps the visual shape of a series, including
+spikes, with a fraction of the points. It runs vectorized across all keywords
+that share a date grid, so dozens of traces cost about as much as one.
+
+points_for_width: number of points per trace a chart of given pixel width can show
+lttb_indices: LTTB on a matrix of series sharing one x axis
+downsample_long: LTTB on long data (date, keyword, search_interest) per keyword
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def points_for_width(width_px=700, px_per_point=2):
+    """Points per trace beyond which a chart of width_px pixels shows no more detail"""
+    return max(int(width_px / px_per_point), 3)
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of points selected by LTTB for each column of y
+
+    Args:
+        x (np.ndarray): shape (n,), increasing x values shared by all series
+        y (np.ndarray): shape (n, k), k series without missing values
+        n_out (int): points to keep per series, at least 3
+
+    Returns:
+        np.ndarray: shape (n_out, k), sorted row indices into y per series
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    if y.ndim == 1:
+        y = y[:, None]
+    n, k = y.shape
+
+    if n_out >= n or n_out < 3:
+        return np.tile(np.arange(n)[:, None], (1, k))
+
+    # bucket edges for the n - 2 inner points, first and last point are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+
+    # bucket averages from cumulative sums
+    x_cum = np.concatenate([[0.0], np.cumsum(x)])
+    y_cum = np.vstack([np.zeros((1, k)), np.cumsum(y, axis=0)])
+
+    selected = np.empty((n_out, k), dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    cols = np.arange(k)
+
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # average of the next bucket, or the last point for the final bucket
+        if i < n_out - 3:
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            count = next_end - next_start
+            x_next = (x_cum[next_end] - x_cum[next_start]) / count
+            y_next = (y_cum[next_end] - y_cum[next_start]) / count
+        else:
+            x_next, y_next = x[-1], y[-1]
+
+        prev = selected[i]
+        x_prev, y_prev = x[prev], y[prev, cols]
+
+        # triangle area between previous point, candidate and next average, per series
+        area = np.abs(
+            (x_prev - x_next) * (y[start:end] - y_prev)
+            - (x_prev - x[start:end, None]) * (y_next - y_prev)
+        )
+        selected[i + 1] = start + np.argmax(area, axis=0)
+
+    return selected
+
+
+def downsample_long(df, n_out, x="date", y="search_interest", group="keyword"):
+    """Reduce each group of long data to at most n_out points with LTTB
+
+    Groups sharing the same x values are processed together in one vectorized pass,
+    others one by one.
+
+    Args:
+        df (pd.DataFrame): long data with x, y and group columns
+        n_out (int): maximum points per group, see points_for_width()
+
+    Returns:
+        pd.DataFrame: x, group and y columns of the points selected by LTTB
+    """
+    if df.empty or df.groupby(group).size().max() <= n_out:
+        return df
+
+    wide = df.pivot_table(index=x, columns=group, values=y, aggfunc="mean").sort_index()
+    x_values = wide.index.values
+    if np.issubdtype(x_values.dtype, np.datetime64):
+        x_numeric = x_values.astype("datetime64[ns]").astype("int64").astype("float64")
+    else:
+        x_numeric = x_values.astype("float64")
+
+    complete = wide.columns[wide.notna().all().values]
+    parts = []
+
+    if len(complete):
+        idx = lttb_indices(x_numeric, wide[complete].values, n_out)
+        for j, name in enumerate(complete):
+            rows = idx[:, j]
+            parts.append(
+                pd.DataFrame(
+                    {x: x_values[rows], group: name, y: wide[name].values[rows]}
+                )
+            )
+
+    for name in wide.columns.difference(complete):
+        series = wide[name].dropna()
+        mask = wide[name].notna().values
+        idx = lttb_indices(x_numeric[mask], series.values, n_out)[:, 0]
+        parts.append(
+            pd.DataFrame(
+                {x: series.index.values[idx], group: name, y: series.values[idx]}
+            )
+        )
+
+    return pd.concat(parts, ignore_index=True)
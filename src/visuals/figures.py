@@ -0,0 +1,119 @@
+"""
+Figure building with template memoization and a figure cache
+
+register_template: register a colorscale template once per process
+load_colorscale: colorscale from settings.yaml, re-read only when the file changes
+search_interest_figure: line chart of search interest, served from cache on unchanged reruns
+
+Figures are cached as plotly JSON keyed by data fingerprint, chart options and template.
+Cache hits rebuild the figure without plotly's property validation.
+The backend is the "figures" cache of src/data/cache.py.
+"""
+
+import json
+import os
+
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from ..data.cache import cached
+from ..data.utils_data import df_fingerprint
+from . import plotly_utilities as plt_utils
+
+LOGO_URL = "https://i.ibb.co/K0cfVFs/plot-thumbnail-white.png"
+
+# template name -> colorscale it was registered with
+_registered_templates = {}
+_colorscales = {}
+
+
+def register_template(colorscale, template_name="tsf"):
+    """Register template via plotly_utilities.set_layout_template() unless already done"""
+    colorscale = tuple(colorscale)
+    if _registered_templates.get(template_name) != colorscale:
+        plt_utils.set_layout_template(list(colorscale), template_name=template_name)
+        _registered_templates[template_name] = colorscale
+    pio.templates.default = template_name
+
+
+def load_colorscale(settings_filepath):
+    """plotly_utilities.load_colorscale(), memoized on file modification time"""
+    mtime = os.stat(settings_filepath).st_mtime_ns
+    key = (os.path.abspath(settings_filepath), mtime)
+    if key not in _colorscales:
+        _colorscales[key] = plt_utils.load_colorscale(settings_filepath)
+    return list(_colorscales[key])
+
+
+def _template_key(template_name):
+    return (template_name, _registered_templates.get(template_name))
+
+
+def _figure_key(df, template_name="tsf", **options):
+    return (
+        "search_interest_figure",
+        df_fingerprint(df),
+        json.dumps(options, sort_keys=True, default=str),
+        _template_key(template_name),
+    )
+
+
+@cached("figures", key=_figure_key)
+def _search_interest_figure_json(
+    df,
+    template_name="tsf",
+    title="Google search interest",
+    line_width=5,
+    logo_url=LOGO_URL,
+    line_shape="spline",
+):
+    fig = px.line(
+        df,
+        x="date",
+        y="search_interest",
+        color="keyword",
+        line_shape=line_shape,
+        title=title,
+        labels={"date": "", "search_interest": "Search interest"},
+        template=template_name,
+    )
+
+    # logo
+    if logo_url:
+        fig.add_layout_image(
+            dict(
+                source=logo_url,
+                xref="paper",
+                yref="paper",
+                x=1,
+                y=1,
+                sizex=0.3,
+                sizey=0.3,
+                xanchor="right",
+                yanchor="bottom",
+            )
+        )
+
+    # layout tweaks
+    fig.update_traces(line=dict(width=line_width))  # thicker line
+    fig.update_layout(
+        plot_bgcolor="white", legend=dict(x=0.1, y=0.9, title="")
+    )  # white background
+
+    return fig.to_json()
+
+
+def search_interest_figure(df, template_name="tsf", **options):
+    """Line chart of long search interest data (date, keyword, search_interest)
+
+    Args:
+        df (pd.DataFrame): data to plot, e.g. after downsample.downsample_long()
+        template_name (str): template registered with register_template()
+        options: title, line_width, logo_url, line_shape
+
+    Returns:
+        go.Figure: cached figure if data, options and template are unchanged
+    """
+    fig_json = _search_interest_figure_json(df, template_name=template_name, **options)
+    return go.Figure(json.loads(fig_json), _validate=False)
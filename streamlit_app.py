@@ -13,7 +13,10 @@ from glob import glob
 
 import src.data.utils_data as data_utils
 import src.data.google_trends as gt
+import src.data.storage as storage
 import src.visuals.plotly_utilities as plt_utils
+import src.visuals.downsample as downsample
+import src.visuals.figures as figures
 
 # TODO: could insert view selection a la awesome streamlit
 # https://github.com/MarcSkovMadsen/awesome-streamlit/blob/master/app.py
@@ -27,11 +30,11 @@ st.title("Towards sustainable finance - visuals")
 # How to load data from Google trands:
 # ----------------------------------------
 keywords = ["greenwashing", "sustainable finance"]
+timeframe = "today 5-y"  # f'2019-06-01 {datetime.utcnow().strftime("%Y-%m-%d")}'
 if st.sidebar.button(
     f"Get current search interest for\n {', '.join(str(x) for x in keywords)}"
 ):
     ts = data_utils.timestamp_now()
-    timeframe = "today 5-y"  # f'2019-06-01 {datetime.utcnow().strftime("%Y-%m-%d")}'
     filepath = f"./data/raw/greenwashing_{ts}.csv"
     filepath_failed = f"./data/raw/greenwashing_FAILED_{ts}.csv"
 
@@ -40,6 +43,7 @@ if st.sidebar.button(
         filepath=filepath,
         filepath_failed=filepath_failed,
         timeframe=timeframe,
+        storage_path=storage.DEFAULT_DB_PATH,
     )
 
     st.info(f"Loaded CSV to {filepath}.")
@@ -48,54 +52,53 @@ if st.sidebar.button(
 # ----------------------------------------
 # -- load data
 # ----------------------------------------
-raw_data_csv_files = st.sidebar.selectbox(
-    "Select data",
-    options=glob("data/raw/*csv"),
-    format_func=lambda x: x.split("\\")[-1],
+db_path = storage.DEFAULT_DB_PATH
+# upserts CSVs that are new or changed since their last import, e.g. of earlier runs
+storage.import_csv("data/raw/*csv", db_path=db_path, timeframe=timeframe)
+
+# values are relative within a query, never mix timeframes in one chart
+stored_timeframes = storage.list_timeframes(db_path, geo="global")
+if not stored_timeframes:
+    st.info("No search interest stored yet, query new search interest.")
+    st.stop()
+selected_timeframe = st.sidebar.selectbox(
+    "Select timeframe",
+    options=stored_timeframes,
+    index=stored_timeframes.index(timeframe) if timeframe in stored_timeframes else 0,
 )
-df_raw = data_utils.load_data(
-    filepath=raw_data_csv_files, parse_dates=["date"]
-).set_index("date")
+stored_keywords = storage.list_keywords(
+    db_path, timeframe=selected_timeframe, geo="global"
+).set_index("keyword")
+
+selected_keywords = st.sidebar.multiselect(
+    "Select keywords",
+    options=stored_keywords.index.to_list(),
+    default=[kw for kw in keywords if kw in stored_keywords.index],
+    format_func=lambda kw: f"{kw} ({stored_keywords.min_date[kw]} to {stored_keywords.max_date[kw]})",
+)
+if not selected_keywords:
+    st.info("Select keywords or query new search interest.")
+    st.stop()
+
+df_raw = storage.load_search_interest(
+    selected_keywords, db_path=db_path, geo="global", timeframe=selected_timeframe
+)
+df_raw = df_raw[["date", "keyword", "search_interest"]].set_index("date")
 
 
 df = data_utils.group_search_interest_on_time_unit(df=df_raw)
 
+# cap points per trace at what the chart can show, LTTB keeps spikes
+chart_width_px = 700
+df = downsample.downsample_long(df, n_out=downsample.points_for_width(chart_width_px))
+
 # ----------------------------------------
 # -- Main plot
 # ----------------------------------------
-plt_utils.set_layout_template(colorscale=plt_utils.load_colorscale("settings.yaml"))
-
-fig = px.line(
-    df,
-    x="date",
-    y="search_interest",
-    color="keyword",
-    line_shape="spline",
-    title="Google search interest",
-    labels={"date": "", "search_interest": "Search interest"},
-    template="tsf",
+# template is registered once per process, unchanged figures come from cache
+figures.register_template(colorscale=figures.load_colorscale("settings.yaml"))
+fig = figures.search_interest_figure(
+    df, template_name="tsf", title="Google search interest"
 )
 
-
-# logo
-fig.add_layout_image(
-    dict(
-        source="https://i.ibb.co/K0cfVFs/plot-thumbnail-white.png",
-        xref="paper",
-        yref="paper",
-        x=1,
-        y=1,
-        sizex=0.3,
-        sizey=0.3,
-        xanchor="right",
-        yanchor="bottom",
-    )
-)
-
-# layout tweaks
-fig.update_traces(line=dict(width=5))  # thicker line
-fig.update_layout(
-    plot_bgcolor="white", legend=dict(x=0.1, y=0.9, title="")
-)  # white background
-
 st.plotly_chart(fig)
@@ -0,0 +1,65 @@
+import pandas as pd
+
+from src.data import esg_history
+
+
+def snapshot(**scores):
+    return pd.DataFrame(
+        {
+            "yahoo_ticker": list(scores),
+            "totalEsg": [s[0] for s in scores.values()],
+            "peerGroup": [s[1] for s in scores.values()],
+        }
+    )
+
+
+def test_backfill_keeps_later_dates(tmp_path):
+    db = str(tmp_path / "esg.sqlite")
+    esg_history.record_snapshot(
+        snapshot(ADS=(10.0, "Textiles"), ALV=(20.0, "Insurance")),
+        db_path=db,
+        as_of_date="2023-01-01",
+    )
+    esg_history.record_snapshot(
+        snapshot(ADS=(11.0, "Textiles"), ALV=(20.0, "Insurance")),
+        db_path=db,
+        as_of_date="2023-03-01",
+    )
+    before = esg_history.scores_as_of("2023-03-01", db_path=db)
+
+    # backfill changes both fields of ALV, which have no delta on 2023-03-01
+    esg_history.record_snapshot(
+        snapshot(ADS=(12.0, "Textiles"), ALV=(25.0, "Insurers")),
+        db_path=db,
+        as_of_date="2023-02-01",
+    )
+
+    pd.testing.assert_frame_equal(
+        esg_history.scores_as_of("2023-03-01", db_path=db), before
+    )
+    backfilled = esg_history.scores_as_of("2023-02-01", db_path=db)
+    assert backfilled.loc["ALV", "totalEsg"] == 25.0
+    assert backfilled.loc["ALV", "peerGroup"] == "Insurers"
+    assert backfilled.loc["ADS", "totalEsg"] == 12.0
+    assert (
+        esg_history.scores_as_of("2023-01-15", db_path=db).loc["ALV", "totalEsg"]
+        == 20.0
+    )
+
+
+def test_backfill_of_new_ticker_is_missing_later(tmp_path):
+    db = str(tmp_path / "esg.sqlite")
+    esg_history.record_snapshot(
+        snapshot(ADS=(10.0, "Textiles")), db_path=db, as_of_date="2023-03-01"
+    )
+    esg_history.record_snapshot(
+        snapshot(ADS=(10.0, "Textiles"), BAS=(30.0, "Chemicals")),
+        db_path=db,
+        as_of_date="2023-02-01",
+    )
+
+    assert "BAS" not in esg_history.scores_as_of("2023-03-01", db_path=db).index
+    assert (
+        esg_history.scores_as_of("2023-02-01", db_path=db).loc["BAS", "totalEsg"]
+        == 30.0
+    )
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from src.data import google_trends, streaming, utils_data
+from src.data.utils_data import df_to_csv
+
+DATES = pd.date_range("2023-01-01", periods=12, freq="W")
+
+
+@pytest.fixture
+def refreshed(tmp_path, monkeypatch):
+    """CSV with 10 stored dates, the last one partial, refreshed with 8 recent dates"""
+    filepath = str(tmp_path / "interest.csv")
+    stored = [50.0] * 9 + [20.0]
+    df_to_csv(
+        pd.DataFrame({"date": DATES[:10], "keyword": "a", "search_interest": stored}),
+        filepath=filepath,
+    )
+
+    # the recent window is on twice the scale, the partial period is complete now
+    def query(keywords, date_index=None, timeframe=None, base_url=None, **kwargs):
+        return pd.DataFrame(
+            {
+                "date": DATES[4:],
+                "keyword": "a",
+                "search_interest": [100.0] * 5 + [80.0, 120.0, 60.0],
+            }
+        )
+
+    monkeypatch.setattr(google_trends, "get_query_date_index", lambda **kw: DATES)
+    monkeypatch.setattr(google_trends, "query_interest_over_time", query)
+    google_trends.get_interest_over_time(
+        ["a"],
+        filepath,
+        str(tmp_path / "failed.csv"),
+        incremental=True,
+        storage_path=str(tmp_path / "esg.sqlite"),
+    )
+    return filepath
+
+
+def expected():
+    return [50.0] * 9 + [40.0, 60.0, 30.0]
+
+
+def test_refresh_appends_the_partial_period(refreshed):
+    assert len(pd.read_csv(refreshed)) == 13
+
+
+@pytest.mark.parametrize(
+    "read",
+    [
+        lambda path: utils_data.load_data(path, parse_dates=["date"]),
+        utils_data.get_raw_data,
+        lambda path: utils_data.drop_missings_duplicates(pd.read_csv(path)),
+        google_trends.load_stored_interest,
+    ],
+)
+def test_readers_keep_the_refreshed_row(refreshed, read):
+    df = read(refreshed)
+    assert df.date.is_unique
+    assert df.search_interest.tolist() == expected()
+
+
+def test_streaming_keeps_the_refreshed_row(refreshed):
+    df = streaming.aggregate_file(refreshed, unit="W", chunksize=5)
+    assert df.search_interest.tolist() == expected()
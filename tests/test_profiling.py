@@ -0,0 +1,76 @@
+import tracemalloc
+
+import pandas as pd
+import pytest
+
+from src.data import profiling
+from src.data.utils_data import wrap_logging_transform_df
+
+MiB = 2**20
+
+
+@pytest.fixture
+def report():
+    sinks = profiling.get_metrics_sinks()
+    report = profiling.RunReport()
+    profiling.set_metrics_sink(report, trace_memory=True)
+    yield report
+    profiling.set_metrics_sink(*sinks, trace_memory=False)
+
+
+@pytest.mark.parametrize(
+    "arg, returns",
+    [
+        (pd.DataFrame({"a": [1, 2]}), lambda df: df.head(1)),
+        # the old wrapper raised TypeError on these and called the transform again
+        (pd.DataFrame({"a": [1, 2]}), lambda df: len(df)),
+        ([1, 2], lambda values: values[:1]),
+        (pd.DataFrame(), lambda df: df),
+    ],
+)
+def test_transform_runs_once(report, arg, returns):
+    calls = []
+
+    @wrap_logging_transform_df
+    def transform(obj):
+        calls.append(obj)
+        return returns(obj)
+
+    assert transform(arg) is not None
+    assert len(calls) == 1
+    assert [p.step for p in report.profiles] == ["transform"]
+
+
+def test_failing_transform_runs_once(report):
+    calls = []
+
+    @wrap_logging_transform_df
+    def transform(df):
+        calls.append(df)
+        raise TypeError("not a dataframe")
+
+    with pytest.raises(TypeError):
+        transform(pd.DataFrame())
+    assert len(calls) == 1
+    assert report.profiles == []
+
+
+@pytest.mark.skipif(
+    not hasattr(tracemalloc, "reset_peak"), reason="needs tracemalloc.reset_peak()"
+)
+def test_nested_steps_report_their_own_peak(report):
+    @wrap_logging_transform_df
+    def inner(df):
+        buffer = bytearray(MiB)
+        return df.assign(size=len(buffer))
+
+    @wrap_logging_transform_df
+    def outer(df):
+        buffer = bytearray(20 * MiB)
+        del buffer
+        return inner(df)
+
+    outer(pd.DataFrame({"a": [1]}))
+    peaks = {p.step: p.peak_mem_bytes for p in report.profiles}
+    assert MiB <= peaks["inner"] < 5 * MiB
+    assert peaks["outer"] >= 20 * MiB
@@ -0,0 +1,75 @@
+import json
+
+import pandas as pd
+import pytest
+
+from src.data.related_crawler import RelatedQueriesCrawler
+
+
+def related(keyword, values):
+    return pd.DataFrame(
+        {
+            "keyword": keyword,
+            "query": list(values),
+            "value": list(values.values()),
+            "ranking": "rising",
+        }
+    )
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    """Crawl stopped while the batch of x, the best depth 1 query, was running"""
+    path = str(tmp_path / "crawl.json")
+    crawler = RelatedQueriesCrawler(
+        ["s"], max_depth=1, max_queries=3, batch_size=1, checkpoint_path=path
+    )
+    crawler._expand(crawler.pop_batch(), related("s", {"x": 100, "y": 50, "z": 10}))
+    crawler.in_flight.append(crawler.pop_batch())
+    crawler.save_checkpoint()
+    return path
+
+
+def resume(path, fail=()):
+    crawler = RelatedQueriesCrawler(
+        [],
+        max_depth=1,
+        max_queries=3,
+        batch_size=1,
+        max_workers=1,
+        checkpoint_path=path,
+    )
+    queried, failing = [], list(fail)
+
+    def query_batch(batch):
+        keys = [key for key, _, _ in batch]
+        queried.extend(keys)
+        if failing and keys[0] == failing[0]:
+            failing.pop(0)
+            raise ValueError("429")
+        return pd.DataFrame(columns=["keyword", "query", "value", "ranking"])
+
+    crawler.query_batch = query_batch
+    crawler.run()
+    return crawler, queried
+
+
+def test_checkpoint_is_valid_json(checkpoint):
+    def reject(constant):
+        raise ValueError(constant)
+
+    with open(checkpoint, encoding="utf8") as file:
+        state = json.load(file, parse_constant=reject)
+    assert [key for key, _, _ in state["in_flight"][0]] == ["x"]
+
+
+def test_interrupted_batch_keeps_its_rank_on_resume(checkpoint):
+    crawler, queried = resume(checkpoint)
+    assert queried == ["x", "y"]
+    assert crawler.queried == 3
+
+
+def test_retried_batch_keeps_its_rank(checkpoint):
+    crawler, queried = resume(checkpoint, fail=["x"])
+    assert queried == ["x", "x", "y"]
+    assert crawler.failed == []
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import spikes
+
+
+def long_frame(series):
+    """Weekly long search interest from keyword -> values"""
+    dates = pd.date_range(
+        "2020-01-05", periods=len(next(iter(series.values()))), freq="W"
+    )
+    return pd.concat(
+        [
+            pd.DataFrame({"date": dates, "keyword": kw, "search_interest": values})
+            for kw, values in series.items()
+        ],
+        ignore_index=True,
+    )
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    noisy = rng.normal(20, 3, 80).round()
+    noisy[60] = 90
+    flat = np.zeros(80)
+    flat[70] = 100
+    gappy = rng.normal(50, 5, 80).round()
+    gappy[[5, 17, 18, 40]] = np.nan
+    return long_frame({"noisy": noisy, "flat": flat, "gappy": gappy})
+
+
+@pytest.mark.parametrize("method", ["mad", "ewma"])
+def test_jump_after_flat_baseline_is_a_spike(df, method):
+    events = spikes.detect_spikes(df, method=method, window=20, threshold=3.5)
+    flat = events.loc[events.keyword == "flat"]
+    assert flat.date.tolist() == [df.date.unique()[70]]
+    assert np.isfinite(flat.score).all()
+    assert (events.keyword == "noisy").any()
+
+
+def test_mad_scores_match_groupby_rolling(df):
+    window, min_periods = 20, 10
+    values, dates, keywords = spikes.wide_matrix(df)
+    scores, medians = spikes.rolling_mad_scores(values, window, min_periods)
+
+    def mad(x):
+        x = x[~np.isnan(x)]
+        return spikes.MAD_SCALE * np.median(np.abs(x - np.median(x)))
+
+    for j, keyword in enumerate(keywords):
+        s = df.loc[df.keyword == keyword].set_index("date").search_interest
+        trailing = s.shift().rolling(window, min_periods=min_periods)
+        median = trailing.median()
+        score = (s - median) / np.fmax(
+            trailing.apply(mad, raw=True), spikes.MIN_DISPERSION
+        )
+        np.testing.assert_allclose(medians[:, j], median.to_numpy())
+        np.testing.assert_allclose(scores[:, j], score.to_numpy())
+
+
+@pytest.mark.parametrize("method", ["mad", "ewma"])
+def test_incremental_updates_match_batch(df, method):
+    kwargs = dict(method=method, window=20, threshold=3.0, min_periods=10)
+    batch = spikes.detect_spikes(df, **kwargs)
+
+    detector = spikes.SpikeDetector(**kwargs)
+    dates = df.date.unique()
+    parts = [
+        detector.update(df.loc[df.date.isin(dates[start:end])])
+        for start, end in [(0, 30), (25, 61), (61, 62), (62, 80)]
+    ]
+    incremental = pd.concat(parts, ignore_index=True)
+
+    columns = ["date", "keyword", "search_interest", "baseline", "score"]
+    pd.testing.assert_frame_equal(
+        incremental[columns].reset_index(drop=True),
+        batch[columns].reset_index(drop=True),
+        check_dtype=False,
+    )
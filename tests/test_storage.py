@@ -0,0 +1,77 @@
+import pandas as pd
+
+from src.data import google_trends, storage
+from src.data.utils_data import df_to_csv
+
+
+def interest(keywords, start="2023-01-01", periods=3):
+    dates = pd.date_range(start, periods=periods, freq="W")
+    return pd.concat(
+        [
+            pd.DataFrame({"date": dates, "keyword": kw, "search_interest": 10.0})
+            for kw in keywords
+        ],
+        ignore_index=True,
+    )
+
+
+def test_every_write_is_cataloged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "raw").mkdir(parents=True)
+    filepath = "data/raw/interest.csv"
+    google_trends.write_interest(interest(["a", "b"]), filepath, timeframe="today 12-m")
+    google_trends.write_interest(
+        interest(["b", "c"], start="2023-02-05"), filepath, timeframe="today 12-m"
+    )
+
+    files = storage.list_files()
+    assert len(files) == 1
+    entry = files.iloc[0]
+    assert entry["rows"] == 12
+    assert (entry["min_date"], entry["max_date"]) == ("2023-01-01", "2023-02-19")
+    assert entry["timeframe"] == "today 12-m"
+    assert entry["geo"] == "global"
+    assert entry["schema_version"] == storage.SCHEMA_VERSIONS["search_interest"]
+    assert not entry["imported"]
+
+    keywords = storage.list_file_keywords().set_index("keyword")
+    assert keywords["rows"].to_dict() == {"a": 3, "b": 6, "c": 3}
+    assert keywords.loc["b", "max_date"] == "2023-02-19"
+
+    # the dashboard import keeps the timeframe the file was written with
+    assert storage.import_csv("data/raw/*.csv") == 12
+    assert storage.list_timeframes() == ["today 12-m"]
+    assert storage.import_csv("data/raw/*.csv") == 0
+
+
+def test_writes_with_storage_are_not_imported_again(tmp_path):
+    db_path = str(tmp_path / "esg.sqlite")
+    filepath = str(tmp_path / "interest.csv")
+    google_trends.write_interest(
+        interest(["a"]).assign(geo="DE"),
+        filepath,
+        storage_path=db_path,
+        timeframe="today 5-y",
+    )
+
+    entry = storage.list_files(db_path).iloc[0]
+    assert entry["imported"] and entry["geo"] == "DE"
+    assert storage.import_csv(str(tmp_path / "*.csv"), db_path=db_path) == 0
+
+
+def test_files_written_elsewhere_are_scanned_again(tmp_path):
+    db_path = str(tmp_path / "esg.sqlite")
+    filepath = str(tmp_path / "interest.csv")
+    google_trends.write_interest(
+        interest(["a"]), filepath, storage_path=db_path, timeframe="today 5-y"
+    )
+    df_to_csv(interest(["x"]), filepath=filepath)
+    google_trends.write_interest(
+        interest(["b"]), filepath, storage_path=db_path, timeframe="today 5-y"
+    )
+    assert storage.list_files(db_path).empty
+
+    storage.import_csv(str(tmp_path / "*.csv"), db_path=db_path)
+    keywords = storage.list_file_keywords(db_path)
+    assert keywords["keyword"].tolist() == ["a", "b", "x"]
+    assert storage.list_files(db_path).iloc[0]["rows"] == 9